@@ -0,0 +1,124 @@
+"""
+Headless computer-vs-computer games for balance testing.
+
+Run from anywhere with:
+    python benchmarks/ai_match.py --games 20 --output benchmarks/ai_results.json
+and add --logs benchmarks/logs to record every game for replay_render.py.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# the game loads its assets relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+from config import constants
+from config.ai import AIPlayer
+from config.replay import GameRecorder
+from config.tournament import make_match, get_alignments_left, get_ending
+
+
+def play_match(app, ai, max_rounds):
+    """
+    Plays the computer against itself until one alignment is left or the rounds run out
+
+    :param app: app being played
+    :param ai: computer player for every alignment
+    :param max_rounds: rounds before the game is called a draw
+    :return: dict of the result of the game
+    """
+    turn_times = []
+    turns = 0
+    while len(get_alignments_left(app)) > 1 and turns < max_rounds * len(app.alignments):
+        start = time.perf_counter()
+        ai.take_turn(app)
+        turn_times.append(time.perf_counter() - start)
+        turns += 1
+    left = get_alignments_left(app)
+    return {
+        "winner": next(iter(left)) if len(left) == 1 else None,
+        "ending": get_ending(left),
+        "turns": turns,
+        "units_left": len(app.get_active_units()),
+        "turn_median": statistics.median(turn_times) if turn_times else 0.0,
+        "turn_max": max(turn_times) if turn_times else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless computer-vs-computer games for Fate")
+    parser.add_argument("--games", type=int, default=10, help="games to play")
+    parser.add_argument("--size", default="26x10", help="map size as ROWSxCOLS")
+    parser.add_argument("--alignments", nargs="+", default=constants.ALIGNMENTS[:2], help="alignments playing")
+    parser.add_argument("--units", type=int, default=5, help="units per alignment")
+    parser.add_argument("--rounds", type=int, default=50, help="rounds before a game is a draw")
+    parser.add_argument("--workers", type=int, default=constants.AI_WORKERS,
+                        help="worker processes, 0 to search in this process")
+    parser.add_argument("--budget", type=float, default=constants.AI_TIME_BUDGET, help="seconds of search per turn")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the first game")
+    parser.add_argument("--output", default="benchmarks/ai_results.json", help="results file")
+    parser.add_argument("--logs", help="directory to record a game log of every game to")
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    rows, cols = (int(size) for size in args.size.lower().split("x"))
+    ai = AIPlayer(args.workers, args.budget)
+
+    games = []
+    try:
+        for game in range(args.games):
+            app = make_match(rows, cols, args.alignments, args.units, args.seed + game)
+            if args.logs:
+                app.recorder = GameRecorder(app, os.path.join(args.logs, f"game_{args.seed + game}.flog"))
+            try:
+                result = play_match(app, ai, args.rounds)
+            finally:
+                if app.recorder is not None:
+                    app.recorder.close()
+            result["seed"] = args.seed + game
+            games.append(result)
+            print(f"game {game:4} winner {str(result['winner']):8} {result['ending']:11} turns {result['turns']:5} "
+                  f"turn median {result['turn_median'] * 1000:8.1f}ms max {result['turn_max'] * 1000:8.1f}ms")
+    finally:
+        ai.close()
+
+    wins = Counter(str(game["winner"]) for game in games)
+    print("wins: " + ", ".join(f"{winner} {count}" for winner, count in wins.most_common()))
+    endings = Counter(game["ending"] for game in games)
+    print("endings: " + ", ".join(f"{ending} {count}" for ending, count in endings.most_common()))
+
+    output = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "wins": dict(wins),
+        "endings": dict(endings),
+        "games": games,
+    }
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Headless benchmarks for the hot paths of the game.
+
+Run from anywhere with:
+    python benchmarks/bench.py --output benchmarks/results.json
+and compare two runs with:
+    python benchmarks/bench.py --compare benchmarks/old.json benchmarks/results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# the game loads its assets relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+from config import constants
+from config.app import App, Position, SelectedTile
+from config.mapfile import write_map, load_map
+from config.mapgen import generate_map, TILE_TYPES
+from config.hexgrid import hex_distance
+from config.pathfinding import HierarchicalPathFinder, PathQuery, search
+
+DEFAULT_SIZES = ["26x10", "60x30", "120x60"]
+DEFAULT_DENSITIES = [0.0, 0.2, 0.4]
+DEFAULT_UNITS = [0, 50, 500]
+DEFAULT_HIERARCHY_SIZE = "1000x1000"
+# hex distances between the start and goal of the hierarchical path queries
+HIERARCHY_BANDS = [(0, 100), (100, 500), (500, 2000)]
+
+
+def parse_size(size):
+    """
+    Parses a map size written as ROWSxCOLS
+
+    :param size: map size string
+    :return: rows, cols
+    """
+    rows, cols = size.lower().split("x")
+    return int(rows), int(cols)
+
+
+def time_call(func, repeat):
+    """
+    Times repeated calls of a function
+
+    :param func: function without arguments
+    :param repeat: number of calls
+    :return: dict of timing statistics in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"runs": repeat, "min": min(times), "median": statistics.median(times), "mean": statistics.mean(times)}
+
+
+def make_app(rows, cols, density=0.0, units=0, seed=0):
+    """
+    Builds an initialized app with random difficult terrain and units of random alignments
+
+    :param rows: rows of the map
+    :param cols: cols of the map
+    :param density: fraction of tiles that are difficult
+    :param units: number of units to spawn
+    :param seed: random seed
+    :return: app
+    """
+    rng = random.Random(seed)
+    app = App(rows, cols)
+    app.initialize()
+    difficult = [Position(row, col) for row in range(rows) for col in range(cols) if rng.random() < density]
+    app.update_tile(difficult, constants.TILE_DIFFICULT)
+    free = [Position(row, col) for row in range(rows) for col in range(cols)]
+    rng.shuffle(free)
+    for position in free[:units]:
+        app.spawn_unit(position, app.unit_info[constants.UNIT_SLIME], rng.choice(app.alignments))
+    app.history.reset(app)
+    return app
+
+
+def bench_shortest_path(sizes, densities, repeat, results):
+    for size in sizes:
+        rows, cols = parse_size(size)
+        for density in densities:
+            app = make_app(rows, cols, density)
+            app.update_tile([Position(0, 0), Position(rows - 1, cols - 1)], constants.TILE_BLANK)
+            unit = app.unit_info[constants.UNIT_SLIME]
+            start = SelectedTile(0, 0, app.game_map[0][0].tile)
+            end = SelectedTile(rows - 1, cols - 1, app.game_map[rows - 1][cols - 1].tile)
+            stats = time_call(lambda: app.get_shortest_path(start, end, unit), repeat)
+            results.append(dict(name="get_shortest_path", params={"size": size, "density": density}, **stats))
+
+
+def bench_batch_paths(sizes, unit_counts, repeat, results):
+    rng = random.Random(0)
+    for size in sizes:
+        rows, cols = parse_size(size)
+        for units in unit_counts:
+            if units == 0 or units > rows * cols:
+                continue
+            app = make_app(rows, cols, 0.2, units)
+            starts = [Position(row, col) for row in range(rows) for col in range(cols)
+                      if app.unit_map[row][col].unit is not None]
+            # a group move: every unit heads for one of a few rally points
+            goals = [Position(rng.randrange(rows), rng.randrange(cols)) for _ in range(4)]
+            queries = [PathQuery(start, goal, app.unit_map[start.row][start.col].unit)
+                       for start in starts for goal in goals]
+
+            def find_paths():
+                app.pathfinder.version = -1
+                app.pathfinder.find_paths(queries)
+
+            stats = time_call(find_paths, repeat)
+            results.append(dict(name="PathFinder.find_paths", params={"size": size, "units": units,
+                                                                       "queries": len(queries)}, **stats))
+
+
+def bench_tile_alignments(sizes, unit_counts, repeat, results):
+    for size in sizes:
+        rows, cols = parse_size(size)
+        for units in unit_counts:
+            if units > rows * cols:
+                continue
+            app = make_app(rows, cols, units=units)
+            stats = time_call(app.update_tile_alignments, repeat)
+            results.append(dict(name="update_tile_alignments", params={"size": size, "units": units}, **stats))
+
+
+def bench_mouse_picking(sizes, repeat, results):
+    rng = random.Random(0)
+    for size in sizes:
+        rows, cols = parse_size(size)
+        app = make_app(rows, cols)
+        positions = [(rng.randrange(constants.SCREEN_WIDTH), rng.randrange(constants.SCREEN_HEIGHT))
+                     for _ in range(repeat)]
+        positions_iter = iter(positions)
+        stats = time_call(lambda: app.is_mouse_on_tile(next(positions_iter)), repeat)
+        results.append(dict(name="is_mouse_on_tile", params={"size": size}, **stats))
+
+
+def bench_frame(screen, sizes, unit_counts, repeat, results):
+    for size in sizes:
+        rows, cols = parse_size(size)
+        for units in unit_counts:
+            if units > rows * cols:
+                continue
+            app = make_app(rows, cols, units=units)
+            hovered_tile = app.is_mouse_on_tile((constants.TILE_SIZE, constants.TILE_SIZE))
+            stats = time_call(lambda: app.update(screen, hovered_tile), repeat)
+            results.append(dict(name="App.update", params={"size": size, "units": units}, **stats))
+
+
+def bench_startup(sizes, unit_counts, repeat, results):
+    stats = time_call(lambda: App().load_tiles_and_units(), repeat)
+    results.append(dict(name="load_tiles_and_units", params={}, **stats))
+    for size in sizes:
+        rows, cols = parse_size(size)
+        stats = time_call(lambda: App(rows, cols).initialize(), max(1, repeat // 10))
+        results.append(dict(name="App.initialize", params={"size": size}, **stats))
+        app = make_app(rows, cols)
+        unit = app.unit_info[constants.UNIT_SLIME]
+        for units in unit_counts:
+            if units == 0 or units > rows * cols:
+                continue
+            positions = [Position(i // cols, i % cols) for i in range(units)]
+
+            def spawn_all():
+                for position in positions:
+                    app.spawn_unit(position, unit, constants.ALIGNMENTS[0])
+
+            stats = time_call(spawn_all, max(1, repeat // 10))
+            results.append(dict(name="spawn_unit", params={"size": size, "units": units}, **stats))
+
+
+def bench_map(sizes, repeat, results):
+    app = make_app(1, 1)
+    path = os.path.join("benchmarks", "bench_map.fmap")
+    for size in sizes:
+        rows, cols = parse_size(size)
+        stats = time_call(lambda: generate_map(rows, cols), max(1, repeat // 10))
+        results.append(dict(name="generate_map", params={"size": size}, **stats))
+        tiles = generate_map(rows, cols)
+        stats = time_call(lambda: write_map(path, tiles, TILE_TYPES), max(1, repeat // 10))
+        results.append(dict(name="write_map", params={"size": size}, **stats))
+        stats = time_call(lambda: load_map(app, path), max(1, repeat // 10))
+        results.append(dict(name="load_map", params={"size": size}, **stats))
+    os.remove(path)
+
+
+def bench_hierarchy(size, repeat, results):
+    rows, cols = parse_size(size)
+    seed = constants.MAP_SEED
+    constants.MAP_SEED = 1
+    try:
+        app = make_app(rows, cols)
+    finally:
+        constants.MAP_SEED = seed
+    unit = app.unit_info[constants.UNIT_SLIME]
+    unit.alignment = app.alignments[0]
+    # the searches read the same snapshots of the move costs as the path worker's
+    costs = app.pathfinder.get_costs(unit)
+    terrain = app.pathfinder.base_costs
+    key = (unit.alignment, unit.speed)
+    hierarchy = HierarchicalPathFinder()
+    stats = time_call(lambda: hierarchy.build(rows, cols, terrain), 1)
+    results.append(dict(name="HierarchicalPathFinder.build", params={"size": size}, **stats))
+    rng = random.Random(0)
+    for low, high in HIERARCHY_BANDS:
+        queries = []
+        while len(queries) < max(repeat, 10):
+            start = Position(rng.randrange(rows), rng.randrange(cols))
+            goal = Position(rng.randrange(rows), rng.randrange(cols))
+            if low <= hex_distance(start.row, start.col, goal.row, goal.col) < high:
+                queries.append((start.row * cols + start.col, goal.row * cols + goal.col))
+        # the first query between two entrances keeps the cells between them, later ones only look them up
+        paths = [hierarchy.find_path(rows, cols, terrain, key, costs, source, target) for source, target in queries]
+        pending = itertools.cycle(queries)
+        stats = time_call(lambda: hierarchy.find_path(rows, cols, terrain, key, costs, *next(pending)),
+                          len(queries) * 5)
+        # how much more the paths cost than the cheapest ones
+        ratios = []
+        for (source, target), path in list(zip(queries, paths))[:10]:
+            exact = search(rows, cols, costs, source, (target,)).get(target)
+            if path and exact and len(exact) > 1:
+                ratios.append(sum(costs[index] for index in path[1:]) / sum(costs[index] for index in exact[1:]))
+        results.append(dict(name="HierarchicalPathFinder.find_path",
+                            params={"size": size, "distance": f"{low}-{high}"},
+                            cost_ratio=statistics.mean(ratios) if ratios else None, **stats))
+
+
+def compare(old_path, new_path):
+    """
+    Prints the median time of every benchmark in two result files and the ratio between them
+
+    :param old_path: results of the baseline run
+    :param new_path: results of the new run
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    old_results = {key(result): result for result in old["results"]}
+    for result in new["results"]:
+        name, params = key(result)
+        if (name, params) in old_results:
+            before = old_results[(name, params)]["median"]
+            ratio = result["median"] / before if before else float("inf")
+            print(f"{name:24} {params:40} {before * 1000:10.3f}ms {result['median'] * 1000:10.3f}ms {ratio:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for Fate")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="map sizes as ROWSxCOLS")
+    parser.add_argument("--densities", nargs="+", type=float, default=DEFAULT_DENSITIES,
+                        help="fractions of difficult tiles for pathfinding")
+    parser.add_argument("--units", nargs="+", type=int, default=DEFAULT_UNITS, help="unit counts")
+    parser.add_argument("--hierarchy-size", default=DEFAULT_HIERARCHY_SIZE,
+                        help="map size as ROWSxCOLS for the hierarchical pathfinder")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per benchmark")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="benchmarks to run: path, batch, alignments, picking, frame, startup, map, "
+                             "hierarchy")
+    parser.add_argument("--output", default="benchmarks/results.json", help="results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    pygame.init()
+    screen = pygame.display.set_mode((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    only = set(args.only) if args.only else {"path", "batch", "alignments", "picking", "frame", "startup", "map",
+                                                     "hierarchy"}
+
+    results = []
+    if "path" in only:
+        bench_shortest_path(args.sizes, args.densities, args.repeat, results)
+    if "batch" in only:
+        bench_batch_paths(args.sizes, args.units, args.repeat, results)
+    if "alignments" in only:
+        bench_tile_alignments(args.sizes, args.units, args.repeat, results)
+    if "picking" in only:
+        bench_mouse_picking(args.sizes, args.repeat, results)
+    if "frame" in only:
+        bench_frame(screen, args.sizes, args.units, args.repeat, results)
+    if "startup" in only:
+        bench_startup(args.sizes, args.units, args.repeat, results)
+    if "map" in only:
+        bench_map(args.sizes, args.repeat, results)
+    if "hierarchy" in only:
+        bench_hierarchy(args.hierarchy_size, args.repeat, results)
+
+    for result in results:
+        ratio = f" cost x{result['cost_ratio']:.3f}" if result.get("cost_ratio") else ""
+        print(f"{result['name']:24} {json.dumps(result['params']):40} {result['median'] * 1000:10.3f}ms{ratio}")
+
+    output = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Soak test of the multiplayer host with many loopback clients. The players take turns sending random
+spawns, moves, attacks and turn ends while the rest of the clients spectate, then every client's game
+is checked against the host's.
+
+Run from anywhere with:
+    python benchmarks/net_soak.py --clients 64 --commands 2000 --output benchmarks/net_results.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# the game loads its assets relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+from config import constants
+from config.app import App, Position
+from config.commands import Spawn, Move, EndTurn
+from config.history import capture
+from config.network import GameHost, GameClient, SPECTATOR
+from config.save import write_game
+
+
+def make_app(rows, cols):
+    app = App(rows, cols)
+    app.initialize()
+    return app
+
+
+def pick_command(client, rng):
+    """
+    Picks a random command for a player, mostly moves and attacks of its own units
+
+    :param client: client whose turn it is
+    :param rng: random number generator
+    :return: Spawn, Move or EndTurn
+    """
+    app = client.app
+    alignment = app.get_alignment_turn()
+    units = [Position(row, col) for row in range(app.rows) for col in range(app.cols)
+             if app.unit_map[row][col].unit is not None and app.unit_map[row][col].unit.alignment == alignment]
+    roll = rng.random()
+    if roll < 0.1:
+        return EndTurn()
+    if roll < 0.3 or not units:
+        empty = [Position(row, col) for row in range(app.rows) for col in range(app.cols)
+                 if app.unit_map[row][col].unit is None]
+        position = rng.choice(empty)
+        return Spawn(position.row, position.col, constants.UNIT_SLIME)
+    start = rng.choice(units)
+    enemies = [Position(row, col) for row in range(app.rows) for col in range(app.cols)
+               if app.unit_map[row][col].unit is not None and app.unit_map[row][col].unit.alignment != alignment]
+    if enemies and rng.random() < 0.5:
+        end = min(enemies, key=lambda enemy: abs(enemy.row - start.row) + abs(enemy.col - start.col))
+    else:
+        end = Position(rng.randrange(app.rows), rng.randrange(app.cols))
+    path = client.preview_path(start, end)
+    if len(path) < 2:
+        return EndTurn()
+    attacks = None
+    enemy = app.unit_map[path[-1].row][path[-1].col].unit
+    if enemy is not None:
+        attacks = (rng.choice(list(app.unit_map[start.row][start.col].unit.attacks)),
+                   rng.choice(list(enemy.attacks)))
+    return Move(tuple(tuple(position) for position in path), attacks)
+
+
+async def soak(args):
+    rng = random.Random(args.seed)
+    rows, cols = (int(size) for size in args.size.lower().split("x"))
+    host = GameHost(make_app(rows, cols))
+    server = await host.start(constants.NET_HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+
+    clients = [GameClient(make_app(rows, cols)) for _ in range(args.clients)]
+    for client in clients:
+        await client.connect(constants.NET_HOST, port)
+    players = {client.alignment: client for client in clients if client.alignment != SPECTATOR}
+
+    latencies = []
+    rejected = 0
+    start = time.perf_counter()
+    for _ in range(args.commands):
+        client = players[host.app.turn]
+        command = pick_command(client, rng)
+        sent = time.perf_counter()
+        reason = await client.play(command)
+        latencies.append(time.perf_counter() - sent)
+        if reason is not None:
+            rejected += 1
+    # let every spectator catch up before checking them
+    while any(client.deltas < host.deltas for client in clients):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    expected = capture(host.app)
+    mismatched = sum(1 for client in clients
+                     if capture(client.app)[:2] != expected[:2] or client.app.turn != host.app.turn)
+    state = io.BytesIO()
+    write_game(host.app, state)
+
+    for client in clients:
+        await client.close()
+    await host.close()
+
+    latencies.sort()
+    return {
+        "clients": args.clients,
+        "commands": args.commands,
+        "rejected": rejected,
+        "host_rejected": host.rejected,
+        "deltas": host.deltas,
+        "seconds": elapsed,
+        "commands_per_second": args.commands / elapsed,
+        "messages_per_second": host.messages_sent / elapsed,
+        "latency_median": statistics.median(latencies),
+        "latency_p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "host_bytes_sent": host.bytes_sent,
+        "delta_bytes_mean": host.delta_bytes / max(1, host.deltas),
+        "full_state_bytes": len(state.getvalue()),
+        "units": len(host.app.get_active_units()),
+        "mismatched_clients": mismatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test of the Fate multiplayer host over loopback")
+    parser.add_argument("--clients", type=int, default=64, help="clients connected, the first ones are players")
+    parser.add_argument("--commands", type=int, default=2000, help="commands the players send")
+    parser.add_argument("--size", default="26x10", help="map size as ROWSxCOLS")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", default="benchmarks/net_results.json", help="results file")
+    args = parser.parse_args()
+    if args.clients < len(constants.ALIGNMENTS):
+        parser.error("every alignment needs a player, use at least " + str(len(constants.ALIGNMENTS)) + " clients")
+
+    pygame.init()
+    pygame.display.set_mode((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    result = asyncio.run(soak(args))
+    for name, value in result.items():
+        print(f"{name:24} {value:.6g}" if isinstance(value, float) else f"{name:24} {value}")
+
+    output = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "result": result,
+    }
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Renders a recorded game log headless, capturing the frames to files as fast as they can be drawn.
+
+Record logs with ai_match.py --logs, then run from anywhere with:
+    python benchmarks/replay_render.py benchmarks/logs/game_0.flog --format npz
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# the game loads its assets relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+from config import constants
+from config.app import App
+from config.capture import FrameCapture
+from config.replay import replay_game
+
+
+def render_frames(app, screen, capture, frames):
+    for _ in range(frames):
+        screen.fill('black')
+        app.update(screen, None)
+        app.take_dirty_rects(screen)
+        capture.capture(screen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless frame capture of a recorded Fate game")
+    parser.add_argument("log", help="game log to replay")
+    parser.add_argument("--output", help="directory the frames are written to, by default one per log in "
+                                         + constants.CAPTURE_DIRECTORY)
+    parser.add_argument("--format", choices=["png", "npz"], default="png", help="file format of the frames")
+    parser.add_argument("--frames", type=int, default=1, help="frames drawn after every command")
+    parser.add_argument("--queue", type=int, default=constants.CAPTURE_QUEUE_SIZE,
+                        help="frames that can wait for the writer threads")
+    parser.add_argument("--writers", type=int, default=constants.CAPTURE_WRITERS,
+                        help="writer threads encoding frames, by default one per core")
+    parser.add_argument("--block", action="store_true", help="wait for the writers instead of dropping frames")
+    parser.add_argument("--allow-drops", action="store_true",
+                        help="exit successfully even when frames were dropped")
+    parser.add_argument("--results", default="benchmarks/replay_results.json", help="results file")
+    args = parser.parse_args()
+    output = args.output or os.path.join(constants.CAPTURE_DIRECTORY,
+                                         os.path.splitext(os.path.basename(args.log))[0])
+
+    pygame.init()
+    screen = pygame.display.set_mode((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    app = App()
+    app.initialize()
+    capture = FrameCapture(output, args.format, args.queue, not args.block, args.writers)
+
+    start = time.perf_counter()
+    commands = 0
+    try:
+        replay = replay_game(app, args.log)
+        # the game the log starts from, then the board after every command
+        render_frames(app, screen, capture, args.frames)
+        for _ in replay:
+            render_frames(app, screen, capture, args.frames)
+            commands += 1
+        render_time = time.perf_counter() - start
+    finally:
+        capture.close()
+    total_time = time.perf_counter() - start
+
+    # what showing the frames that made it to disk at the game's frame rate would take, dropped frames
+    # were never encoded so they don't count towards the speed
+    real_time = capture.written / constants.FRAME_RATE
+    results = {
+        "commands": commands,
+        "captured": capture.captured,
+        "written": capture.written,
+        "dropped": capture.dropped,
+        "files": capture.files,
+        "writers": len(capture.threads),
+        "render_seconds": render_time,
+        "total_seconds": total_time,
+        "copy_seconds": capture.copy_time,
+        "wait_seconds": capture.wait_time,
+        "speedup": real_time / total_time if total_time else 0.0,
+    }
+    print(f"{commands} commands, {capture.captured} frames, {capture.written} written, {capture.dropped} dropped "
+          f"to {capture.files} files in {output} by {len(capture.threads)} writers")
+    print(f"rendered in {render_time:.2f}s, written in {total_time:.2f}s, "
+          f"{results['speedup']:.1f}x real time at {constants.FRAME_RATE} fps")
+
+    directory = os.path.dirname(args.results)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.results, "w") as f:
+        json.dump({
+            "meta": {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "pygame": pygame.version.ver,
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }, f, indent=2)
+    pygame.quit()
+
+    if capture.dropped:
+        print(f"WARNING: {capture.dropped} of {capture.captured} frames were dropped, the capture is incomplete "
+              f"and the speedup only counts written frames, run with --block to keep every frame",
+              file=sys.stderr)
+        if not args.allow_drops:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Many headless computer-vs-computer games at once, reporting throughput and the memory each game takes.
+
+Run from anywhere with:
+    python benchmarks/tournament.py --games 1000 --processes 8 --concurrent 64
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+
+# the games draw nothing, but pygame still looks for a video driver when it starts
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# the game loads its assets relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+
+from config import constants
+from config.tournament import MatchSpec, play_tournament
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless tournament of many concurrent Fate games")
+    parser.add_argument("--games", type=int, default=200, help="games to play")
+    parser.add_argument("--size", default="26x10", help="map size as ROWSxCOLS")
+    parser.add_argument("--alignments", nargs="+", default=constants.ALIGNMENTS[:2], help="alignments playing")
+    parser.add_argument("--units", type=int, default=5, help="units per alignment")
+    parser.add_argument("--rounds", type=int, default=50, help="rounds before a game is a draw")
+    parser.add_argument("--processes", type=int, default=constants.TOURNAMENT_PROCESSES,
+                        help="worker processes, 0 to play every game in this process")
+    parser.add_argument("--concurrent", type=int, default=constants.TOURNAMENT_CONCURRENT,
+                        help="games in progress at once in each process")
+    parser.add_argument("--budget", type=float, default=constants.AI_TIME_BUDGET, help="seconds of search per turn")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the first game")
+    parser.add_argument("--output", default="benchmarks/tournament_results.json", help="results file")
+    args = parser.parse_args()
+
+    rows, cols = (int(size) for size in args.size.lower().split("x"))
+    specs = [MatchSpec(args.seed + game, rows, cols, args.alignments, args.units, args.rounds)
+             for game in range(args.games)]
+    tournament = play_tournament(specs, args.processes, args.concurrent, args.budget)
+
+    wins = Counter(str(result["winner"]) for result in tournament["results"])
+    print("wins: " + ", ".join(f"{winner} {count}" for winner, count in wins.most_common()))
+    endings = Counter(result["ending"] for result in tournament["results"])
+    print("endings: " + ", ".join(f"{ending} {count}" for ending, count in endings.most_common()))
+    print(f"{tournament['games']} games, {tournament['turns']} turns in {tournament['seconds']:.2f}s: "
+          f"{tournament['games_per_second']:.1f} games/s, {tournament['turns_per_second']:.1f} turns/s")
+    print(f"per game: {tournament['match_bytes'] / 1024:.1f} KiB of python objects as it starts, "
+          f"{tournament['peak_bytes_per_match'] / 1024:.1f} KiB of peak process memory")
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "pygame": pygame.version.ver,
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "args": vars(args),
+            },
+            "wins": dict(wins),
+            "endings": dict(endings),
+            **tournament,
+        }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
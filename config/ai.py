@@ -0,0 +1,358 @@
+import math
+import multiprocessing
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import constants
+from config.forecast import get_damage_forecast
+from config.hexgrid import get_offsets_within
+from config.pathfinding import get_profile_costs, search
+
+# The search runs in worker processes, so it works on a small picklable summary of the board instead of the app.
+# Nothing in here imports pygame, workers only need the rules.
+AttackSummary = namedtuple('AttackSummary', ['damage', 'count'])
+UnitSummary = namedtuple('UnitSummary', ['row', 'col', 'alignment', 'health', 'max_health', 'speed', 'movement',
+                                         'can_attack', 'attacks'])
+# terrain costs and zone of control masks by flat index as the app's PathFinder keeps them
+BoardSummary = namedtuple('BoardSummary', ['rows', 'cols', 'alignments', 'costs', 'zone_masks', 'units'])
+# path runs from the unit to where it ends its move, target is the enemy it attacks from there
+Candidate = namedtuple('Candidate', ['score', 'unit', 'path', 'target', 'attack'])
+# a turn being worked out: the app's turn, when scoring stops, the chunks handed to the workers and the
+# candidates already scored without them
+PlannedTurn = namedtuple('PlannedTurn', ['turn', 'deadline', 'futures', 'plans'])
+
+
+def summarize_board(app) -> BoardSummary:
+    """
+    Gets everything the move search needs from the app
+
+    :param app: app whose board is summarized
+    :return: summary of the board
+    """
+    pathfinder = app.pathfinder
+    pathfinder.check_version()
+    units = []
+    for row in range(app.rows):
+        for col in range(app.cols):
+            unit = app.unit_map[row][col].unit
+            if unit is not None:
+                attacks = tuple((name, AttackSummary(attack.damage, attack.count))
+                                for name, attack in unit.attacks.items())
+                units.append(UnitSummary(row, col, unit.alignment, unit.health, unit.max_health, unit.speed,
+                                         unit.movement, unit.can_attack, attacks))
+    return BoardSummary(app.rows, app.cols, tuple(app.alignments), pathfinder.base_costs, pathfinder.zone_masks,
+                        tuple(units))
+
+
+def get_neighbors(summary: BoardSummary, row: int, col: int) -> List[Tuple[int, int]]:
+    neighbors = []
+    for drow, dcol in get_offsets_within(1, row % 2)[1:]:
+        if 0 <= row + drow < summary.rows and 0 <= col + dcol < summary.cols:
+            neighbors.append((row + drow, col + dcol))
+    return neighbors
+
+
+def get_nearest_distances(ends: List[Tuple[int, int]], enemies: np.ndarray) -> np.ndarray:
+    """
+    Gets the distance from each tile to the nearest enemy, the same math as hex_distance over every pair at once
+
+    :param ends: list of row, col positions
+    :param enemies: array [enemy, (row, col)] of enemy positions
+    :return: array of distances, 0 everywhere when there are no enemies
+    """
+    if not len(enemies):
+        return np.zeros(len(ends), dtype=int)
+    ends = np.array(ends, dtype=int)
+    dq = np.abs((2 * ends[:, None, 1] + ends[:, None, 0] % 2) - (2 * enemies[None, :, 1] + enemies[None, :, 0] % 2))
+    drow = np.abs(ends[:, None, 0] - enemies[None, :, 0])
+    return (dq + np.maximum(0, (drow - dq) // 2)).min(axis=1)
+
+
+def get_best_attack(attacks: Tuple, health: int, max_health: int) -> Tuple[str, float, float]:
+    """
+    Gets the attack that does the most harm to a unit, counting a kill as its full health again since none of
+    its later attacks happen
+
+    :param attacks: tuple of attack name and AttackSummary
+    :param health: health of the unit being attacked
+    :param max_health: full health of the unit being attacked
+    :return: name, value and kill chance of the attack
+    """
+    damage, kill_chance = get_damage_forecast([attack for name, attack in attacks], health,
+                                              constants.ATTACK_HIT_CHANCE)
+    values = np.minimum(damage, health) + kill_chance * max_health * constants.AI_KILL_WEIGHT
+    best = int(np.argmax(values))
+    return attacks[best][0], float(values[best]), float(kill_chance[best])
+
+
+def score_units(summary: BoardSummary, indices: List[int], deadline: Optional[float] = None) -> List[List[Candidate]]:
+    """
+    Scores every move and attack of some units, run in the worker processes. Units are scored one at a time
+    until the deadline passes, the units scored by then are returned.
+
+    :param summary: summary of the board
+    :param indices: indices into summary.units of the units to score
+    :param deadline: optional time.perf_counter() after which no more units are scored, the clock is the
+        same in every process of the machine
+    :return: best candidates of each unit scored, best first
+    """
+    rows, cols = summary.rows, summary.cols
+    occupied = {(unit.row, unit.col): unit for unit in summary.units}
+    sizes = Counter(unit.alignment for unit in summary.units)
+    profile_costs = {}
+    battles = {}
+    enemies = {}
+    results = []
+    for index in indices:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        unit = summary.units[index]
+        if unit.alignment not in enemies:
+            enemies[unit.alignment] = np.array([(other.row, other.col) for other in summary.units
+                                                if other.alignment != unit.alignment], dtype=int).reshape(-1, 2)
+        profile = (unit.alignment, unit.speed)
+        if profile not in profile_costs:
+            own_bit = 1 << summary.alignments.index(unit.alignment)
+            profile_costs[profile] = get_profile_costs(summary.costs, summary.zone_masks, own_bit, unit.speed)
+        # every tile the unit can reach this turn, a step can be taken while it has movement left
+        found = search(rows, cols, profile_costs[profile], unit.row * cols + unit.col, None, limit=unit.movement)
+        paths = {divmod(end, cols): tuple(divmod(cell, cols) for cell in path) for end, path in found.items()}
+        start = (unit.row, unit.col)
+        ends = [end for end in paths if end == start or end not in occupied]
+        # closing in on the enemy, with nothing to close in on staying put is as good as anything
+        distances = get_nearest_distances(ends, enemies[unit.alignment])
+        candidates = []
+        for end, distance in zip(ends, distances.tolist()):
+            path = paths[end]
+            steps = len(path) - 1
+            candidates.append(Candidate(-constants.AI_APPROACH_WEIGHT * distance, index, path, None, None))
+
+            # move_unit only attacks when the whole path including the enemy fits in the movement,
+            # or when the enemy is next to a unit that can't move anymore
+            if not unit.can_attack or (end != start and steps + 1 > unit.movement):
+                continue
+            for target in get_neighbors(summary, end[0], end[1]):
+                enemy = occupied.get(target)
+                if enemy is None or enemy.alignment == unit.alignment:
+                    continue
+                battle = battles.get((index, target))
+                if battle is None:
+                    # both sides strike at once, so the best attack doesn't depend on what the enemy answers with
+                    attack, dealt, _ = get_best_attack(unit.attacks, enemy.health, enemy.max_health)
+                    answer, taken, death_chance = get_best_attack(enemy.attacks, unit.health, unit.max_health)
+                    score = dealt - constants.AI_LOSS_WEIGHT * taken
+                    # trading units one for one only wins the game for the side with more of them, for the rest
+                    # it ends the game with nobody left
+                    if sizes[unit.alignment] <= max(size for alignment, size in sizes.items()
+                                                    if alignment != unit.alignment):
+                        score -= constants.AI_DEATH_WEIGHT * death_chance * unit.max_health
+                    battle = battles[(index, target)] = (score, attack)
+                candidates.append(Candidate(battle[0], index, path, target, battle[1]))
+        candidates.sort(key=lambda candidate: (-candidate.score, len(candidate.path), candidate.path))
+        results.append(candidates[:constants.AI_CANDIDATES])
+    return results
+
+
+class AIPlayer:
+    def __init__(self, workers: Optional[int] = constants.AI_WORKERS,
+                 time_budget: float = constants.AI_TIME_BUDGET):
+        """
+        Computer player for the alignments in constants.AI_ALIGNMENTS
+
+        :param workers: worker processes for the search, None for one per core, 0 to search in this process
+        :param time_budget: seconds the search of a turn may take, units not scored by then hold still
+        """
+        self.workers = workers
+        self.time_budget = time_budget
+        self.pool = None
+        # turn whose units the workers are scoring, see update
+        self.planned: Optional[PlannedTurn] = None
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            # the game runs other threads, like the path worker, and a fork copies whatever locks they hold, so
+            # workers are forked from a fork server that has only imported this module, or spawned where there
+            # is none. Either way they import the script that started the game, which only runs it as __main__.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if context.get_start_method() == "forkserver":
+                context.set_forkserver_preload([__name__])
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self.pool
+
+    def close(self) -> None:
+        self.planned = None
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def start_planning(self, app) -> PlannedTurn:
+        """
+        Hands the units of the alignment whose turn it is to the worker processes, or scores them right away
+        without workers
+
+        :param app: app being played
+        :return: the turn being planned
+        """
+        deadline = time.perf_counter() + self.time_budget
+        summary = summarize_board(app)
+        alignment = app.get_alignment_turn()
+        indices = [i for i, unit in enumerate(summary.units)
+                   if unit.alignment == alignment and (unit.movement > 0 or unit.can_attack)]
+        if not indices:
+            return PlannedTurn(app.turn, deadline, [], [])
+
+        workers = self.workers if self.workers is not None else multiprocessing.cpu_count()
+        # a few chunks per worker so a slow chunk doesn't hold up the rest of the turn
+        chunk_count = max(1, min(len(indices), 4 * max(1, workers)))
+        chunks = [indices[i::chunk_count] for i in range(chunk_count)]
+
+        if self.workers == 0:
+            plans = []
+            for chunk in chunks:
+                plans.extend(score_units(summary, chunk, deadline))
+            return PlannedTurn(app.turn, deadline, [], plans)
+
+        pool = self.get_pool()
+        return PlannedTurn(app.turn, deadline, [pool.submit(score_units, summary, chunk, deadline)
+                                                for chunk in chunks], [])
+
+    def collect_plans(self, planned: PlannedTurn, timeout: float = 0.0) -> Optional[List[List[Candidate]]]:
+        """
+        Gathers what the workers scored, waiting for them at most the timeout. Until the deadline every chunk is
+        waited for, after it the chunks that haven't started are dropped and running ones stop and hand back the
+        units they scored, which takes at most the scoring of one more unit.
+
+        :param planned: turn being planned
+        :param timeout: seconds to wait for the workers
+        :return: best candidates of each unit that was scored in time, None while the workers are still going
+        """
+        futures = planned.futures
+        remaining = planned.deadline - time.perf_counter()
+        if remaining > 0:
+            done, not_done = wait(futures, timeout=min(timeout, remaining))
+            if not_done and time.perf_counter() < planned.deadline:
+                return None
+        running = [future for future in futures if not future.done() and not future.cancel()]
+        if running:
+            grace = planned.deadline + constants.AI_DEADLINE_GRACE
+            finished, overrun = wait(running, timeout=max(0.0, min(timeout, grace - time.perf_counter())))
+            if overrun:
+                if time.perf_counter() < grace:
+                    return None
+                # a worker still busy would hold up the next turn's chunks, the pool is replaced rather than
+                # waited on and its workers exit once they finish
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+        plans = list(planned.plans)
+        for future in futures:
+            if future.done() and not future.cancelled():
+                plans.extend(future.result())
+        return plans
+
+    def plan_turn(self, app) -> List[List[Candidate]]:
+        """
+        Scores the moves of every unit of the alignment whose turn it is, spread across the worker processes,
+        waiting for them
+
+        :param app: app being played
+        :return: best candidates of each unit that was scored in time
+        """
+        planned = self.start_planning(app)
+        plans = None
+        while plans is None:
+            plans = self.collect_plans(planned, math.inf)
+        return plans
+
+    def update(self, app) -> None:
+        """
+        Plays the turn of the alignment whose turn it is across frames without holding any of them up. The first
+        call hands the units to the workers, later ones check on them, and once they have all answered or the
+        time is up the moves are played and the turn ended.
+
+        :param app: app being played
+        """
+        planned = self.planned
+        if planned is None or planned.turn != app.turn:
+            # a plan for another turn is out of date, like one undone while it was being worked out
+            self.planned = self.start_planning(app)
+            return
+        plans = self.collect_plans(planned)
+        if plans is not None:
+            self.planned = None
+            self.play_turn(app, plans)
+
+    def take_turn(self, app) -> None:
+        """
+        Plays the turn of the alignment whose turn it is and ends it, waiting for the workers
+
+        :param app: app being played
+        """
+        self.play_turn(app, self.plan_turn(app))
+
+    def play_turn(self, app, plans: List[List[Candidate]]) -> None:
+        """
+        Plays the best candidates that are still valid and ends the turn
+
+        :param app: app being played
+        :param plans: best candidates of each unit scored
+        """
+        from config.commands import EndTurn, apply_command
+
+        alignment = app.get_alignment_turn()
+        # units with the most to gain go first, later units fall back on their other candidates
+        plans.sort(key=lambda candidates: (-candidates[0].score, candidates[0].unit))
+        for candidates in plans:
+            for candidate in candidates:
+                if self.is_valid(app, candidate, alignment):
+                    self.execute(app, candidate)
+                    break
+        apply_command(app, EndTurn())
+
+    def is_valid(self, app, candidate: Candidate, alignment: str) -> bool:
+        """
+        Checks a candidate against the board as it is now, after the moves of the units before it
+
+        :param app: app being played
+        :param candidate: candidate move
+        :param alignment: alignment whose turn it is
+        :return: True if the candidate can still be played
+        """
+        from config.app import Position, SelectedUnit
+
+        (row, col), end = candidate.path[0], candidate.path[-1]
+        unit = app.unit_map[row][col].unit
+        if unit is None or unit.alignment != alignment or unit.health <= 0:
+            return False
+        if candidate.target is not None:
+            target = app.unit_map[candidate.target[0]][candidate.target[1]].unit
+            if target is None or target.alignment == unit.alignment or target.health <= 0:
+                return False
+        if end == (row, col):
+            return True
+        # enemies only ever leave during a turn, which can only make the planned path cheaper
+        return Position(*end) in app.get_reachable_tiles(SelectedUnit(row, col, unit))
+
+    def execute(self, app, candidate: Candidate) -> None:
+        """
+        Plays a candidate as a move command, the enemy answers with the attack that hurts the most
+
+        :param app: app being played
+        :param candidate: candidate move
+        """
+        from config.commands import Move, apply_command
+
+        steps = list(candidate.path)
+        attacks = None
+        if candidate.target is not None:
+            steps.append(candidate.target)
+            unit = app.unit_map[steps[0][0]][steps[0][1]].unit
+            enemy = app.unit_map[candidate.target[0]][candidate.target[1]].unit
+            attacks = (candidate.attack, get_best_attack(tuple(enemy.attacks.items()), unit.health,
+                                                             unit.max_health)[0])
+        if len(steps) >= 2:
+            apply_command(app, Move(tuple(tuple(step) for step in steps), attacks))
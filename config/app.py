@@ -1,18 +1,31 @@
 import copy
+import gc
 import heapq
-import json
+import math
+from itertools import repeat
 
 import pygame
 from collections import namedtuple
 
 from pygame import Surface
 
-from config import constants
+from config import constants, assets
+from config.ai import AIPlayer
 from config.button import Button
+from config.catalog import Catalog
+from config.forecast import forecast_battle
+from config.history import History
+from config.line_of_sight import LineOfSight
+from config.mapgen import generate_map, TILE_TYPES
+from config.memory import MemoryTracker
+from config.pathfinding import PathFinder, PathWorker
+from config.profiler import FrameProfiler
+from config.status import StatusEngine
 from config.tile import Tile
 from config.ui import UI, InterfaceLocation
-from config.unit import Unit, MovingUnit
-from typing import List, Dict, Optional, Tuple
+from config.unit import Unit, MovingUnit, UnitState
+from config.visibility import Visibility
+from typing import List, Dict, Optional, Sequence, Tuple, Set
 
 SelectedTile = namedtuple('SelectedTile', ['row', 'col', 'tile_info'])
 SelectedUnit = namedtuple('SelectedUnit', ['row', 'col', 'unit_info'])
@@ -22,30 +35,72 @@ Position = namedtuple('Position', ['row', 'col'])
 
 
 class App:
-    def __init__(self):
+    def __init__(self, rows=26, cols=10, alignments: Sequence[str] = constants.ALIGNMENTS):
         self.ui_dict: Dict[str, UI] = {constants.UI_DEFAULT: UI(self)}
         self.ui_removal_list: List[str] = []
+        # areas of the screen the uis changed since the display last took them, for a display that only
+        # updates what changed, uis closed between frames add their areas too
+        self.ui_dirty_rects: List[pygame.Rect] = []
+        # what the board was drawn from last frame and the tile under the mouse this frame, the display only
+        # takes the uis' areas while it stays the same
+        self.frame_key = None
+        self.hovered_position: Optional[Position] = None
         self.game_map: List[List[XYTile]] = []
         self.unit_map: List[List[XYUnit]] = []
-        self.tile_offset_x = constants.TILE_SIZE * 1.5
-        self.tile_offset_y = constants.TILE_SIZE * 0.425
+        # the map is laid out at a zoom of 1 and scaled when it is drawn
+        self.zoom = 1.0
         self.tile_info: Dict[str, Tile] = {}
         self.unit_info: Dict[str, Unit] = {}
         self.start_tile: Optional[SelectedTile] = None
         self.start_unit: Optional[SelectedUnit] = None
         self.shortest_path: List[SelectedTile] = []
         self.moving_sprites = pygame.sprite.Group()
-        self.rows = 26
-        self.cols = 10
-        self.alignments = constants.ALIGNMENTS
+        self.rows = rows
+        self.cols = cols
+        # sides in the game, taking turns in this order
+        self.alignments = list(alignments)
         self.alignment_indicators = {}
         self.turn = 0
+        self.board_version = 0
+        # bumped when a tile changes, unlike board_version units moving leave it alone
+        self.tiles_version = 0
+        self.terrain_image: Optional[Surface] = None
+        self.terrain_key = None
+        self.dirty_rows: Set[int] = set()
+        self.history = History()
+        self.profiler = FrameProfiler()
+        self.memory = MemoryTracker()
+        self.catalog = Catalog()
+        self.difficult_flag = 0
+        self.alignments_version = -1
+        self.reachable_cache: Dict[Tuple[int, int, int, int], List[Position]] = {}
+        self.reachable_cache_version = -1
+        self.visibility = Visibility(rows, cols, self.alignments)
+        self.fog_of_war = constants.FOG_OF_WAR
+        self.fog_image = None
+        self.line_of_sight = LineOfSight(self)
+        self.status_engine = StatusEngine(self.alignments)
+        self.ai = AIPlayer()
+        self.pathfinder = PathFinder(self)
+        self.path_worker = PathWorker(self.pathfinder)
+        # game log the commands played are written to, see config.replay
+        self.recorder = None
+        # map file being streamed into the board a chunk at a time, see config.mapfile
+        self.map_loader = None
 
         # six directions to adjacent tiles
         # on even going left is the issue, on odd going right is the issue
         self.directions_even = [(-2, 0), (-1, 1), (1, 1), (2, 0), (1, 0), (-1, 0)]
         self.directions_odd = [(-2, 0), (-1, 0), (1, 0), (2, 0), (1, -1), (-1, -1)]
 
+    @property
+    def tile_offset_x(self) -> float:
+        return constants.TILE_OFFSET_X * self.zoom
+
+    @property
+    def tile_offset_y(self) -> float:
+        return constants.TILE_OFFSET_Y * self.zoom
+
     def test_function(self, tile: Position, speed: int):
         self.unit_map[tile.row][tile.col].unit.set_speed(speed)
 
@@ -53,55 +108,125 @@ class App:
         self.load_tiles_and_units()
         self.initialize_maps()
         self.initialize_ui()
+        self.history.reset(self)
 
     def load_tiles_and_units(self) -> None:
         """
-        Loads in the information of all tiles and units in the game
+        Loads in the information of all tiles and units in the game from the compiled catalog
         """
-        # load tiles
-        with open("info/tile_info.json") as f:
-            data = json.load(f)
-        for tile in data["tile_info"]:
-            self.tile_info[tile["name"]] = Tile(tile["name"], tile["desc"], tile["traits"])
+        self.catalog.load(self)
+        self.refresh_catalog_flags()
 
-        # load units
-        with open("info/unit_info.json") as f:
-            data = json.load(f)
-        for unit in data["unit_info"]:
-            self.unit_info[unit["name"]] = Unit(unit["name"], unit["desc"], unit["traits"], unit["health"],
-                                                unit["attacks"], unit["speed"], unit["scale_size"], unit["offset_x"],
-                                                unit["offset_y"], unit["ring_offset_x"], unit["ring_offset_y"],
-                                                unit["alpha"])
+    def refresh_catalog_flags(self) -> None:
+        """
+        Looks up the catalog bitflags used by the game rules, they can move when the catalog reloads
+        """
+        self.difficult_flag = self.catalog.get_trait_flag(constants.TRAIT_DIFFICULT)
+        # move costs come from the flags, so the paths searched so far are out of date
+        self.board_version += 1
+        self.tiles_version += 1
 
     def initialize_maps(self) -> None:
         """
-        Initializes any map presets in the game
-        """
-        for i in range(self.rows):
-            row = []
-            unit_row = []
-            for j in range(self.cols):
-                tile_x = j * self.tile_offset_x
-                tile_y = i * self.tile_offset_y
-                if i % 2 == 1:
-                    tile_x += self.tile_offset_x / 2
-                tile = self.get_tile(constants.TILE_BLANK)
-                row.append(XYTile(tile_x, tile_y, tile))
-                unit_row.append(XYUnit(tile_x, tile_y, None))
-            self.game_map.append(row)
-            self.unit_map.append(unit_row)
-
+        Initializes any map presets in the game, the map file MAP_FILE streamed in or a generated map when
+        MAP_SEED is set
+        """
+        if constants.MAP_FILE is not None:
+            from config.mapfile import MapLoader
+            self.map_loader = MapLoader(self, constants.MAP_FILE, self.get_screen_rows(constants.SCREEN_HEIGHT))
+            return
+        rows, cols = self.rows, self.cols
+        if constants.MAP_SEED is not None:
+            self.reset_map(rows, cols)
+            self.append_map_rows(generate_map(rows, cols, constants.MAP_SEED),
+                                 [self.tile_info[name] for name in TILE_TYPES])
+            return
+
+        self.reset_map(rows, cols)
+        self.append_map_rows([[0] * cols] * rows, [self.tile_info[constants.TILE_BLANK]])
         for neighbor, direction in self.get_neighbors(Position(5, 5)):
             tile_name = constants.TILE_DIFFICULT
             self.update_tile([Position(neighbor.row, neighbor.col)], tile_name)
 
+    def reset_map(self, rows: int, cols: int) -> None:
+        """
+        Empties the maps for a board of a new size, they are filled again with append_map_rows and the board
+        has no rows until then
+
+        :param rows: rows of the new board
+        :param cols: cols of the new board
+        """
+        if self.map_loader is not None:
+            self.map_loader.close()
+            self.map_loader = None
+        self.rows = 0
+        self.cols = cols
+        self.game_map = []
+        self.unit_map = []
+        self.visibility.reset(rows, cols)
+        self.status_engine.reset()
+        self.board_version += 1
+
+    def append_map_rows(self, tiles, templates: List[Tile]) -> None:
+        """
+        Appends rows of tiles without units to the bottom of the maps, so big maps can be filled a chunk at a time.
+        The board is as many rows as have been appended so far. The positions in the maps are at a zoom of 1.
+
+        :param tiles: rows of tile types, each an index into templates
+        :param templates: tile of each tile type
+        """
+        # the rows hold no reference cycles, so the collector is paused rather than rescanning the
+        # millions of new objects of a big map over and over
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            offset_x, offset_y = constants.TILE_OFFSET_X, constants.TILE_OFFSET_Y
+            # odd rows are shifted half a tile to the right
+            xs = ([col * offset_x for col in range(self.cols)],
+                  [col * offset_x + offset_x / 2 for col in range(self.cols)])
+            first = len(self.game_map)
+            for types in tiles:
+                row = len(self.game_map)
+                tile_y = row * offset_y
+                tiles_x = xs[row % 2]
+                types = types.tolist() if hasattr(types, 'tolist') else types
+                copies = [templates[tile_type].copy() for tile_type in types]
+                self.game_map.append(list(map(XYTile._make, zip(tiles_x, repeat(tile_y), copies))))
+                self.unit_map.append(list(map(XYUnit._make, zip(tiles_x, repeat(tile_y), repeat(None)))))
+                # the path snapshots know the board grew from its rows, so the board version is left alone
+                self.dirty_rows.add(row)
+            self.rows = len(self.game_map)
+            self.tiles_version += 1
+            if first and self.alignments_version == self.board_version:
+                # rows added below a board in play, like a map being streamed in, only the new rows are given
+                # alignments rather than all of them being worked out again, and the units that could only reach
+                # the old bottom edge may now go further
+                self.add_row_alignments(first)
+                self.reachable_cache.clear()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def get_tile_position(self, row: int, col: int) -> Tuple[float, float]:
+        """
+        Gets the screen position of a tile on the map at the current zoom
+
+        :param row: row of tile
+        :param col: col of tile
+        :return: x, y position of the top left of the tile
+        """
+        tile_x = col * self.tile_offset_x
+        tile_y = row * self.tile_offset_y
+        if row % 2 == 1:
+            tile_x += self.tile_offset_x / 2
+        return tile_x, tile_y
+
     def initialize_ui(self):
         default_ui = self.ui_dict[constants.UI_DEFAULT]
 
         # add the sidebar
-        ui_map_image = pygame.image.load("assets/ui_" + constants.UI_MAP + ".png")
-        ui_map_image = pygame.transform.scale(ui_map_image,
-                                              (constants.UI_MAP_WIDTH, constants.UI_MAP_HEIGHT))
+        ui_map_image = assets.get_image("assets/ui_" + constants.UI_MAP + ".png",
+                                        (constants.UI_MAP_WIDTH, constants.UI_MAP_HEIGHT))
         ui_x = constants.SCREEN_WIDTH - constants.UI_MAP_WIDTH
         ui_y = 0
         default_ui.add_interface(constants.UI_MAP, InterfaceLocation(ui_x, ui_y, ui_map_image))
@@ -110,9 +235,8 @@ class App:
 
         # add the turn indicator
         for alignment in self.alignments:
-            alignment_image = pygame.image.load("assets/turn_" + alignment + ".png")
-            alignment_image = pygame.transform.scale(alignment_image,
-                                                     (constants.UI_TURN_WIDTH, constants.UI_TURN_HEIGHT))
+            alignment_image = assets.get_image("assets/turn_" + alignment + ".png",
+                                               (constants.UI_TURN_WIDTH, constants.UI_TURN_HEIGHT))
             self.alignment_indicators[alignment] = alignment_image
         ui_x = constants.SCREEN_WIDTH - constants.UI_TURN_WIDTH * 2
         ui_y = constants.UI_TURN_HEIGHT
@@ -121,41 +245,200 @@ class App:
                                  InterfaceLocation(ui_x, ui_y, self.alignment_indicators[self.get_alignment_turn()]))
 
     def update(self, screen, hovered_tile: SelectedTile):
-        # update tile info
-        self.update_tile_alignments()
+        profiler = self.profiler
+        self.hovered_position = None if hovered_tile is None else Position(hovered_tile.row, hovered_tile.col)
 
-        # draw the tiles
-        for row in self.game_map:
-            for tile_x, tile_y, tile in row:
-                screen.blit(tile.image, (tile_x, tile_y))
+        # a map being streamed in first reads the rows coming onto the screen, then a few more chunks
+        if self.map_loader is not None:
+            with profiler.phase("map loading"):
+                if self.map_loader.step(self, constants.MAP_STREAM_BUDGET, self.get_screen_rows(screen.get_height())):
+                    self.map_loader = None
 
-        # draw the units
-        self.moving_sprites.update()
-        self.moving_sprites.draw(screen)
-        for row in range(self.rows):
-            for col in range(self.cols):
-                unit_x, unit_y, unit = self.unit_map[row][col]
-                if unit is not None:
-                    if unit.health <= 0:
-                        self.unit_map[row][col] = XYUnit(unit_x, unit_y, None)
-                        unit.destroy()
-                    unit.update(screen, unit_x, unit_y)
+        # update tile info, zone of control only changes when the board does
+        with profiler.phase("alignments"):
+            self.refresh_tile_alignments()
+
+        zoom = self.zoom
+        visible_rows, visible_cols = self.get_visible_area(screen)
+
+        # draw the tiles
+        with profiler.phase("tiles"):
+            self.draw_terrain(screen)
+            if self.fog_of_war:
+                self.draw_fog(screen)
+
+        # draw the units, units off the screen are removed when they are defeated by remove_uis
+        with profiler.phase("units"):
+            self.moving_sprites.update()
+            for sprite in self.moving_sprites:
+                sprite.draw(screen, zoom)
+            for row in range(visible_rows):
+                for col in range(visible_cols):
+                    unit_x, unit_y, unit = self.unit_map[row][col]
+                    if unit is not None:
+                        if unit.health <= 0:
+                            self.set_unit(Position(row, col), None)
+                            unit.destroy()
+                        if self.can_see(row, col) or unit.alignment == self.get_alignment_turn():
+                            unit.update(screen, unit_x, unit_y, zoom)
 
         # draw tile overlay
-        if self.start_unit is None and hovered_tile is not None:
-            self.overlay([Position(hovered_tile.row, hovered_tile.col)], self.tile_info[constants.TILE_CHOSEN].image,
-                         screen)
+        with profiler.phase("overlay"):
+            range_unit = self.start_unit
+            if range_unit is None and hovered_tile is not None:
+                hovered_unit = self.unit_map[hovered_tile.row][hovered_tile.col].unit
+                if hovered_unit is not None and self.can_see(hovered_tile.row, hovered_tile.col):
+                    range_unit = SelectedUnit(hovered_tile.row, hovered_tile.col, hovered_unit)
+            if range_unit is not None and not self.moving_sprites:
+                self.draw_movement_range(range_unit, screen)
+                self.draw_ranged_targets(range_unit, screen)
+
+            if self.start_unit is None and hovered_tile is not None:
+                self.overlay([Position(hovered_tile.row, hovered_tile.col)],
+                             self.tile_info[constants.TILE_CHOSEN].image, screen)
 
         # update unit info on interface
-        default_ui = self.ui_dict[constants.UI_DEFAULT]
-        text_list, text_xy_list = generate_uinfo_text(self.start_unit)
-        default_ui.update_text(constants.UI_UINFO, text_list, text_xy_list)
+        with profiler.phase("ui text"):
+            default_ui = self.ui_dict[constants.UI_DEFAULT]
+            unit_info = None if self.start_unit is None else self.start_unit.unit_info
+            key = () if unit_info is None else (unit_info.name, unit_info.speed, unit_info.movement)
+            if not default_ui.has_text(constants.UI_UINFO, key):
+                text_list, text_xy_list = generate_uinfo_text(self.start_unit)
+                default_ui.update_text(constants.UI_UINFO, text_list, text_xy_list, key)
+
+        # draw ui interfaces/buttons, each ui is one blit unless it changed
+        with profiler.phase("ui"):
+            for ui in self.ui_dict.values():
+                self.ui_dirty_rects.extend(ui.draw(screen))
+
+    def take_dirty_rects(self, screen) -> List[pygame.Rect]:
+        """
+        Takes the areas of the screen that changed since the last call, made once the frame is drawn and
+        before the display is updated. The board is drawn over the whole screen every frame, so the whole
+        screen changed whenever anything the board is drawn from did, otherwise only the uis' areas did.
 
-        # draw ui interfaces/buttons
-        for ui in self.ui_dict.values():
-            ui.draw_interfaces(screen)
-            ui.draw_buttons(screen)
-            ui.draw_text(screen)
+        :param screen: main surface
+        :return: list of changed areas
+        """
+        rects = self.ui_dirty_rects
+        self.ui_dirty_rects = []
+        key = self.get_frame_key(screen)
+        # sprites moving, rows streaming in and the computer's turn change the board without a version to
+        # compare, so those frames are always taken whole
+        if key != self.frame_key or self.moving_sprites or self.map_loader is not None or self.is_ai_turn():
+            rects = [screen.get_rect()]
+        self.frame_key = key
+        return rects
+
+    def get_frame_key(self, screen) -> tuple:
+        """
+        Gets what the board, its overlays and the set of uis are drawn from, units changing bump board_version
+
+        :param screen: main surface
+        :return: key that is equal for frames drawn the same
+        """
+        start_unit = None if self.start_unit is None else (self.start_unit.row, self.start_unit.col)
+        return (self.board_version, self.tiles_version, self.zoom, screen.get_size(), self.fog_of_war, self.turn,
+                self.hovered_position, start_unit, tuple((row, col) for row, col, _ in self.shortest_path),
+                tuple(self.ui_dict))
+
+    def draw_terrain(self, screen) -> None:
+        """
+        Draws the tiles that reach onto the screen. They are drawn onto an image the size of the screen that is
+        kept until a tile or the zoom changes, so a map zoomed out to thousands of tiles is a single blit.
+
+        :param screen: main surface
+        """
+        key = (self.tiles_version, self.zoom, screen.get_size())
+        if self.terrain_key != key:
+            zoom = self.zoom
+            visible_rows, visible_cols = self.get_visible_area(screen)
+            if self.terrain_image is None or self.terrain_image.get_size() != screen.get_size():
+                self.terrain_image = Surface(screen.get_size())
+            self.terrain_image.fill('black')
+            images = {}
+            blits = []
+            for row in self.game_map[:visible_rows]:
+                for tile_x, tile_y, tile in row[:visible_cols]:
+                    image = images.get(tile.name)
+                    if image is None:
+                        image = images[tile.name] = assets.get_zoomed_image(tile.image, zoom)
+                    blits.append((image, (tile_x * zoom, tile_y * zoom)))
+            self.terrain_image.blits(blits, False)
+            self.terrain_key = key
+        screen.blit(self.terrain_image, (0, 0))
+
+    def get_visible_area(self, screen) -> Tuple[int, int]:
+        """
+        Gets how many rows and cols of the map reach onto the screen at the current zoom, the map is drawn
+        from the top left corner of the screen
+
+        :param screen: main surface
+        :return: number of rows and cols to draw
+        """
+        width, height = screen.get_size()
+        return min(self.rows, self.get_screen_rows(height)), min(self.cols, int(width / self.tile_offset_x) + 1)
+
+    def get_screen_rows(self, height: int) -> int:
+        """
+        Gets how many rows of a board as tall as it gets reach onto a screen at the current zoom
+
+        :param height: height of the screen
+        :return: number of rows
+        """
+        return int(height / self.tile_offset_y) + 1
+
+    def set_zoom(self, zoom: float) -> None:
+        """
+        Sets the zoom the map is drawn at, snapped to the nearest of ZOOM_LEVELS so every image drawn has a
+        scaled copy of the same size as the spacing of the tiles
+
+        :param zoom: zoom asked for
+        """
+        self.zoom = assets.get_zoom_level(zoom)
+
+    def zoom_by(self, steps: int) -> None:
+        """
+        Zooms in or out by a number of zoom levels
+
+        :param steps: levels to zoom in by, negative to zoom out
+        """
+        levels = constants.ZOOM_LEVELS
+        index = levels.index(assets.get_zoom_level(self.zoom))
+        self.zoom = levels[max(0, min(len(levels) - 1, index + steps))]
+
+    def can_see(self, row: int, col: int) -> bool:
+        """
+        Checks if the alignment whose turn it is can see a tile
+
+        :param row: row of tile
+        :param col: col of tile
+        :return: True if the tile is visible or fog of war is off
+        """
+        return not self.fog_of_war or self.visibility.is_visible(self.get_alignment_turn(), row, col)
+
+    def draw_fog(self, screen) -> None:
+        """
+        Darkens every tile the alignment whose turn it is can't see, in a single batched blit
+
+        :param screen: main surface
+        """
+        if self.fog_image is None:
+            self.fog_image = self.tile_info[constants.TILE_BLANK].image.copy()
+            self.fog_image.fill((0, 0, 0), special_flags=pygame.BLEND_RGB_MULT)
+            self.fog_image.set_alpha(constants.FOG_ALPHA)
+        counts = self.visibility.counts[self.get_alignment_turn()]
+        cols = self.cols
+        zoom = self.zoom
+        image = assets.get_zoomed_image(self.fog_image, zoom)
+        visible_rows, visible_cols = self.get_visible_area(screen)
+        screen.blits([(image, (tile_x * zoom, tile_y * zoom))
+                      for row_index, row in enumerate(self.game_map[:visible_rows])
+                      for col, (tile_x, tile_y, tile) in enumerate(row[:visible_cols])
+                      if not counts[row_index * cols + col]], False)
+
+    def toggle_fog_of_war(self) -> None:
+        self.fog_of_war = not self.fog_of_war
 
     def handle_event(self, event) -> None:
         """
@@ -166,8 +449,19 @@ class App:
         for ui in self.ui_dict.values():
             ui.handle_event(event)
 
+        self.remove_uis()
+
+    def remove_uis(self) -> None:
+        """
+        Closes the uis that asked to be removed
+        """
         for ui_name in self.ui_removal_list:
-            self.ui_dict.pop(ui_name)
+            ui = self.ui_dict.pop(ui_name)
+            if ui.rect is not None:
+                self.ui_dirty_rects.append(ui.rect)
+            # only the units on the screen are checked every frame
+            if ui_name == constants.UI_BATTLE:
+                self.remove_defeated_units()
         self.ui_removal_list.clear()
 
     # Get Shortest Path ================================================================
@@ -241,7 +535,7 @@ class App:
         :return: move cost of moving the unit onto tile
         """
         move_cost = 1
-        if "difficult" in tile.traits:
+        if tile.trait_flags & self.difficult_flag:
             move_cost = 2
         for alignment in tile.alignments:
             if alignment != unit.alignment:
@@ -253,6 +547,91 @@ class App:
 
         return move_cost
 
+    def get_reachable_tiles(self, unit: SelectedUnit) -> List[Position]:
+        """
+        Gets every empty tile a unit can move to this turn with one flood from its position, following the same
+        rules as move_unit: a step can be taken while the unit has movement left, difficult terrain and enemy
+        zone of control use up more of it. Results are cached until the unit's movement or the board changes.
+
+        :param unit: unit and its position
+        :return: list of positions the unit can end its move on
+        """
+        if self.reachable_cache_version != self.board_version:
+            self.reachable_cache.clear()
+            self.reachable_cache_version = self.board_version
+        self.refresh_tile_alignments()
+        unit_info = unit.unit_info
+        key = (unit.row, unit.col, id(unit_info), unit_info.movement)
+        reachable = self.reachable_cache.get(key)
+        if reachable is not None:
+            return reachable
+
+        # most movement left on arrival at each tile
+        start = (unit.row, unit.col)
+        best = {start: unit_info.movement}
+        open_set = [(-unit_info.movement, unit.row, unit.col)]
+        while open_set:
+            movement, row, col = heapq.heappop(open_set)
+            movement = -movement
+            if movement <= 0 or movement < best[(row, col)]:
+                continue
+            for dx, dy in get_directions(row):
+                nx, ny = row + dx, col + dy
+                if 0 <= nx < self.rows and 0 <= ny < self.cols:
+                    left = max(0, movement - self.get_move_cost(self.game_map[nx][ny].tile, unit_info, True))
+                    if left > best.get((nx, ny), -1):
+                        best[(nx, ny)] = left
+                        heapq.heappush(open_set, (-left, nx, ny))
+
+        reachable = [Position(row, col) for row, col in best
+                     if (row, col) != start and self.unit_map[row][col].unit is None]
+        self.reachable_cache[key] = reachable
+        return reachable
+
+    def draw_movement_range(self, unit: SelectedUnit, screen) -> None:
+        """
+        Draws the movement range of a unit in a single batched blit
+
+        :param unit: unit and its position
+        :param screen: main surface
+        """
+        image = assets.get_image("assets/tile_" + constants.TILE_CHOSEN + ".png",
+                                 (constants.TILE_SIZE, constants.TILE_SIZE), constants.MOVE_RANGE_ALPHA, True)
+        image = assets.get_zoomed_image(image, self.zoom)
+        game_map = self.game_map
+        zoom = self.zoom
+        screen.blits([(image, (game_map[row][col].x * zoom, game_map[row][col].y * zoom))
+                      for row, col in self.get_reachable_tiles(unit)], False)
+
+    def get_ranged_targets(self, unit: SelectedUnit) -> List[Position]:
+        """
+        Gets the visible enemies a unit could hit with one of its ranged attacks from where it stands
+
+        :param unit: unit and its position
+        :return: list of target positions, empty if the unit has no ranged attack
+        """
+        ranged_flag = self.catalog.get_effect_flag(constants.EFFECT_RANGED)
+        if not any(attack.effect_flags & ranged_flag for attack in unit.unit_info.attacks.values()):
+            return []
+        targets = self.line_of_sight.get_targets(unit.row, unit.col, unit.unit_info.alignment,
+                                                 constants.RANGED_ATTACK_RANGE)
+        return [Position(row, col) for row, col in targets if self.can_see(row, col)]
+
+    def draw_ranged_targets(self, unit: SelectedUnit, screen) -> None:
+        """
+        Marks the targets of a unit's ranged attacks in a single batched blit
+
+        :param unit: unit and its position
+        :param screen: main surface
+        """
+        image = assets.get_image("assets/ring_" + constants.RANGED_TARGET_RING + ".png",
+                                 (constants.TILE_SIZE, constants.TILE_SIZE))
+        image = assets.get_zoomed_image(image, self.zoom)
+        game_map = self.game_map
+        zoom = self.zoom
+        screen.blits([(image, (game_map[row][col].x * zoom, game_map[row][col].y * zoom))
+                      for row, col in self.get_ranged_targets(unit)], False)
+
     # =====================================================================================
     # Combat Functions ====================================================================
     def start_battle(self, unit1: Unit, unit2: Unit) -> None:
@@ -262,9 +641,8 @@ class App:
         :param unit1: the attacking unit
         :param unit2: the enemy unit
         """
-        ui_battle_image = pygame.image.load("assets/ui_" + constants.UI_BATTLE + ".png")
-        ui_battle_image = pygame.transform.scale(ui_battle_image,
-                                                 (constants.UI_BATTLE_WIDTH, constants.UI_BATTLE_HEIGHT))
+        ui_battle_image = assets.get_image("assets/ui_" + constants.UI_BATTLE + ".png",
+                                           (constants.UI_BATTLE_WIDTH, constants.UI_BATTLE_HEIGHT))
 
         ui_x = (constants.SCREEN_WIDTH - ui_battle_image.get_width()) // 2
         ui_y = (constants.SCREEN_HEIGHT - ui_battle_image.get_height()) // 2
@@ -328,6 +706,12 @@ class App:
                                     battle_ui.attack_cancel, constants.BUTTON_ATTACK_OPTION_WIDTH,
                                     constants.BUTTON_ATTACK_OPTION_HEIGHT))
 
+        # forecast every attack pairing up front so changing attacks is only a lookup
+        forecast_y = ui_mid_y - 3 * (constants.FONT_BATTLE_SIZE + constants.UI_UINFO_Y_BUFFER)
+        forecast_xy = [(ui_x + margin_x, forecast_y),
+                       (ui_x + constants.BUTTON_ATTACK_WIDTH + 3 * margin_x, forecast_y)]
+        battle_ui.set_forecast(forecast_battle(unit1, unit2), unit1, unit2, forecast_xy)
+
     # =====================================================================================
     def update_tile_alignments(self) -> None:
         """
@@ -349,6 +733,35 @@ class App:
                             tile = self.game_map[new_row][new_col].tile
                             tile.alignments.add(unit.alignment)
 
+    def add_row_alignments(self, first: int) -> None:
+        """
+        Gives the rows from a row down, which have no units yet, the alignments of the units next to them
+
+        :param first: first row without alignments
+        """
+        for row in self.game_map[first:]:
+            for xytile in row:
+                xytile.tile.alignments = set()
+
+        # steps go at most two rows up or down
+        for row in range(max(0, first - 2), first):
+            for col in range(self.cols):
+                unit = self.unit_map[row][col].unit
+                if unit is not None:
+                    for d in get_directions(row):
+                        new_row = row + d[0]
+                        new_col = col + d[1]
+                        if first <= new_row < self.rows and 0 <= new_col < self.cols:
+                            self.game_map[new_row][new_col].tile.alignments.add(unit.alignment)
+
+    def refresh_tile_alignments(self) -> None:
+        """
+        Updates the alignments around each tile if the board changed since they were last updated
+        """
+        if self.alignments_version != self.board_version:
+            self.update_tile_alignments()
+            self.alignments_version = self.board_version
+
     def update_tile(self, tiles: List[Position], tile_name: str) -> None:
         """
         Updates all given positions with the given tile
@@ -360,6 +773,8 @@ class App:
             x, y, tile = self.game_map[t.row][t.col]
             new_tile = self.get_tile(tile_name)
             self.game_map[t.row][t.col] = XYTile(x, y, new_tile)
+            self.mark_dirty(t.row)
+        self.tiles_version += 1
 
     def get_tile(self, tile: str) -> Tile:
         """
@@ -368,7 +783,7 @@ class App:
         :param tile: name of tile
         :return: copy of tile
         """
-        return copy.copy(self.tile_info[tile])
+        return self.tile_info[tile].copy()
 
     def spawn_unit(self, tile: Position, unit: Unit, alignment: str) -> None:
         """
@@ -378,10 +793,59 @@ class App:
         :param unit: name of unit
         :param alignment: alignment of unit
         """
-        x, y, old_unit = self.unit_map[tile.row][tile.col]
         unit_copy = copy.copy(unit)
         unit_copy.set_original_alignment(alignment)
-        self.unit_map[tile.row][tile.col] = XYUnit(x, y, unit_copy)
+        self.status_engine.register(unit_copy)
+        self.set_unit(tile, unit_copy)
+
+    def place_unit(self, tile: Position, state: UnitState) -> None:
+        """
+        Spawn a unit on the given tile and restore its state, used when loading games and snapshots
+
+        :param tile: position of tile
+        :param state: state of unit
+        """
+        unit_copy = copy.copy(self.unit_info[state.name])
+        unit_copy.set_original_alignment(state.original_alignment)
+        self.status_engine.register(unit_copy)
+        unit_copy.set_state(state)
+        self.set_unit(tile, unit_copy)
+
+    def remove_unit(self, tile: Position) -> None:
+        """
+        Removes the unit on the given tile, if there is one
+
+        :param tile: position of tile
+        """
+        unit = self.unit_map[tile.row][tile.col].unit
+        if unit is not None:
+            self.set_unit(tile, None)
+            unit.destroy()
+
+    def set_unit(self, tile: Position, unit: Optional[Unit]) -> None:
+        """
+        Puts a unit on a tile, or clears it with None. Every change to the units on the board goes through here
+        so the history and visibility stay in sync.
+
+        :param tile: position of tile
+        :param unit: unit being placed, None to clear the tile
+        """
+        x, y, old_unit = self.unit_map[tile.row][tile.col]
+        if old_unit is not None:
+            self.visibility.remove_unit(tile.row, tile.col, old_unit)
+        self.unit_map[tile.row][tile.col] = XYUnit(x, y, unit)
+        if unit is not None:
+            self.visibility.add_unit(tile.row, tile.col, unit)
+        self.mark_dirty(tile.row)
+
+    def mark_dirty(self, row: int) -> None:
+        """
+        Marks a row of the board as changed since the last history snapshot
+
+        :param row: row that changed
+        """
+        self.dirty_rows.add(row)
+        self.board_version += 1
 
     def move_unit(self, unit: SelectedUnit, target_tile: SelectedTile,
                   path: List[SelectedTile], location, is_attacking=False,
@@ -397,7 +861,6 @@ class App:
         """
         can_move = True
         if path:
-            start_x, start_y, start_unit_info = self.unit_map[unit.row][unit.col]
             max_movement = min(len(path) - 1, unit.unit_info.movement)
             # if no movement then check if they are attacking
             if max_movement == 0 and len(path) == 2 and unit.unit_info.can_attack:
@@ -413,14 +876,13 @@ class App:
                 if new_unit_info is not None:
                     if new_unit_info.alignment != unit.unit_info.alignment and unit.unit_info.can_attack:
                         is_attacking = True
-                        self.unit_map[unit.row][unit.col] = XYUnit(start_x, start_y, None)
+                        self.set_unit(Position(unit.row, unit.col), None)
                     else:
                         can_move = False
                 else:
-                    self.unit_map[unit.row][unit.col] = XYUnit(start_x, start_y, None)
+                    self.set_unit(Position(unit.row, unit.col), None)
 
             if can_move:
-                cur_x, cur_y, temp = self.unit_map[path[location].row][path[location].col]
                 end_point = len(path) - 2 if is_attacking else len(path) - 1
                 if max_movement > 0 and location < end_point:
                     row, col, temp = path[location]
@@ -439,23 +901,82 @@ class App:
                                                   self.get_move_cost(next_tile, unit.unit_info, True))
                     self.moving_sprites.add(sprite)
                 else:
-                    self.unit_map[path[location].row][path[location].col] = XYUnit(cur_x, cur_y, unit.unit_info)
+                    self.set_unit(Position(path[location].row, path[location].col), unit.unit_info)
                     if is_attacking:
+                        # the battle changes the defender, the snapshot is recorded once it closes
+                        self.mark_dirty(path[-1].row)
                         self.start_battle(unit.unit_info, new_unit_info)
+                    else:
+                        self.history.record(self)
             elif is_attacking:
+                self.mark_dirty(unit.row)
+                self.mark_dirty(path[-1].row)
                 self.start_battle(unit.unit_info, new_unit_info)
 
+    def finish_moves(self) -> None:
+        """
+        Plays every moving unit to the end of its path at once, for moves made without drawing frames
+        """
+        while self.moving_sprites:
+            self.moving_sprites.update()
+
+    def play_move(self, path: List[Position], attacks: Optional[Tuple[str, str]] = None) -> None:
+        """
+        Moves a unit along a path through move_unit and settles the battle at its end at once, for moves that
+        don't come from the mouse
+
+        :param path: positions from the unit to where it ends its move, or to the enemy it attacks
+        :param attacks: attacks of the moving unit and of the enemy if the path ends in a battle
+        """
+        path = [SelectedTile(row, col, self.game_map[row][col].tile) for row, col in path]
+        unit = self.unit_map[path[0].row][path[0].col].unit
+        self.move_unit(SelectedUnit(path[0].row, path[0].col, unit), path[-1], path, 0)
+        self.finish_moves()
+
+        battle_ui = self.ui_dict.get(constants.UI_BATTLE)
+        if battle_ui is not None:
+            unit1, unit2 = battle_ui.forecast_units
+            if attacks is None:
+                battle_ui.attack_cancel()
+            else:
+                battle_ui.select_attack(unit1, attacks[0])
+                battle_ui.select_attack(unit2, attacks[1])
+                battle_ui.attack_confirm(unit1, unit2)
+            self.remove_uis()
+            self.remove_defeated_units()
+
+    def remove_defeated_units(self) -> None:
+        """
+        Removes every unit that has run out of health, for battles settled without drawing frames and units
+        poison defeated at the start of their turn
+        """
+        for row in range(self.rows):
+            for col in range(self.cols):
+                unit = self.unit_map[row][col].unit
+                if unit is not None and unit.health <= 0:
+                    self.remove_unit(Position(row, col))
+
+    def is_ai_turn(self) -> bool:
+        """
+        Checks if the computer plays the current turn and nothing is still moving or waiting on a battle
+
+        :return: True if the computer should take its turn
+        """
+        return (self.get_alignment_turn() in constants.AI_ALIGNMENTS and not self.moving_sprites and
+                constants.UI_BATTLE not in self.ui_dict)
+
     def overlay(self, tiles: List[Position], overlay_image, screen) -> None:
         """
         Overlays an image over the entire mlap
 
         :param tiles: list of tile positions to be overlayed
-        :param overlay_image: image
+        :param overlay_image: image at a zoom of 1
         :param screen: screen object
         """
+        overlay_image = assets.get_zoomed_image(overlay_image, self.zoom)
         for tile in tiles:
             tile_info = self.game_map[tile.row][tile.col]
-            screen.blit(overlay_image, (tile_info.x, tile_info.y))
+            screen.blit(overlay_image, (tile_info.x * self.zoom, tile_info.y * self.zoom))
 
     def set_start_tile(self, tile: SelectedTile) -> None:
         """
@@ -476,22 +997,44 @@ class App:
         if unit is not None and unit.alignment == self.alignments[self.turn]:
             self.start_unit = SelectedUnit(tile.row, tile.col, unit)
 
+    def reset_selection(self) -> None:
+        """
+        Clears the selected unit, any moving units and open battles, and refreshes the turn indicator
+        """
+        self.start_tile = None
+        self.start_unit = None
+        self.shortest_path = []
+        self.moving_sprites.empty()
+        battle_ui = self.ui_dict.pop(constants.UI_BATTLE, None)
+        if battle_ui is not None and battle_ui.rect is not None:
+            self.ui_dirty_rects.append(battle_ui.rect)
+        if self.alignment_indicators:
+            self.ui_dict[constants.UI_DEFAULT].update_interface(constants.UI_TURN,
+                                                                self.alignment_indicators[self.get_alignment_turn()])
+
     def is_mouse_on_tile(self, mouse_position: Tuple[int, int]) -> SelectedTile:
         """
-        Checks if mouse is hovering over the tile
+        Checks if mouse is hovering over the tile. Only the tiles whose image covers the mouse are checked,
+        in the same order as the map, so overlapping tiles give the same answer as checking every tile.
 
         :param mouse_position: x, y position of mouse
         :return: tile that mouse is hovering over, None if no tiles
         """
-        x, y = mouse_position
-        for i in range(len(self.game_map)):
-            for j in range(len(self.game_map[0])):
+        # back to the positions of the map at a zoom of 1
+        x, y = mouse_position[0] / self.zoom, mouse_position[1] / self.zoom
+        size = constants.TILE_SIZE
+        offset_x, offset_y = constants.TILE_OFFSET_X, constants.TILE_OFFSET_Y
+        first_row = max(0, math.floor((y - size) / offset_y) + 1)
+        last_row = min(self.rows - 1, math.floor(y / offset_y))
+        for i in range(first_row, last_row + 1):
+            shift = offset_x / 2 if i % 2 == 1 else 0
+            first_col = max(0, math.floor((x - shift - size) / offset_x) + 1)
+            last_col = min(self.cols - 1, math.floor((x - shift) / offset_x))
+            for j in range(first_col, last_col + 1):
                 tile_x, tile_y, tile = self.game_map[i][j]
-                tile_rect = tile.image.get_rect(topleft=(tile_x, tile_y))
-                if tile_rect.collidepoint(x, y):
-                    local_x, local_y = x - tile_rect.x, y - tile_rect.y
-                    if tile.image.get_at((local_x, local_y)).a > 0:
-                        return SelectedTile(i, j, tile)
+                local_x, local_y = int(x - tile_x), int(y - tile_y)
+                if 0 <= local_x < size and 0 <= local_y < size and tile.image.get_at((local_x, local_y)).a > 0:
+                    return SelectedTile(i, j, tile)
 
     def get_active_units(self) -> List[Unit]:
         """
@@ -515,9 +1058,39 @@ class App:
         self.turn = (self.turn + 1) % len(self.alignments)
         new_interface_indicator = self.alignment_indicators[self.alignments[self.turn]]
         self.ui_dict[constants.UI_DEFAULT].update_interface(constants.UI_TURN, new_interface_indicator)
-        for unit in self.get_active_units():
-            unit.set_can_attack(True)
-            unit.set_movement(unit.speed)
+        for row in range(self.rows):
+            for xyunit in self.unit_map[row]:
+                if xyunit.unit is not None:
+                    xyunit.unit.set_can_attack(True)
+                    xyunit.unit.set_movement(xyunit.unit.speed)
+                    self.mark_dirty(row)
+        if self.status_engine.upkeep(self.get_alignment_turn()):
+            self.remove_defeated_units()
+        self.history.record(self)
+        self.memory.end_turn(self)
+
+    def undo(self) -> None:
+        """
+        Undoes the last action, waiting for moving units to finish first. A map being streamed in has no
+        history until all of it is in.
+        """
+        if not self.moving_sprites and self.map_loader is None:
+            self.history.undo(self)
+
+    def redo(self) -> None:
+        """
+        Redoes the last undone action
+        """
+        if not self.moving_sprites and self.map_loader is None:
+            self.history.redo(self)
+
+    def finish_map_loading(self) -> None:
+        """
+        Reads the rest of a map being streamed in, for what needs the whole board
+        """
+        if self.map_loader is not None:
+            self.map_loader.step(self, math.inf)
+            self.map_loader = None
 
     def get_alignment_turn(self):
         return self.alignments[self.turn]
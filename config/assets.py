@@ -0,0 +1,94 @@
+import math
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import pygame
+
+from config import constants
+
+# scaled images by (path, size, alpha, convert_alpha), loaded the first time they are drawn.
+# images in here are shared, so anything that draws onto its image has to copy it first
+images: Dict[Tuple, pygame.Surface] = {}
+# copies of images for the zoom levels by (image, level), the least recently drawn first
+zoomed_images: 'OrderedDict[Tuple[pygame.Surface, float], pygame.Surface]' = OrderedDict()
+zoomed_bytes = 0
+
+
+def get_image(path: str, size: Optional[Tuple[int, int]] = None, alpha: Optional[int] = None,
+              convert_alpha: bool = False) -> pygame.Surface:
+    """
+    Gets an image from disk, scaled and converted, loading it only the first time it is asked for
+
+    :param path: path of the image
+    :param size: width and height to scale the image to, None to keep its size
+    :param alpha: surface alpha of the image, None to leave it opaque
+    :param convert_alpha: whether to convert the image to the display format, ignored until the display is
+        set so games can be played headless without one
+    :return: image
+    """
+    convert_alpha = convert_alpha and pygame.display.get_surface() is not None
+    key = (path, size, alpha, convert_alpha)
+    image = images.get(key)
+    if image is None:
+        image = pygame.image.load(path)
+        if size is not None:
+            image = pygame.transform.scale(image, size)
+        if convert_alpha:
+            image = image.convert_alpha()
+        if alpha is not None:
+            image.set_alpha(alpha)
+        images[key] = image
+    return image
+
+
+def get_zoom_level(zoom: float) -> float:
+    """
+    Gets the zoom level nearest to a zoom, the levels are compared by ratio so 0.7 is nearer 0.5 than 1
+
+    :param zoom: zoom asked for
+    :return: one of ZOOM_LEVELS
+    """
+    return min(constants.ZOOM_LEVELS, key=lambda level: abs(math.log(level / zoom)))
+
+
+def get_zoomed_image(image: pygame.Surface, zoom: float) -> pygame.Surface:
+    """
+    Gets a copy of an image for the zoom level nearest to a zoom, scaled the first time it is drawn at that
+    level. The copies are dropped, least recently drawn first, once they take more than ZOOMED_IMAGE_MEMORY.
+
+    :param image: image at a zoom of 1
+    :param zoom: zoom it is drawn at
+    :return: image, shared like the images from get_image
+    """
+    global zoomed_bytes
+    level = get_zoom_level(zoom)
+    if level == 1:
+        return image
+    key = (image, level)
+    zoomed = zoomed_images.get(key)
+    if zoomed is not None:
+        zoomed_images.move_to_end(key)
+        return zoomed
+
+    width, height = image.get_size()
+    size = (max(1, round(width * level)), max(1, round(height * level)))
+    if image.get_bitsize() >= 24:
+        zoomed = pygame.transform.smoothscale(image, size)
+    else:
+        zoomed = pygame.transform.scale(image, size)
+    zoomed_images[key] = zoomed
+    zoomed_bytes += size[0] * size[1] * zoomed.get_bytesize()
+    while zoomed_bytes > constants.ZOOMED_IMAGE_MEMORY and len(zoomed_images) > 1:
+        _, dropped = zoomed_images.popitem(last=False)
+        zoomed_bytes -= dropped.get_width() * dropped.get_height() * dropped.get_bytesize()
+    return zoomed
+
+
+def clear() -> None:
+    """
+    Forgets every loaded image
+    """
+    global zoomed_bytes
+    images.clear()
+    zoomed_images.clear()
+    zoomed_bytes = 0
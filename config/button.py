@@ -3,14 +3,16 @@ from typing import List, Tuple
 import pygame
 from pygame import Surface
 
+from config import assets
+
 
 class Button:
     def __init__(self, image_name, ui, pos, action, width, height, text=None, text_xy=None,
                  has_selected=False, btype=None):
         if text is None:
             text = []
-        self.image = pygame.image.load("assets/button_" + image_name + ".png")
-        self.image = pygame.transform.scale(self.image, (width, height)).convert_alpha()
+        # the cached images are shared, the text is drawn next to them on the ui's image and never onto them
+        self.image = assets.get_image("assets/button_" + image_name + ".png", (width, height), convert_alpha=True)
         self.image_selected = self.image
         self.ui = ui
         self.rect = self.image.get_rect()
@@ -22,25 +24,28 @@ class Button:
         self.btype = btype
 
         if has_selected:
-            self.image_selected = pygame.image.load("assets/button_" + image_name + "_selected.png")
-            self.image_selected = pygame.transform.scale(self.image_selected, (width, height)).convert_alpha()
+            self.image_selected = assets.get_image("assets/button_" + image_name + "_selected.png", (width, height),
+                                                   convert_alpha=True)
 
-    def update(self, surface):
+    def draw(self, surface, origin: Tuple[int, int]) -> None:
         """
-        Update button image
+        Draws the button and its text onto the image of its ui
 
-        :param surface:
+        :param surface: image of the ui
+        :param origin: position of the screen's top left corner on the image
         """
         image = self.image_selected if self.selected else self.image
-        surface.blit(image, self.rect.topleft)
+        x, y = self.rect.x + origin[0], self.rect.y + origin[1]
+        surface.blit(image, (x, y))
         for i in range(len(self.text)):
-            image.blit(self.text[i], self.text_xy[i])
+            surface.blit(self.text[i], (x + self.text_xy[i][0], y + self.text_xy[i][1]))
 
     def toggle_selected(self):
         """
         Toggle whether button is selected- if it has a btype then deselect all other buttons of same btype
         """
         self.selected = not self.selected
+        self.ui.mark_dirty()
 
     def handle_event(self, event):
         """
@@ -0,0 +1,186 @@
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+from typing import Optional
+
+import numpy as np
+import pygame
+
+from config import constants
+
+# raw pixels of a frame as copied off the screen, turned into an image by the writer thread
+Frame = namedtuple('Frame', ['index', 'pixels', 'width', 'height', 'pitch', 'depth', 'channels'])
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def get_png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(image: np.ndarray, level: int = constants.CAPTURE_COMPRESSION) -> bytes:
+    """
+    Encodes an RGB image as a PNG without filtering, zlib does the work and lets go of the GIL while it does
+
+    :param image: height x width x 3 uint8 array
+    :param level: zlib compression level
+    :return: PNG file data
+    """
+    height, width = image.shape[:2]
+    # every row starts with its filter type, 0 for none
+    rows = np.zeros((height, width * 3 + 1), np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (PNG_SIGNATURE + get_png_chunk(b'IHDR', header)
+            + get_png_chunk(b'IDAT', zlib.compress(rows.tobytes(), level)) + get_png_chunk(b'IEND', b''))
+
+
+class FrameCapture:
+    def __init__(self, directory: str = constants.CAPTURE_DIRECTORY, file_format: str = 'png',
+                 queue_size: int = constants.CAPTURE_QUEUE_SIZE, drop_frames: bool = True,
+                 writers: Optional[int] = constants.CAPTURE_WRITERS):
+        """
+        Captures frames of the screen to files. The game only copies the screen's pixels, converting and
+        compressing them is done by writer threads that each take frames off a bounded queue, zlib lets go of
+        the GIL so they compress side by side. When the writers fall behind the queues fill up and frames are
+        either dropped or the game waits for a free slot.
+
+        :param directory: directory the frames are written to
+        :param file_format: 'png' for a numbered image per frame, 'npz' for compressed numpy archives of
+            up to CAPTURE_NPZ_FRAMES frames each
+        :param queue_size: frames that can wait for the writers
+        :param drop_frames: drop frames while the queue is full instead of waiting
+        :param writers: writer threads, None for one per core
+        """
+        if file_format not in ('png', 'npz'):
+            raise ValueError("Unsupported capture format " + file_format)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.file_format = file_format
+        self.drop_frames = drop_frames
+        writers = max(1, writers if writers is not None else os.cpu_count() or 1)
+        # frames of one archive all go to the same writer so it holds them in order, png frames take turns
+        self.group = 1 if file_format == 'png' else constants.CAPTURE_NPZ_FRAMES
+        self.queues = [queue.Queue(max(1, queue_size // writers)) for _ in range(writers)]
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.files = 0
+        # seconds the game spent copying frames and waiting for queue slots
+        self.copy_time = 0.0
+        self.wait_time = 0.0
+        self.error = None
+        # the writers count what they write and their first error under the lock
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run, args=(frames,), name="frame-capture-%d" % i, daemon=True)
+                        for i, frames in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def capture(self, screen: pygame.Surface) -> bool:
+        """
+        Queues a copy of the screen for a writer thread
+
+        :param screen: surface to capture
+        :return: True if the frame was queued, False if it was dropped
+        """
+        start = time.perf_counter()
+        width, height = screen.get_size()
+        if screen.get_bytesize() == 4:
+            # one copy out of a view of the surface's own pixels, the writer picks the channels out of it
+            pixels = screen.get_buffer().raw
+            pitch = screen.get_pitch()
+            depth = 4
+            channels = tuple(shift // 8 if sys.byteorder == 'little' else 3 - shift // 8
+                             for shift in screen.get_shifts()[:3])
+        else:
+            pixels = pygame.image.tobytes(screen, 'RGB')
+            pitch = width * 3
+            depth = 3
+            channels = (0, 1, 2)
+        frame = Frame(self.captured, pixels, width, height, pitch, depth, channels)
+        frames = self.queues[frame.index // self.group % len(self.queues)]
+        self.captured += 1
+        queued = time.perf_counter()
+        self.copy_time += queued - start
+        if self.drop_frames:
+            try:
+                frames.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            frames.put(frame)
+            self.wait_time += time.perf_counter() - queued
+        return True
+
+    def run(self, frames: queue.Queue) -> None:
+        # npz archive this writer is filling and the frames in it so far
+        archive = None
+        archived = 0
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            try:
+                rows = np.frombuffer(frame.pixels, np.uint8).reshape(frame.height, frame.pitch)
+                pixels = rows[:, :frame.width * frame.depth].reshape(frame.height, frame.width, frame.depth)
+                image = pixels[:, :, list(frame.channels)]
+                if self.file_format == 'png':
+                    self.write_png(frame.index, image)
+                else:
+                    if archive is None:
+                        archive = self.open_archive(frame.index)
+                    # frames go into the archive as they come so only one is held at a time, numpy.load reads
+                    # it back with an array per frame named after its index
+                    with archive.open("frame_%06d.npy" % frame.index, 'w', force_zip64=True) as f:
+                        np.lib.format.write_array(f, np.ascontiguousarray(image))
+                    archived += 1
+                    # a dropped frame can leave an archive short, the next group starts a new one anyway
+                    if archived >= self.group or (frame.index + 1) % self.group == 0:
+                        archive.close()
+                        archive = None
+                        archived = 0
+                with self.lock:
+                    self.written += 1
+            except Exception as e:
+                # keep emptying the queue so capture never blocks on a dead writer
+                with self.lock:
+                    if self.error is None:
+                        self.error = e
+        if archive is not None:
+            archive.close()
+
+    def write_png(self, index: int, image: np.ndarray) -> None:
+        data = encode_png(image)
+        with open(os.path.join(self.directory, "frame_%06d.png" % index), 'wb') as f:
+            f.write(data)
+        with self.lock:
+            self.files += 1
+
+    def open_archive(self, index: int) -> zipfile.ZipFile:
+        path = os.path.join(self.directory, "frames_%06d.npz" % index)
+        archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=constants.CAPTURE_COMPRESSION)
+        with self.lock:
+            self.files += 1
+        return archive
+
+    def close(self) -> None:
+        """
+        Waits for the writers to finish the frames already queued
+
+        :raises: the first error a writer ran into
+        """
+        for frames, thread in zip(self.queues, self.threads):
+            if thread.is_alive():
+                frames.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from typing import Dict, List, Optional
+
+from config import constants
+from config.tile import Tile
+from config.unit import Unit
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the compiled layout changes so old caches are thrown away
+CATALOG_VERSION = 1
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def split_traits(traits: str) -> List[str]:
+    return [trait for trait in traits.split(',') if trait]
+
+
+def make_flags(names, index: Dict[str, int]) -> int:
+    """
+    Turns a list of names into bitflags
+
+    :param names: names that are set
+    :param index: bit of every known name
+    :return: bitflags
+    """
+    flags = 0
+    for name in names:
+        flags |= 1 << index[name]
+    return flags
+
+
+def compile_catalog(tile_data: dict, unit_data: dict) -> dict:
+    """
+    Compiles the parsed tile and unit info into an indexed catalog: integer type ids in file order,
+    trait and effect bitflags and the scaled art each type is drawn with
+
+    :param tile_data: parsed tile info json
+    :param unit_data: parsed unit info json
+    :return: compiled catalog
+    """
+    traits = set()
+    effects = set()
+    for tile in tile_data["tile_info"]:
+        traits.update(split_traits(tile["traits"]))
+    for unit in unit_data["unit_info"]:
+        traits.update(split_traits(unit["traits"]))
+        for attack in unit["attacks"].values():
+            effects.update(attack["effects"])
+    traits = sorted(traits)
+    effects = sorted(effects)
+    trait_index = {trait: i for i, trait in enumerate(traits)}
+    effect_index = {effect: i for i, effect in enumerate(effects)}
+
+    tiles = []
+    for type_id, tile in enumerate(tile_data["tile_info"]):
+        tiles.append(dict(tile, type_id=type_id,
+                          trait_flags=make_flags(split_traits(tile["traits"]), trait_index)))
+
+    units = []
+    for type_id, unit in enumerate(unit_data["unit_info"]):
+        attacks = {}
+        for attack_name, attack in unit["attacks"].items():
+            attacks[attack_name] = dict(attack, effect_flags=make_flags(attack["effects"], effect_index))
+        scale_size = unit["scale_size"] * constants.TILE_SIZE
+        units.append(dict(unit, type_id=type_id, attacks=attacks,
+                          trait_flags=make_flags(split_traits(unit["traits"]), trait_index),
+                          art=("assets/unit_" + unit["name"] + ".png", (scale_size, scale_size), unit["alpha"])))
+
+    return {"version": CATALOG_VERSION, "traits": traits, "effects": effects, "tiles": tiles, "units": units}
+
+
+class Catalog:
+    def __init__(self, tile_path=constants.TILE_INFO_FILE, unit_path=constants.UNIT_INFO_FILE,
+                 cache_path=constants.CATALOG_CACHE_FILE):
+        self.tile_path = tile_path
+        self.unit_path = unit_path
+        self.cache_path = cache_path
+        self.compiled: Optional[dict] = None
+        self.sources: Dict[str, tuple] = {}
+        self.trait_flags: Dict[str, int] = {}
+        self.effect_flags: Dict[str, int] = {}
+        self.last_poll = 0.0
+
+    def get_source_stats(self) -> Dict[str, tuple]:
+        return {path: (os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in (self.tile_path, self.unit_path)}
+
+    def read(self) -> dict:
+        """
+        Gets the compiled catalog, from the disk cache when the info files haven't changed,
+        otherwise by compiling the info files and refreshing the cache
+
+        :return: compiled catalog
+        """
+        stats = self.get_source_stats()
+        cached = None
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "rb") as f:
+                    cached = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError,
+                    ValueError):
+                cached = None
+        # a cache written by another version or damaged into something else is compiled again
+        if not isinstance(cached, dict) or cached.get("version") != CATALOG_VERSION or \
+                not isinstance(cached.get("catalog"), dict):
+            cached = None
+        if cached is not None:
+            if cached.get("stats") == stats:
+                self.sources = stats
+                return cached["catalog"]
+            # touched but not edited, the content hash still matches
+            if cached.get("hashes") == {path: hash_file(path) for path in stats}:
+                self.sources = stats
+                self.write_cache(cached["catalog"], stats, cached["hashes"])
+                return cached["catalog"]
+
+        with open(self.tile_path) as f:
+            tile_data = json.load(f)
+        with open(self.unit_path) as f:
+            unit_data = json.load(f)
+        compiled = compile_catalog(tile_data, unit_data)
+        self.sources = stats
+        self.write_cache(compiled, stats, {path: hash_file(path) for path in stats})
+        return compiled
+
+    def write_cache(self, compiled: dict, stats: Dict[str, tuple], hashes: Dict[str, str]) -> None:
+        try:
+            with open(self.cache_path, "wb") as f:
+                pickle.dump({"version": CATALOG_VERSION, "stats": stats, "hashes": hashes, "catalog": compiled}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            # a read-only checkout still works, it just compiles on every start
+            pass
+
+    def load(self, app) -> None:
+        """
+        Loads the catalog into the tile and unit templates of the app, which are only replaced once the whole
+        catalog has been read so a broken info file leaves the app as it was
+
+        :param app: app being loaded into
+        """
+        compiled = self.read()
+        tile_info = {}
+        for tile in compiled["tiles"]:
+            new_tile = Tile(tile["name"], tile["desc"], tile["traits"])
+            new_tile.type_id = tile["type_id"]
+            new_tile.trait_flags = tile["trait_flags"]
+            tile_info[tile["name"]] = new_tile
+
+        unit_info = {}
+        for unit in compiled["units"]:
+            new_unit = Unit(unit["name"], unit["desc"], unit["traits"], unit["health"], unit["attacks"],
+                            unit["speed"], unit["scale_size"], unit["offset_x"], unit["offset_y"],
+                            unit["ring_offset_x"], unit["ring_offset_y"], unit["alpha"],
+                            unit.get("sight", constants.UNIT_SIGHT))
+            new_unit.type_id = unit["type_id"]
+            new_unit.trait_flags = unit["trait_flags"]
+            new_unit.art = unit["art"]
+            unit_info[unit["name"]] = new_unit
+
+        self.compiled = compiled
+        self.trait_flags = {trait: 1 << i for i, trait in enumerate(compiled["traits"])}
+        self.effect_flags = {effect: 1 << i for i, effect in enumerate(compiled["effects"])}
+        app.tile_info = tile_info
+        app.unit_info = unit_info
+
+    def get_trait_flag(self, trait: str) -> int:
+        return self.trait_flags.get(trait, 0)
+
+    def get_effect_flag(self, effect: str) -> int:
+        return self.effect_flags.get(effect, 0)
+
+    def poll(self, app) -> bool:
+        """
+        Reloads the catalog into a running app if an info file changed, checked at most once per poll interval
+
+        :param app: running app
+        :return: True if the catalog was reloaded
+        """
+        now = time.monotonic()
+        if now - self.last_poll < constants.CATALOG_POLL_INTERVAL:
+            return False
+        self.last_poll = now
+        try:
+            if self.get_source_stats() == self.sources:
+                return False
+            self.reload(app)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # a half-saved or broken file keeps the old catalog until it is fixed
+            logger.warning("Catalog reload failed: %s", e)
+            return False
+        return True
+
+    def reload(self, app) -> None:
+        """
+        Reloads the catalog and refreshes the tiles and units already on the board, keeping their game state
+
+        :param app: running app
+        """
+        self.load(app)
+        for row in app.game_map:
+            for xytile in row:
+                template = app.tile_info.get(xytile.tile.name)
+                if template is not None:
+                    xytile.tile.desc = template.desc
+                    xytile.tile.traits = template.traits
+                    xytile.tile.type_id = template.type_id
+                    xytile.tile.trait_flags = template.trait_flags
+        for row in app.unit_map:
+            for xyunit in row:
+                unit = xyunit.unit
+                template = None if unit is None else app.unit_info.get(unit.name)
+                if template is not None:
+                    unit.refresh_from(template)
+        app.refresh_catalog_flags()
+        app.visibility.rebuild(app)
+        app.board_version += 1
@@ -0,0 +1,187 @@
+import struct
+from array import array
+from collections import namedtuple
+from typing import Optional
+
+from config import constants
+from config.app import Position
+from config.hexgrid import hex_distance
+
+# everything a player can do, each checked by validate_command before it is applied to the game
+Spawn = namedtuple('Spawn', ['row', 'col', 'unit'])
+# path runs from the unit to where it ends its move, or to the enemy it attacks with attacks (own, enemy's)
+Move = namedtuple('Move', ['path', 'attacks'], defaults=(None,))
+EndTurn = namedtuple('EndTurn', [])
+
+COMMAND_SPAWN = 1
+COMMAND_MOVE = 2
+COMMAND_END_TURN = 3
+
+# type, row, col, unit type
+SPAWN = struct.Struct('<BHHB')
+# type, attack of the unit, attack of the enemy, path length, followed by the path as row, col pairs
+MOVE = struct.Struct('<BBBH')
+END_TURN = struct.Struct('<B')
+NO_ATTACK = 255
+
+
+def encode_command(app, command) -> bytes:
+    """
+    Encodes a command, unit types and attacks are sent as their index in the catalog
+
+    :param app: app the command is played in
+    :param command: Spawn, Move or EndTurn
+    :return: encoded command
+    """
+    if isinstance(command, Spawn):
+        return SPAWN.pack(COMMAND_SPAWN, command.row, command.col, list(app.unit_info).index(command.unit))
+    if isinstance(command, Move):
+        attack1 = attack2 = NO_ATTACK
+        if command.attacks is not None:
+            (row1, col1), (row2, col2) = command.path[0], command.path[-1]
+            attack1 = list(app.unit_map[row1][col1].unit.attacks).index(command.attacks[0])
+            attack2 = list(app.unit_map[row2][col2].unit.attacks).index(command.attacks[1])
+        path = array('H', [value for position in command.path for value in position])
+        return MOVE.pack(COMMAND_MOVE, attack1, attack2, len(command.path)) + path.tobytes()
+    return END_TURN.pack(COMMAND_END_TURN)
+
+
+def decode_command(app, data):
+    """
+    Decodes a command, the board is needed to turn attack indices back into attacks
+
+    :param app: app the command is played in
+    :param data: encoded command
+    :return: Spawn, Move or EndTurn
+    """
+    if len(data) == 0:
+        raise ValueError("Empty command")
+    command_type = data[0]
+    if command_type == COMMAND_SPAWN:
+        if len(data) < SPAWN.size:
+            raise ValueError("Truncated spawn")
+        _, row, col, unit_type = SPAWN.unpack_from(data)
+        unit_names = list(app.unit_info)
+        if unit_type >= len(unit_names):
+            raise ValueError("Unknown unit type " + str(unit_type))
+        return Spawn(row, col, unit_names[unit_type])
+    if command_type == COMMAND_MOVE:
+        if len(data) < MOVE.size:
+            raise ValueError("Truncated move")
+        _, attack1, attack2, length = MOVE.unpack_from(data)
+        values = array('H')
+        values.frombytes(bytes(data[MOVE.size:MOVE.size + 4 * length]))
+        if len(values) != 2 * length:
+            raise ValueError("Truncated move")
+        path = tuple((values[i], values[i + 1]) for i in range(0, len(values), 2))
+        attacks = None
+        if attack1 != NO_ATTACK and path and is_on_board(app, *path[0]) and is_on_board(app, *path[-1]):
+            unit = app.unit_map[path[0][0]][path[0][1]].unit
+            enemy = app.unit_map[path[-1][0]][path[-1][1]].unit
+            if unit is not None and enemy is not None and \
+                    attack1 < len(unit.attacks) and attack2 < len(enemy.attacks):
+                attacks = (list(unit.attacks)[attack1], list(enemy.attacks)[attack2])
+        return Move(path, attacks)
+    if command_type == COMMAND_END_TURN:
+        return EndTurn()
+    raise ValueError("Unknown command " + str(command_type))
+
+
+def is_on_board(app, row: int, col: int) -> bool:
+    return 0 <= row < app.rows and 0 <= col < app.cols
+
+
+def get_steps_in_reach(app, unit, path) -> int:
+    """
+    Gets how many steps of a path a unit can take this turn, every step has to start with movement left
+    like the flood of App.get_reachable_tiles
+
+    :param app: app the unit is in
+    :param unit: unit moving
+    :param path: row, col positions starting at the unit
+    :return: number of steps the unit can take
+    """
+    app.refresh_tile_alignments()
+    movement = unit.movement
+    for step, (row, col) in enumerate(path[1:]):
+        if movement <= 0:
+            return step
+        movement = max(0, movement - app.get_move_cost(app.game_map[row][col].tile, unit, True))
+    return len(path) - 1
+
+
+def validate_command(app, command) -> Optional[str]:
+    """
+    Checks a command against the rules of the game for the alignment whose turn it is
+
+    :param app: app the command is played in
+    :param command: Spawn, Move or EndTurn
+    :return: why the command is not allowed, None if it is
+    """
+    if app.moving_sprites or constants.UI_BATTLE in app.ui_dict:
+        return "waiting on another move"
+    alignment = app.get_alignment_turn()
+
+    if isinstance(command, Spawn):
+        if not is_on_board(app, command.row, command.col):
+            return "off the board"
+        if app.unit_map[command.row][command.col].unit is not None:
+            return "tile taken"
+        if command.unit not in app.unit_info:
+            return "unknown unit"
+        return None
+
+    if isinstance(command, Move):
+        path = command.path
+        if len(path) < 2:
+            return "path too short"
+        if not all(is_on_board(app, row, col) for row, col in path):
+            return "off the board"
+        if any(hex_distance(*path[i], *path[i + 1]) != 1 for i in range(len(path) - 1)):
+            return "path not connected"
+        unit = app.unit_map[path[0][0]][path[0][1]].unit
+        if unit is None or unit.alignment != alignment:
+            return "no unit to move"
+        enemy = app.unit_map[path[-1][0]][path[-1][1]].unit
+        steps = len(path) - 1
+        if enemy is not None:
+            if enemy.alignment == alignment:
+                return "tile taken"
+            if not unit.can_attack:
+                return "already attacked"
+            if command.attacks is None or command.attacks[0] not in unit.attacks or \
+                    command.attacks[1] not in enemy.attacks:
+                return "unknown attack"
+            # move_unit only attacks when the whole path including the enemy fits in the movement,
+            # or when the enemy is next to the unit
+            if steps > 1 and steps > unit.movement:
+                return "too far to attack"
+            steps -= 1
+
+        if get_steps_in_reach(app, unit, path[:steps + 1]) < steps:
+            return "out of movement"
+        if steps and app.unit_map[path[steps][0]][path[steps][1]].unit is not None:
+            return "tile taken"
+        return None
+
+    if isinstance(command, EndTurn):
+        return None
+    return "unknown command"
+
+
+def apply_command(app, command) -> None:
+    """
+    Plays a command that passed validate_command, writing it to the app's game log first if it is recorded
+
+    :param app: app the command is played in
+    :param command: Spawn, Move or EndTurn
+    """
+    if app.recorder is not None:
+        app.recorder.record(command)
+    if isinstance(command, Spawn):
+        app.spawn_unit(Position(command.row, command.col), app.unit_info[command.unit], app.get_alignment_turn())
+        app.history.record(app)
+    elif isinstance(command, Move):
+        app.play_move([Position(row, col) for row, col in command.path], command.attacks)
+    elif isinstance(command, EndTurn):
+        app.increment_turn()
@@ -1,7 +1,3 @@
-import pygame
-
-pygame.init()
-
 ALIGNMENTS = ['white', 'orange', 'purple', 'green']
 
 TILE_BLANK = "blank"
@@ -9,11 +5,25 @@ TILE_VOID = "void"
 TILE_CHOSEN = "chosen"
 TILE_DIFFICULT = "difficult"
 
+TRAIT_DIFFICULT = "difficult"
+TRAIT_OPAQUE = "opaque"
+
+EFFECT_RANGED = "ranged"
+EFFECT_SLOWS = "slows"
+EFFECT_POISON = "poison"
+
 UNIT_SLIME = "slime"
 
 SOUND_WELP = "welp.mp3"
 
 STATUS_POISON = "poisoned"
+STATUS_SLOWED = "slowed"
+# the index of a status is its bit in status flags and save files, only ever add to the end
+STATUSES = [STATUS_POISON, STATUS_SLOWED]
+# turns of the unit's own alignment a status lasts, -1 until it is removed
+STATUS_DURATIONS = {STATUS_POISON: -1, STATUS_SLOWED: 1}
+POISON_DAMAGE = 2
+EFFECT_STATUSES = {EFFECT_SLOWS: STATUS_SLOWED, EFFECT_POISON: STATUS_POISON}
 
 UI_DEFAULT = "default"
 UI_MAP = "map"
@@ -28,6 +38,7 @@ UI_TURN_HEIGHT = 100
 UI_BATTLE = "battle"
 UI_BATTLE_WIDTH = 1200
 UI_BATTLE_HEIGHT = 900
+UI_FORECAST = "forecast"
 
 
 BUTTON_END_TURN = "end_turn"
@@ -42,9 +53,98 @@ BUTTON_ATTACK_OPTION_HEIGHT = 50
 SCREEN_WIDTH = 1600
 SCREEN_HEIGHT = 1200
 TILE_SIZE = 100
+# distance between the tiles of a row, and between rows that are shifted half a tile from each other
+TILE_OFFSET_X = TILE_SIZE * 1.5
+TILE_OFFSET_Y = TILE_SIZE * 0.425
+# zooms the map can be drawn at, each with its own scaled copy of the images drawn on the map
+ZOOM_LEVELS = [0.125, 0.25, 0.5, 1.0, 2.0]
+# bytes the scaled copies can take before the least recently drawn are dropped
+ZOOMED_IMAGE_MEMORY = 64 * 1024 * 1024
 UNIT_MOVE_DURATION = 3
+MOVE_RANGE_ALPHA = 110
+UNIT_SIGHT = 3
+FOG_OF_WAR = False
+FOG_ALPHA = 150
+RANGED_ATTACK_RANGE = 3
+RANGED_TARGET_RING = "white"
+ATTACK_HIT_CHANCE = 1.0
+# alignments played by the computer, the rest are played with the mouse
+AI_ALIGNMENTS = []
+# worker processes for the move search, None for one per core, 0 to search in the game's process
+AI_WORKERS = None
+AI_TIME_BUDGET = 2.0
+# seconds a worker still scoring at the end of the budget has to hand back what it has
+AI_DEADLINE_GRACE = 0.05
+AI_CANDIDATES = 8
+AI_KILL_WEIGHT = 1.0
+AI_LOSS_WEIGHT = 1.0
+# how much worse an attack is for each bit of the attacker's full health it may die with
+AI_DEATH_WEIGHT = 0.5
+AI_APPROACH_WEIGHT = 1.0
+# rows are half a step apart and cols two steps apart, so 32x8 clusters are 16 steps each way
+PATH_CLUSTER_ROWS = 32
+PATH_CLUSTER_COLS = 8
+# steps between the entrances along a cluster border
+PATH_ENTRANCE_SPACING = 4
+# clusters along each side of a region, the coarser level long paths are routed over
+PATH_REGION_CLUSTERS = 8
+# cluster entrances along a region border for each one kept as a region entrance
+PATH_REGION_SPACING = 6
+# boards with more cells than this use the hierarchical pathfinder for path previews, smaller ones are searched
+# exactly on the path worker in a fraction of a second
+PATH_HIERARCHY_MIN_CELLS = 90000
+# steps within which the hierarchical pathfinder's paths are searched again for the cheapest
+PATH_EXACT_DISTANCE = 100
+# worker processes of a tournament, None for one per core, and the games each plays round-robin at once
+TOURNAMENT_PROCESSES = None
+TOURNAMENT_CONCURRENT = 32
+# seed of the generated map the game starts on, None for the preset map
+MAP_SEED = None
+MAP_VOID_FRACTION = 0.1
+MAP_DIFFICULT_FRACTION = 0.2
+# steps between the biggest features of the generated terrain
+MAP_NOISE_SCALE = 24.0
+MAP_NOISE_OCTAVES = 4
+MAP_CHUNK_ROWS = 64
+MAP_COMPRESSION = 6
+# map file in the chunked map format the game starts on instead, streamed in while the game runs
+MAP_FILE = None
+# seconds of each frame spent reading the rows of a streamed map that are not on the screen yet
+MAP_STREAM_BUDGET = 0.006
+NET_HOST = "127.0.0.1"
+NET_PORT = 5475
 FRAME_RATE = 60
 
+SAVE_FILE = "saves/quicksave.fate"
+TILE_INFO_FILE = "info/tile_info.json"
+UNIT_INFO_FILE = "info/unit_info.json"
+CATALOG_CACHE_FILE = "info/catalog.cache"
+CATALOG_POLL_INTERVAL = 1.0
+# unit fields that come from the catalog and are refreshed on units already on the board when it reloads
+CATALOG_UNIT_FIELDS = ["desc", "traits", "trait_flags", "type_id", "max_health", "attacks", "scale_size",
+                       "offset_x", "offset_y", "ring_offset_x", "ring_offset_y", "alpha", "art", "sight"]
+HISTORY_LIMIT = 200
+PROFILER_HISTORY = 120
+PROFILER_CSV = "profiles/frame_times.csv"
+PROFILER_BACKGROUND = (0, 0, 0, 180)
+PROFILER_TEXT = (230, 230, 230)
+# turns of memory measurements kept while memory is tracked
+MEMORY_HISTORY = 100
+# turns in a row something has to grow on before it is flagged
+MEMORY_GROWTH_TURNS = 5
+# frames of the call stack stored with every traced allocation
+MEMORY_TRACE_FRAMES = 8
+MEMORY_SNAPSHOT_LINES = 30
+MEMORY_SNAPSHOT_DIRECTORY = "profiles"
+CAPTURE_DIRECTORY = "captures"
+# frames waiting for the writer threads before capturing drops frames or waits for them
+CAPTURE_QUEUE_SIZE = 16
+# writer threads encoding frames side by side, None for one per core
+CAPTURE_WRITERS = None
+# frames per file when capturing to compressed numpy archives
+CAPTURE_NPZ_FRAMES = 60
+CAPTURE_COMPRESSION = 1
+
 HEALTH_GREEN = (84, 168, 66)
 HEALTH_YELLOW = (200, 209, 36)
 HEALTH_ORANGE = (186, 142, 47)
@@ -52,7 +152,22 @@ HEALTH_RED = (163, 45, 18)
 HEALTH_BAR_RATIO = 30
 
 FONT_DEFAULT_SIZE = 24
-FONT_DEFAULT = pygame.font.Font('fonts/Raleway-Light.ttf', FONT_DEFAULT_SIZE)
 FONT_BATTLE_SIZE = 24
-FONT_BATTLE = pygame.font.Font('fonts/Raleway-Light.ttf', FONT_BATTLE_SIZE)
+# FONT_DEFAULT and FONT_BATTLE are loaded on first use, so importing constants doesn't start pygame
+FONT_FILES = {
+    "FONT_DEFAULT": ('fonts/Raleway-Light.ttf', FONT_DEFAULT_SIZE),
+    "FONT_BATTLE": ('fonts/Raleway-Light.ttf', FONT_BATTLE_SIZE),
+}
+fonts = {}
+
+
+def __getattr__(name):
+    if name in FONT_FILES:
+        if name not in fonts:
+            import pygame
+            if not pygame.font.get_init():
+                pygame.font.init()
+            fonts[name] = pygame.font.Font(*FONT_FILES[name])
+        return fonts[name]
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
 
@@ -0,0 +1,71 @@
+from collections import namedtuple
+from typing import List
+
+import numpy as np
+
+from config import constants
+
+# every array is indexed [attack of unit1, attack of unit2], so one forecast covers all attack pairings
+Forecast = namedtuple('Forecast', ['attacks1', 'attacks2', 'damage_taken1', 'damage_taken2',
+                                   'kill_chance1', 'kill_chance2'])
+
+
+def get_hit_distributions(counts: np.ndarray, hit_chance: float) -> np.ndarray:
+    """
+    Gets the exact distribution of the number of strikes that hit for several attacks at once,
+    by repeatedly convolving a single strike's distribution
+
+    :param counts: number of strikes of each attack
+    :param hit_chance: chance of a single strike hitting
+    :return: array [attack, hits] of probabilities
+    """
+    max_count = int(counts.max()) if len(counts) else 0
+    distributions = np.zeros((len(counts), max_count + 1))
+    distributions[:, 0] = 1.0
+    for strike in range(max_count):
+        striking = counts > strike
+        shifted = np.zeros_like(distributions)
+        shifted[:, 1:] = distributions[:, :-1]
+        distributions[striking] = (distributions[striking] * (1 - hit_chance) +
+                                   shifted[striking] * hit_chance)
+    return distributions
+
+
+def get_damage_forecast(attacks: List, health: int, hit_chance: float):
+    """
+    Gets the expected damage and kill chance of each attack against a unit
+
+    :param attacks: list of AttackInfo
+    :param health: health of the unit being attacked
+    :param hit_chance: chance of a single strike hitting
+    :return: array of expected damage and array of kill chance, one entry per attack
+    """
+    damage = np.array([attack.damage for attack in attacks], dtype=float)
+    counts = np.array([attack.count for attack in attacks], dtype=int)
+    distributions = get_hit_distributions(counts, hit_chance)
+    hits = np.arange(distributions.shape[1])
+    total_damage = damage[:, None] * hits[None, :]
+    expected_damage = (distributions * total_damage).sum(axis=1)
+    kill_chance = (distributions * (total_damage >= health)).sum(axis=1)
+    return expected_damage, kill_chance
+
+
+def forecast_battle(unit1, unit2, hit_chance: float = constants.ATTACK_HIT_CHANCE) -> Forecast:
+    """
+    Forecasts every pairing of the two units' attacks. Both sides strike at the same time like
+    UI.attack_execute, so each side's damage only depends on its own attack and the pairings are
+    the outer product of the two sides.
+
+    :param unit1: attacking unit
+    :param unit2: defending unit
+    :param hit_chance: chance of a single strike hitting
+    :return: forecast of all attack pairings
+    """
+    attacks1 = list(unit1.attacks.keys())
+    attacks2 = list(unit2.attacks.keys())
+    damage2, kill2 = get_damage_forecast(list(unit1.attacks.values()), unit2.health, hit_chance)
+    damage1, kill1 = get_damage_forecast(list(unit2.attacks.values()), unit1.health, hit_chance)
+    shape = (len(attacks1), len(attacks2))
+    return Forecast(attacks1, attacks2,
+                    np.broadcast_to(damage1[None, :], shape), np.broadcast_to(damage2[:, None], shape),
+                    np.broadcast_to(kill1[None, :], shape), np.broadcast_to(kill2[:, None], shape))
@@ -12,11 +12,13 @@ class HealthBar(pygame.sprite.Sprite):
         self.rect = self.image.get_rect()
         self.unit = unit
 
-    def update(self, screen, health, max_health):
+    def update(self, screen, health, max_health, zoom=1.0):
         # calculate the current width of the health bar based on the unit's health
         health_ratio = health / max_health
-        self.rect.width = int(self.width * health_ratio)
-        self.image = pygame.transform.scale(self.image, (self.rect.width, self.height))
+        height = self.height * zoom
+        self.rect.width = int(self.width * zoom * health_ratio)
+        self.rect.height = int(height)
+        self.image = pygame.transform.scale(self.image, (self.rect.width, height))
 
         if health_ratio > 0.6:
             color = constants.HEALTH_GREEN
@@ -29,7 +31,7 @@ class HealthBar(pygame.sprite.Sprite):
         self.image.fill(color)
 
         self.rect.midbottom = self.unit.rect.midtop
-        self.rect.y += self.unit.visible_height * 0.7
+        self.rect.y += self.unit.visible_height * 0.7 * zoom
 
         screen.blit(self.image, self.rect)
 
@@ -0,0 +1,89 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+# The map stores hexes in rows that interleave: odd rows sit half a tile to the right and half a tile down,
+# so moving straight up or down is two rows. Converting (row, col) to "doubled" coordinates (q, row), with
+# q = 2 * col + row % 2, makes every neighbor one of (+-1, +-1) or (0, +-2), which the math below relies on.
+
+
+def to_doubled(row: int, col: int) -> Tuple[int, int]:
+    return 2 * col + row % 2, row
+
+
+def from_doubled(q: int, row: int) -> Tuple[int, int]:
+    return row, (q - row % 2) // 2
+
+
+def hex_distance(row1: int, col1: int, row2: int, col2: int) -> int:
+    """
+    Gets the number of steps between two tiles
+
+    :return: distance in tiles
+    """
+    dq = abs((2 * col1 + row1 % 2) - (2 * col2 + row2 % 2))
+    drow = abs(row1 - row2)
+    return dq + max(0, (drow - dq) // 2)
+
+
+@lru_cache(maxsize=None)
+def get_offsets_within(radius: int, parity: int) -> Tuple[Tuple[int, int], ...]:
+    """
+    Gets the (row, col) offsets of every tile within a radius, for a center on an even or odd row.
+    Offsets are sorted by distance, nearest first.
+
+    :param radius: radius in tiles
+    :param parity: row % 2 of the center
+    :return: tuple of row, col offsets including (0, 0)
+    """
+    offsets = []
+    for drow in range(-2 * radius, 2 * radius + 1):
+        for dcol in range(-radius - 1, radius + 2):
+            distance = hex_distance(parity, 0, parity + drow, dcol)
+            if distance <= radius:
+                offsets.append((distance, drow, dcol))
+    offsets.sort()
+    return tuple((drow, dcol) for distance, drow, dcol in offsets)
+
+
+@lru_cache(maxsize=None)
+def get_ring_offsets(radius: int, parity: int) -> Tuple[Tuple[int, int], ...]:
+    """
+    Gets the (row, col) offsets of the tiles exactly a radius away, for a center on an even or odd row
+
+    :param radius: radius in tiles
+    :param parity: row % 2 of the center
+    :return: tuple of row, col offsets
+    """
+    return tuple((drow, dcol) for drow, dcol in get_offsets_within(radius, parity)
+                 if hex_distance(parity, 0, parity + drow, dcol) == radius)
+
+
+def get_line(row1: int, col1: int, row2: int, col2: int) -> List[Tuple[int, int]]:
+    """
+    Gets the tiles on the straight line between two tiles, both ends included
+
+    :return: list of row, col positions
+    """
+    q1, r1 = to_doubled(row1, col1)
+    q2, r2 = to_doubled(row2, col2)
+    # cube coordinates of the doubled coordinates
+    x1, z1 = q1, (r1 - q1) / 2
+    x2, z2 = q2, (r2 - q2) / 2
+    steps = hex_distance(row1, col1, row2, col2)
+    line = []
+    for i in range(steps + 1):
+        t = i / steps if steps else 0.0
+        # nudged so lines along tile edges always pick the same side
+        x = x1 + (x2 - x1) * t + 1e-6
+        z = z1 + (z2 - z1) * t + 2e-6
+        y = -x - z
+        rx, ry, rz = round(x), round(y), round(z)
+        dx, dy, dz = abs(rx - x), abs(ry - y), abs(rz - z)
+        if dx > dy and dx > dz:
+            rx = -ry - rz
+        elif dy <= dz:
+            rz = -rx - ry
+        q = rx
+        row = 2 * rz + rx
+        line.append(from_doubled(q, row))
+    return line
@@ -0,0 +1,161 @@
+from collections import namedtuple
+from typing import List, Optional, Set
+
+from config import constants
+
+# tiles and units are tuples of rows, and a row is only rebuilt when something in it changed,
+# so consecutive snapshots share every unchanged row
+Snapshot = namedtuple('Snapshot', ['tiles', 'units', 'turn'])
+
+
+def capture_row(app, row: int):
+    """
+    Captures the tile names and unit states of a single row
+
+    :param app: app being captured
+    :param row: row being captured
+    :return: tuple of tile names and tuple of unit states
+    """
+    tiles = tuple(xytile.tile.name for xytile in app.game_map[row])
+    units = tuple(None if xyunit.unit is None else xyunit.unit.get_state() for xyunit in app.unit_map[row])
+    return tiles, units
+
+
+def capture(app, previous: Optional[Snapshot] = None, dirty_rows: Optional[Set[int]] = None) -> Snapshot:
+    """
+    Captures a snapshot of the app, reusing the rows of the previous snapshot that are not dirty
+
+    :param app: app being captured
+    :param previous: snapshot the app was in before the dirty rows changed
+    :param dirty_rows: rows that changed since the previous snapshot
+    :return: new snapshot
+    """
+    if previous is None or len(previous.tiles) != app.rows:
+        dirty_rows = set(range(app.rows))
+        tiles = [()] * app.rows
+        units = [()] * app.rows
+    else:
+        tiles = list(previous.tiles)
+        units = list(previous.units)
+    for row in dirty_rows:
+        tiles[row], units[row] = capture_row(app, row)
+    return Snapshot(tuple(tiles), tuple(units), app.turn)
+
+
+def restore(app, current: Snapshot, target: Snapshot) -> None:
+    """
+    Restores the app from the current snapshot to the target one, only touching rows that are not shared
+
+    :param app: app being restored, whose board should match the current snapshot
+    :param current: snapshot the app is in
+    :param target: snapshot being restored
+    """
+    # imported here since the app imports this module
+    from config.app import Position
+
+    for row in range(app.rows):
+        if current.tiles[row] is not target.tiles[row]:
+            for col, tile_name in enumerate(target.tiles[row]):
+                if current.tiles[row][col] != tile_name:
+                    app.update_tile([Position(row, col)], tile_name)
+        if current.units[row] is not target.units[row]:
+            for col, state in enumerate(target.units[row]):
+                if current.units[row][col] != state:
+                    app.remove_unit(Position(row, col))
+                    if state is not None:
+                        app.place_unit(Position(row, col), state)
+    app.turn = target.turn
+    app.dirty_rows.clear()
+    app.reset_selection()
+
+
+class History:
+    def __init__(self):
+        self.snapshots: List[Snapshot] = []
+        self.index = -1
+
+    def reset(self, app) -> None:
+        """
+        Forgets all snapshots and starts over from the current state of the app
+
+        :param app: app being tracked
+        """
+        app.dirty_rows.clear()
+        self.snapshots = [capture(app)]
+        self.index = 0
+
+    def get_current(self) -> Optional[Snapshot]:
+        """
+        Gets the snapshot the app is currently in
+
+        :return: current snapshot, None if nothing has been recorded
+        """
+        return self.snapshots[self.index] if self.snapshots else None
+
+    def record(self, app) -> None:
+        """
+        Records the current state of the app as a new snapshot, dropping any snapshots that could be redone
+
+        :param app: app being recorded
+        """
+        if not app.dirty_rows and self.snapshots and self.get_current().turn == app.turn:
+            return
+        snapshot = capture(app, self.get_current(), app.dirty_rows)
+        app.dirty_rows.clear()
+        del self.snapshots[self.index + 1:]
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > constants.HISTORY_LIMIT:
+            self.snapshots.pop(0)
+        self.index = len(self.snapshots) - 1
+
+    def can_undo(self) -> bool:
+        return self.index > 0
+
+    def can_redo(self) -> bool:
+        return self.index < len(self.snapshots) - 1
+
+    def undo(self, app) -> None:
+        """
+        Returns the app to the previous snapshot
+
+        :param app: app being restored
+        """
+        self.record(app)
+        if self.can_undo():
+            restore(app, self.snapshots[self.index], self.snapshots[self.index - 1])
+            self.index -= 1
+
+    def redo(self, app) -> None:
+        """
+        Returns the app to the next snapshot after an undo
+
+        :param app: app being restored
+        """
+        if app.dirty_rows:
+            return
+        if self.can_redo():
+            restore(app, self.snapshots[self.index], self.snapshots[self.index + 1])
+            self.index += 1
+
+    def branch(self, app) -> Snapshot:
+        """
+        Records and returns the current snapshot so a "what-if" line of play can later be undone with restore()
+
+        :param app: app being recorded
+        :return: snapshot to return to
+        """
+        self.record(app)
+        return self.get_current()
+
+    def restore(self, app, snapshot: Snapshot) -> None:
+        """
+        Returns the app to any snapshot, such as one from branch(), and records it as the newest snapshot
+
+        :param app: app being restored
+        :param snapshot: snapshot being returned to
+        """
+        self.record(app)
+        restore(app, self.get_current(), snapshot)
+        del self.snapshots[self.index + 1:]
+        self.snapshots.append(snapshot)
+        self.index = len(self.snapshots) - 1
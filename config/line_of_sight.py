@@ -0,0 +1,103 @@
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from config import constants
+from config.hexgrid import get_line, get_offsets_within
+
+
+@lru_cache(maxsize=None)
+def get_line_table(radius: int, parity: int) -> Tuple[Tuple[int, int, Tuple[Tuple[int, int], ...]], ...]:
+    """
+    Gets, for a center on an even or odd row, every offset within a radius together with the offsets of the
+    tiles a line to it passes through. Moving a center by two rows or any number of cols doesn't change the
+    lines, so these two tables cover the whole board.
+
+    :param radius: radius in tiles
+    :param parity: row % 2 of the center
+    :return: tuple of (row offset, col offset, offsets between the center and the target)
+    """
+    table = []
+    for drow, dcol in get_offsets_within(radius, parity):
+        if (drow, dcol) == (0, 0):
+            continue
+        line = get_line(parity, 0, parity + drow, dcol)
+        between = tuple((row - parity, col) for row, col in line[1:-1])
+        table.append((drow, dcol, between))
+    return tuple(table)
+
+
+class LineOfSight:
+    def __init__(self, app):
+        self.app = app
+        self.version = -1
+        self.blocked: Dict[Tuple[int, int], bool] = {}
+        self.targets: Dict[Tuple[int, int, int, str], List[Tuple[int, int]]] = {}
+
+    def check_version(self) -> None:
+        """
+        Drops cached blockers and targets once the board has changed, tiles and units both bump the board version
+        """
+        if self.version != self.app.board_version:
+            self.blocked.clear()
+            self.targets.clear()
+            self.version = self.app.board_version
+
+    def is_blocking(self, row: int, col: int) -> bool:
+        """
+        Checks if a tile blocks lines of sight, either from its terrain or a unit standing on it
+
+        :param row: row of tile
+        :param col: col of tile
+        :return: True if lines through the tile are blocked
+        """
+        key = (row, col)
+        blocked = self.blocked.get(key)
+        if blocked is None:
+            app = self.app
+            if not (0 <= row < app.rows and 0 <= col < app.cols):
+                # lines along the edge of the board can round just outside of it
+                return False
+            opaque_flag = app.catalog.get_trait_flag(constants.TRAIT_OPAQUE)
+            blocked = (app.unit_map[row][col].unit is not None or
+                       bool(app.game_map[row][col].tile.trait_flags & opaque_flag))
+            self.blocked[key] = blocked
+        return blocked
+
+    def has_line_of_sight(self, row1: int, col1: int, row2: int, col2: int) -> bool:
+        """
+        Checks if nothing blocks the line between two tiles, the tiles themselves don't count
+
+        :return: True if the line is clear
+        """
+        self.check_version()
+        return all(not self.is_blocking(row, col) for row, col in get_line(row1, col1, row2, col2)[1:-1])
+
+    def get_targets(self, row: int, col: int, alignment: str, radius: int) -> List[Tuple[int, int]]:
+        """
+        Gets every enemy unit within a radius of a tile with a clear line to it
+
+        :param row: row of the attacker
+        :param col: col of the attacker
+        :param alignment: alignment of the attacker
+        :param radius: range of the attack
+        :return: list of row, col positions of targets
+        """
+        self.check_version()
+        key = (row, col, radius, alignment)
+        targets = self.targets.get(key)
+        if targets is not None:
+            return targets
+
+        app = self.app
+        targets = []
+        for drow, dcol, between in get_line_table(radius, row % 2):
+            target_row, target_col = row + drow, col + dcol
+            if not (0 <= target_row < app.rows and 0 <= target_col < app.cols):
+                continue
+            unit = app.unit_map[target_row][target_col].unit
+            if unit is None or unit.alignment == alignment:
+                continue
+            if all(not self.is_blocking(row + brow, col + bcol) for brow, bcol in between):
+                targets.append((target_row, target_col))
+        self.targets[key] = targets
+        return targets
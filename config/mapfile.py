@@ -0,0 +1,214 @@
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from config import constants
+from config.save import pack_names, unpack_names
+
+# magic, version, rows, cols, rows per chunk, tile type count
+HEADER = struct.Struct('<4sHIIIB')
+MAGIC = b'FMAP'
+VERSION = 1
+# after the header come the tile names, the offset of every chunk and of the end of the last chunk as
+# little-endian uint64, then the chunks, each the zlib compressed tile types of its rows, one byte per tile
+OFFSET = np.dtype('<u8')
+
+
+def write_map(path: str, tiles: np.ndarray, tile_names: Sequence[str],
+              chunk_rows: int = constants.MAP_CHUNK_ROWS) -> None:
+    """
+    Writes a map in the chunked map format, every chunk of rows is compressed on its own so a reader
+    can decompress only the rows it needs
+
+    :param path: file path of the map
+    :param tiles: rows x cols array of indices into tile_names
+    :param tile_names: name of each tile type
+    :param chunk_rows: rows per chunk
+    """
+    rows, cols = tiles.shape
+    tiles = np.ascontiguousarray(tiles, dtype=np.uint8)
+    chunks = [zlib.compress(tiles[top:top + chunk_rows].tobytes(), constants.MAP_COMPRESSION)
+              for top in range(0, rows, chunk_rows)]
+    names = pack_names(list(tile_names))
+    start = HEADER.size + len(names) + OFFSET.itemsize * (len(chunks) + 1)
+    offsets = np.cumsum([start] + [len(chunk) for chunk in chunks], dtype=np.uint64).astype(OFFSET)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, cols, chunk_rows, len(tile_names)))
+        f.write(names)
+        f.write(offsets.tobytes())
+        for chunk in chunks:
+            f.write(chunk)
+
+
+class MapReader:
+    def __init__(self, path: str):
+        """
+        Reads a map in the chunked map format region by region, the file is memory-mapped and only the
+        chunks holding the rows asked for are decompressed
+
+        :param path: file path of the map
+        """
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.chunk_rows, tile_type_count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Unsupported map data")
+        self.tile_names, offset = unpack_names(self.data, HEADER.size, tile_type_count)
+        self.chunk_count = -(-self.rows // self.chunk_rows)
+        self.offsets = np.frombuffer(self.data, OFFSET, self.chunk_count + 1, offset).astype(np.int64)
+
+    def __enter__(self) -> 'MapReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+    def get_chunk_rows(self, chunk: int) -> Tuple[int, int]:
+        """
+        Gets the rows a chunk holds
+
+        :param chunk: index of the chunk
+        :return: first row and the row after the last
+        """
+        top = chunk * self.chunk_rows
+        return top, min(top + self.chunk_rows, self.rows)
+
+    def read_chunk(self, chunk: int) -> np.ndarray:
+        """
+        Decompresses one chunk
+
+        :param chunk: index of the chunk
+        :return: array of the tile types of the chunk's rows
+        """
+        top, bottom = self.get_chunk_rows(chunk)
+        data = zlib.decompress(self.data[self.offsets[chunk]:self.offsets[chunk + 1]])
+        return np.frombuffer(data, np.uint8).reshape(bottom - top, self.cols)
+
+    def read_region(self, top: int, left: int, bottom: int, right: int) -> np.ndarray:
+        """
+        Reads the tile types of a rectangle of the map, decompressing only the chunks holding its rows
+
+        :param top: first row
+        :param left: first col
+        :param bottom: row after the last
+        :param right: col after the last
+        :return: array of the tile types of the rectangle
+        """
+        top, bottom = max(0, top), min(self.rows, bottom)
+        left, right = max(0, left), min(self.cols, right)
+        if top >= bottom:
+            return np.zeros((0, max(0, right - left)), np.uint8)
+        chunks = [self.read_chunk(chunk)
+                  for chunk in range(top // self.chunk_rows, (bottom - 1) // self.chunk_rows + 1)]
+        first = top // self.chunk_rows * self.chunk_rows
+        return np.concatenate(chunks)[top - first:bottom - first, left:right]
+
+
+def save_map(app, path: str, chunk_rows: int = constants.MAP_CHUNK_ROWS) -> None:
+    """
+    Saves the terrain of the app as a map, units and turn state are left out. A map still being streamed in is
+    read to the end first.
+
+    :param app: app whose map is saved
+    :param path: file path of the map
+    :param chunk_rows: rows per chunk
+    """
+    app.finish_map_loading()
+    tile_names: List[str] = list(app.tile_info)
+    tile_ids = {name: i for i, name in enumerate(tile_names)}
+    tiles = np.array([[tile_ids[xytile.tile.name] for xytile in row] for row in app.game_map], dtype=np.uint8)
+    write_map(path, tiles.reshape(app.rows, app.cols), tile_names, chunk_rows)
+
+
+class MapLoader:
+    def __init__(self, app, path: str, visible_rows: int = 0):
+        """
+        Streams a map into the app as a new game without units. The rows on the screen are read right away and
+        the rest a chunk at a time over the following frames by step, so a huge map can be played on before all
+        of it is built. The board grows downward as the rows arrive, app.rows is how many have so far.
+
+        :param app: app being loaded into
+        :param path: file path of the map
+        :param visible_rows: rows of the map that reach onto the screen
+        """
+        self.reader = MapReader(path)
+        self.templates = [app.tile_info[name] for name in self.reader.tile_names]
+        # row after the last one appended to the board, and the chunk holding it once decompressed
+        self.row = 0
+        self.chunk = -1
+        self.chunk_tiles = None
+        app.turn = 0
+        app.reset_map(self.reader.rows, self.reader.cols)
+        self.load_rows(app, visible_rows)
+        app.reset_selection()
+        app.history.reset(app)
+
+    def load_rows(self, app, bottom: int) -> None:
+        """
+        Appends the rows of the map up to a row, only the chunks holding them are read
+
+        :param app: app being loaded into
+        :param bottom: row after the last one needed
+        """
+        bottom = min(bottom, self.reader.rows)
+        if bottom > self.row:
+            app.append_map_rows(self.reader.read_region(self.row, 0, bottom, self.reader.cols), self.templates)
+            self.row = bottom
+
+    def step(self, app, budget: float, visible_rows: int = 0) -> bool:
+        """
+        Appends any rows that came onto the screen, then more rows until the time budget is spent. Once the
+        whole map is in, the file is closed and the history starts from the full board.
+
+        :param app: app being loaded into
+        :param budget: seconds to spend on the rows after the ones on the screen
+        :param visible_rows: rows of the map that reach onto the screen
+        :return: True once the whole map is in
+        """
+        reader = self.reader
+        self.load_rows(app, visible_rows)
+        if budget == math.inf:
+            self.load_rows(app, reader.rows)
+        # a chunk of a wide map takes many frames to build, so it is decompressed once and its rows
+        # appended one at a time
+        deadline = time.perf_counter() + budget
+        while self.row < reader.rows and time.perf_counter() < deadline:
+            chunk = self.row // reader.chunk_rows
+            if chunk != self.chunk:
+                self.chunk, self.chunk_tiles = chunk, reader.read_chunk(chunk)
+            offset = self.row - reader.get_chunk_rows(chunk)[0]
+            app.append_map_rows(self.chunk_tiles[offset:offset + 1], self.templates)
+            self.row += 1
+        if self.row < reader.rows:
+            return False
+        self.close()
+        app.history.reset(app)
+        return True
+
+    def close(self) -> None:
+        self.reader.close()
+
+
+def load_map(app, path: str) -> None:
+    """
+    Loads a map into the app as a new game without units, filling the board a chunk of rows at a time
+
+    :param app: app being loaded into
+    :param path: file path of the map
+    """
+    MapLoader(app, path).step(app, math.inf)
@@ -0,0 +1,91 @@
+from typing import Tuple
+
+import numpy as np
+
+from config import constants
+
+# tile types of generated maps, a generated map holds the index of its tile in this tuple
+TILE_TYPES: Tuple[str, ...] = (constants.TILE_BLANK, constants.TILE_VOID, constants.TILE_DIFFICULT)
+BLANK = 0
+VOID = 1
+DIFFICULT = 2
+
+
+def get_value_noise(rows: int, cols: int, scale: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Gets smooth noise by easing between random values on a lattice every scale steps of the board.
+    Rows are half a step apart, so the lattice is stretched over twice as many rows as cols.
+
+    :param rows: rows of the board
+    :param cols: cols of the board
+    :param scale: steps between lattice points
+    :param rng: random number generator
+    :return: rows x cols array of noise in [0, 1)
+    """
+    y = np.arange(rows) / (2 * scale)
+    x = np.arange(cols) / scale
+    lattice = rng.random((int(y[-1]) + 2, int(x[-1]) + 2))
+    y0 = y.astype(np.intp)
+    x0 = x.astype(np.intp)
+    # smoothstep so the noise has no creases along the lattice lines
+    ty = y - y0
+    tx = x - x0
+    ty = (ty * ty * (3 - 2 * ty))[:, None]
+    tx = (tx * tx * (3 - 2 * tx))[None, :]
+    top = lattice[y0][:, x0] * (1 - tx) + lattice[y0][:, x0 + 1] * tx
+    bottom = lattice[y0 + 1][:, x0] * (1 - tx) + lattice[y0 + 1][:, x0 + 1] * tx
+    return top * (1 - ty) + bottom * ty
+
+
+def get_fractal_noise(rows: int, cols: int, scale: float, octaves: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Sums value noise at halving scales and amplitudes, big features with finer detail on top
+
+    :param rows: rows of the board
+    :param cols: cols of the board
+    :param scale: steps between lattice points of the first octave
+    :param octaves: number of octaves
+    :param rng: random number generator
+    :return: rows x cols array of noise in [0, 1)
+    """
+    noise = np.zeros((rows, cols))
+    amplitude = 1.0
+    total = 0.0
+    for _ in range(octaves):
+        noise += amplitude * get_value_noise(rows, cols, max(scale, 1.0), rng)
+        total += amplitude
+        amplitude /= 2
+        scale /= 2
+    return noise / total
+
+
+def generate_map(rows: int, cols: int, seed: int = 0, void_fraction: float = constants.MAP_VOID_FRACTION,
+                 difficult_fraction: float = constants.MAP_DIFFICULT_FRACTION,
+                 scale: float = constants.MAP_NOISE_SCALE, octaves: int = constants.MAP_NOISE_OCTAVES) -> np.ndarray:
+    """
+    Generates the terrain of a map from noise. The lowest ground becomes void regions and the peaks of a
+    second, finer noise become clusters of difficult tiles, each covering the given fraction of the map.
+
+    :param rows: rows of the map
+    :param cols: cols of the map
+    :param seed: random seed, the same seed and size always give the same map
+    :param void_fraction: fraction of tiles that are void
+    :param difficult_fraction: fraction of tiles that are difficult
+    :param scale: steps between the features of the first octave
+    :param octaves: number of octaves of noise
+    :return: rows x cols uint8 array of indices into TILE_TYPES
+    """
+    rng = np.random.default_rng(seed)
+    tiles = np.full((rows, cols), BLANK, dtype=np.uint8)
+    elevation = get_fractal_noise(rows, cols, scale, octaves, rng)
+    if void_fraction > 0:
+        tiles[elevation <= np.quantile(elevation, void_fraction)] = VOID
+    roughness = get_fractal_noise(rows, cols, scale / 4, octaves, rng)
+    if difficult_fraction > 0:
+        # the threshold is taken over the ground that is left so the fraction is of the whole map
+        land = tiles == BLANK
+        if land.any():
+            share = min(1.0, difficult_fraction * tiles.size / land.sum())
+            threshold = np.quantile(roughness[land], 1 - share)
+            tiles[land & (roughness >= threshold)] = DIFFICULT
+    return tiles
@@ -0,0 +1,299 @@
+import gc
+import os
+import sys
+import tracemalloc
+from collections import Counter, deque
+from types import FunctionType, MethodType, ModuleType
+from typing import Deque, Dict, List, Optional, Set
+
+import pygame
+
+from config import constants, assets
+from config.button import Button
+from config.health_bar import HealthBar
+from config.tile import Tile
+from config.ui import UI
+from config.unit import Unit, MovingUnit
+
+# order the categories are measured in, an object reachable from more than one is counted in the first
+CATEGORIES = ("units", "board", "history", "ui", "surfaces")
+# classes whose live instances are counted, more of them alive than the game can reach means something
+# outside the game is keeping them, like the lambdas of a closed battle ui
+TRACKED_CLASSES = (Unit, MovingUnit, HealthBar, Tile, UI, Button)
+# objects that are shared by the whole program rather than owned by a game
+SKIPPED_TYPES = (type, ModuleType)
+
+
+def get_deep_size(roots: List, seen: Set[int], surfaces: Dict[int, pygame.Surface], counts: Counter) -> int:
+    """
+    Adds up the size of objects and everything they reach, skipping objects already seen.
+    Surfaces are collected rather than added up, their pixels are counted on their own.
+
+    :param roots: objects to start from
+    :param seen: ids of objects already counted, filled in as objects are counted
+    :param surfaces: surfaces reached by id, filled in as they are reached
+    :param counts: reached instances of the tracked classes by class name, filled in as they are reached
+    :return: bytes of the objects reached
+    """
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, pygame.Surface):
+            surfaces[id(obj)] = obj
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        elif isinstance(obj, FunctionType):
+            # lambdas keep what they close over and their default arguments alive
+            stack.extend(obj.__defaults__ or ())
+            for cell in obj.__closure__ or ():
+                try:
+                    stack.append(cell.cell_contents)
+                except ValueError:
+                    pass
+        elif isinstance(obj, MethodType):
+            stack.append(obj.__self__)
+        else:
+            if isinstance(obj, TRACKED_CLASSES):
+                counts[type(obj).__name__] += 1
+            attributes = getattr(obj, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+    return total
+
+
+def get_surface_bytes(surface: pygame.Surface) -> int:
+    # subsurfaces share the pixels of their parent
+    if surface.get_parent() is not None:
+        return sys.getsizeof(surface)
+    return sys.getsizeof(surface) + surface.get_pitch() * surface.get_height()
+
+
+def get_live_counts() -> Counter:
+    """
+    Counts every live instance of the tracked classes, reachable from the game or not
+
+    :return: instances by class name
+    """
+    counts = Counter()
+    for obj in gc.get_objects():
+        if isinstance(obj, TRACKED_CLASSES):
+            counts[type(obj).__name__] += 1
+    return counts
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024
+    return "%.1f GiB" % size
+
+
+class MemoryTracker:
+    def __init__(self):
+        """
+        Accounts for the memory of the game by category at the end of every turn while it is enabled, and flags
+        anything that keeps growing. Allocations are traced with tracemalloc while it is enabled so snapshots of
+        where memory went since it was enabled can be written on demand.
+        """
+        self.enabled = False
+        self.started_tracing = False
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        # bytes by category, live and reachable instance counts and traced bytes of each turn measured
+        self.reports: Deque[Dict] = deque(maxlen=constants.MEMORY_HISTORY)
+        self.flagged: Set[str] = set()
+        # turns ended since tracking started
+        self.turns = 0
+        self.snapshot_count = 0
+
+    def toggle(self, app) -> None:
+        """
+        Starts or stops tracking memory, starting takes the first measurement at once
+
+        :param app: app being tracked
+        """
+        if not self.enabled:
+            self.enabled = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(constants.MEMORY_TRACE_FRAMES)
+                self.started_tracing = True
+            self.baseline = tracemalloc.take_snapshot()
+            self.turns = 0
+            self.record(app)
+        else:
+            self.enabled = False
+            if self.started_tracing:
+                tracemalloc.stop()
+                self.started_tracing = False
+            self.baseline = None
+            self.reports.clear()
+            self.flagged.clear()
+
+    def end_turn(self, app) -> None:
+        """
+        Measures the memory of the game at the end of a turn if tracking is on
+
+        :param app: app being tracked
+        """
+        if self.enabled:
+            self.turns += 1
+            self.record(app)
+
+    def measure(self, app) -> Dict:
+        """
+        Measures the memory of the game by category, walking everything each category reaches
+
+        :param app: app being measured
+        :return: dict of bytes by category, reachable and live instances of the tracked classes, traced bytes
+        """
+        seen = {id(app), id(self)}
+        surfaces: Dict[int, pygame.Surface] = {}
+        reachable = Counter()
+        roots = {
+            "units": [xyunit.unit for row in app.unit_map for xyunit in row if xyunit.unit is not None]
+                     + [app.moving_sprites, app.unit_info, app.status_engine],
+            "board": [app.game_map, app.unit_map, app.tile_info, app.visibility, app.reachable_cache,
+                      app.line_of_sight, app.pathfinder, app.hierarchy, app.dirty_rows],
+            # snapshots for undo grow every turn until HISTORY_LIMIT, so they are kept apart from the board
+            "history": [app.history],
+            "ui": [app.ui_dict, app.ui_removal_list, app.alignment_indicators, app.ui_dirty_rects,
+                   app.shortest_path],
+        }
+        categories = {name: get_deep_size(objects, seen, surfaces, reachable) for name, objects in roots.items()}
+        # the shared image caches and the images the app draws the map with
+        for image in [*assets.images.values(), *assets.zoomed_images.values(), app.terrain_image, app.fog_image]:
+            if image is not None:
+                surfaces[id(image)] = image
+        categories["surfaces"] = sum(get_surface_bytes(surface) for surface in surfaces.values())
+        return {
+            "turn": self.turns,
+            "categories": categories,
+            "reachable": dict(reachable),
+            "live": dict(get_live_counts()),
+            "traced": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+        }
+
+    def get_values(self, report: Dict) -> Dict[str, int]:
+        values = dict(report["categories"])
+        values["traced"] = report["traced"]
+        for name, count in report["live"].items():
+            values["live " + name] = count
+        return values
+
+    def record(self, app) -> Dict:
+        """
+        Measures the game and flags every value that grew on each of the last MEMORY_GROWTH_TURNS turns,
+        writing a snapshot when something is flagged for the first time
+
+        :param app: app being measured
+        :return: the report of this turn
+        """
+        report = self.measure(app)
+        self.reports.append(report)
+        history = [self.get_values(report) for report in list(self.reports)[-constants.MEMORY_GROWTH_TURNS - 1:]]
+        flagged = set()
+        if len(history) > constants.MEMORY_GROWTH_TURNS:
+            for name in history[-1]:
+                values = [values.get(name, 0) for values in history]
+                if all(later > earlier for earlier, later in zip(values, values[1:])):
+                    flagged.add(name)
+        new_flags = flagged - self.flagged
+        self.flagged = flagged
+        if new_flags:
+            self.write_snapshot(app, "growing: " + ", ".join(sorted(new_flags)), report)
+        return report
+
+    def write_snapshot(self, app, reason: str = "on demand", report: Optional[Dict] = None,
+                       directory: str = constants.MEMORY_SNAPSHOT_DIRECTORY) -> str:
+        """
+        Writes the memory of the game by category and where the traced memory grew since tracking started,
+        tracking is started first if it is off
+
+        :param app: app being tracked
+        :param reason: why the snapshot was taken, written at the top of the file
+        :param report: measurement of the game to write, None to measure it now
+        :param directory: directory the snapshot is written to
+        :return: path of the snapshot file
+        """
+        if not self.enabled:
+            self.toggle(app)
+            report = self.reports[-1]
+        if report is None:
+            report = self.measure(app)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        stats = snapshot.compare_to(self.baseline, 'lineno')[:constants.MEMORY_SNAPSHOT_LINES]
+
+        lines = ["memory at turn %d, %s" % (report["turn"], reason), ""]
+        for name in CATEGORIES:
+            lines.append("%-12s %12s" % (name, format_bytes(report["categories"][name])))
+        lines.append("%-12s %12s" % ("traced", format_bytes(report["traced"])))
+        lines.append("")
+        lines.append("%-12s %8s %10s" % ("class", "live", "reachable"))
+        for cls in TRACKED_CLASSES:
+            name = cls.__name__
+            lines.append("%-12s %8d %10d" % (name, report["live"].get(name, 0), report["reachable"].get(name, 0)))
+        lines.append("")
+        lines.append("largest growth since tracking started:")
+        lines.extend(str(stat) for stat in stats)
+
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_count += 1
+        path = os.path.join(directory, "memory_%d_%03d.txt" % (os.getpid(), self.snapshot_count))
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def draw(self, screen) -> None:
+        """
+        Draws the memory of the last turn measured and its change from the turn before in the bottom left
+        of the screen, values that keep growing are drawn in red
+
+        :param screen: main surface
+        """
+        if not self.enabled or not self.reports:
+            return
+        report = self.reports[-1]
+        previous = self.reports[-2] if len(self.reports) > 1 else report
+        values = self.get_values(report)
+        previous_values = self.get_values(previous)
+        names = list(CATEGORIES) + ["traced"] + ["live " + cls.__name__ for cls in TRACKED_CLASSES]
+
+        font = constants.FONT_DEFAULT
+        line_height = constants.FONT_DEFAULT_SIZE + 4
+        # name, value and change from the turn before, the font isn't monospaced so each is drawn on its own
+        lines = [("memory  turn %d" % report["turn"], "", "", constants.PROFILER_TEXT)]
+        for name in names:
+            value = values.get(name, 0)
+            change = value - previous_values.get(name, 0)
+            sign = "-" if change < 0 else "+"
+            if name.startswith("live "):
+                texts = (name, str(value), sign + str(abs(change)))
+            else:
+                texts = (name, format_bytes(value), sign + format_bytes(abs(change)))
+            lines.append(texts + (constants.HEALTH_RED if name in self.flagged else constants.PROFILER_TEXT,))
+
+        width = 460
+        height = len(lines) * line_height + 10
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill(constants.PROFILER_BACKGROUND)
+        for i, (name, value, change, color) in enumerate(lines):
+            y = 5 + i * line_height
+            panel.blit(font.render(name, True, color), (10, y))
+            for text, right in ((value, 320), (change, width - 10)):
+                if text:
+                    image = font.render(text, True, color)
+                    panel.blit(image, (right - image.get_width(), y))
+        screen.blit(panel, (0, screen.get_height() - height))
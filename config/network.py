@@ -0,0 +1,344 @@
+import asyncio
+import io
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from config import constants
+from config.app import Position, SelectedTile
+from config.commands import Move, decode_command, encode_command, validate_command, apply_command, \
+    get_steps_in_reach
+from config.history import Snapshot
+from config.save import write_game, read_game
+from config.unit import UnitState
+
+# every message is a length prefix followed by a message type byte and its body
+FRAME = struct.Struct('<I')
+MESSAGE_WELCOME = 1
+MESSAGE_COMMAND = 2
+MESSAGE_DELTA = 3
+MESSAGE_REJECT = 4
+
+# type, alignment given to the client or SPECTATOR, followed by the whole game in the save format
+WELCOME = struct.Struct('<BB')
+# type, sequence number of the client, followed by the command
+COMMAND = struct.Struct('<BI')
+# type, alignment that sent the command, its sequence number, turn, number of changed cells, followed by the cells
+DELTA = struct.Struct('<BBIHI')
+# type, sequence number of the rejected command, followed by the reason as utf-8
+REJECT = struct.Struct('<BI')
+# row, col, tile type, unit type or NO_UNIT, followed by UNIT when there is a unit
+CELL = struct.Struct('<HHBB')
+# alignment, original alignment, health, speed, movement, can attack, statuses
+UNIT = struct.Struct('<BBhhhBI')
+NO_UNIT = 255
+SPECTATOR = 255
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    length, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return await reader.readexactly(length)
+
+
+def write_message(writer: asyncio.StreamWriter, message: bytes) -> None:
+    writer.write(FRAME.pack(len(message)) + message)
+
+
+def encode_delta(app, previous: Snapshot, current: Snapshot, player: int, sequence: int) -> bytes:
+    """
+    Encodes the cells that differ between two snapshots. Snapshots share unchanged rows, so only rows that
+    were rebuilt are compared cell by cell.
+
+    :param app: app the snapshots are of
+    :param previous: snapshot the clients are in
+    :param current: snapshot being sent
+    :param player: alignment index of the player whose command made the change, SPECTATOR for none
+    :param sequence: sequence number of that command
+    :return: encoded delta message
+    """
+    tile_ids = {name: i for i, name in enumerate(app.tile_info)}
+    unit_ids = {name: i for i, name in enumerate(app.unit_info)}
+    alignment_ids = {alignment: i for i, alignment in enumerate(app.alignments)}
+    cells = bytearray()
+    count = 0
+    for row in range(app.rows):
+        if previous.tiles[row] is current.tiles[row] and previous.units[row] is current.units[row]:
+            continue
+        for col in range(app.cols):
+            tile_name, state = current.tiles[row][col], current.units[row][col]
+            if previous.tiles[row][col] == tile_name and previous.units[row][col] == state:
+                continue
+            count += 1
+            if state is None:
+                cells += CELL.pack(row, col, tile_ids[tile_name], NO_UNIT)
+            else:
+                cells += CELL.pack(row, col, tile_ids[tile_name], unit_ids[state.name])
+                cells += UNIT.pack(alignment_ids[state.alignment], alignment_ids[state.original_alignment],
+                                   state.health, state.speed, state.movement, state.can_attack, state.statuses)
+    return DELTA.pack(MESSAGE_DELTA, player, sequence, current.turn, count) + bytes(cells)
+
+
+def apply_delta(app, message: bytes) -> Tuple[int, int]:
+    """
+    Applies a delta message to the app
+
+    :param app: app of a client
+    :param message: encoded delta message
+    :return: alignment index of the player whose command made the change and its sequence number
+    """
+    _, player, sequence, turn, count = DELTA.unpack_from(message)
+    tile_names = list(app.tile_info)
+    unit_names = list(app.unit_info)
+    offset = DELTA.size
+    for _ in range(count):
+        row, col, tile_type, unit_type = CELL.unpack_from(message, offset)
+        offset += CELL.size
+        state = None
+        if unit_type != NO_UNIT:
+            alignment, original_alignment, health, speed, movement, can_attack, statuses = \
+                UNIT.unpack_from(message, offset)
+            offset += UNIT.size
+            state = UnitState(unit_names[unit_type], app.alignments[alignment], app.alignments[original_alignment],
+                              health, speed, movement, can_attack == 1, statuses)
+        if app.game_map[row][col].tile.name != tile_names[tile_type]:
+            app.update_tile([Position(row, col)], tile_names[tile_type])
+        unit = app.unit_map[row][col].unit
+        if (None if unit is None else unit.get_state()) != state:
+            app.remove_unit(Position(row, col))
+            if state is not None:
+                app.place_unit(Position(row, col), state)
+    if turn != app.turn:
+        app.turn = turn
+        app.reset_selection()
+    app.history.record(app)
+    return player, sequence
+
+
+class GameHost:
+    def __init__(self, app):
+        """
+        Authoritative game that players connect to, every command is checked against the rules before it is
+        played and only the cells it changed are sent on
+
+        :param app: app the game is played in
+        """
+        self.app = app
+        self.players: Dict[asyncio.StreamWriter, int] = {}
+        self.server = None
+        app.history.record(app)
+        self.sent = app.history.get_current()
+        self.commands = 0
+        self.rejected = 0
+        self.deltas = 0
+        self.delta_bytes = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+    async def start(self, host: str = constants.NET_HOST, port: int = constants.NET_PORT) -> asyncio.AbstractServer:
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server
+
+    async def close(self) -> None:
+        for writer in list(self.players):
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def get_free_alignment(self) -> int:
+        taken = set(self.players.values())
+        for i in range(len(self.app.alignments)):
+            if i not in taken:
+                return i
+        return SPECTATOR
+
+    def send(self, writer: asyncio.StreamWriter, message: bytes) -> None:
+        write_message(writer, message)
+        self.messages_sent += 1
+        self.bytes_sent += FRAME.size + len(message)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Welcomes a client with the whole game, then plays its commands until it disconnects
+
+        :param reader: stream from the client
+        :param writer: stream to the client
+        """
+        alignment = self.get_free_alignment()
+        self.players[writer] = alignment
+        state = io.BytesIO()
+        write_game(self.app, state)
+        self.send(writer, WELCOME.pack(MESSAGE_WELCOME, alignment) + state.getvalue())
+        try:
+            await writer.drain()
+            while True:
+                message = await read_message(reader)
+                # an empty message can't say what it is, it is rejected like a malformed command
+                if not message or message[0] == MESSAGE_COMMAND:
+                    await self.handle_command(writer, message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.players.pop(writer, None)
+            writer.close()
+
+    async def handle_command(self, writer: asyncio.StreamWriter, message: bytes) -> None:
+        """
+        Checks a command from a client, plays it and sends every client the cells it changed
+
+        :param writer: stream to the client that sent the command
+        :param message: command message
+        """
+        self.commands += 1
+        app = self.app
+        alignment = self.players[writer]
+        # client sequence numbers start at 1, a command too short to carry one is rejected as 0
+        sequence = 0
+        try:
+            if len(message) < COMMAND.size:
+                raise ValueError("Truncated command header")
+            _, sequence = COMMAND.unpack_from(message)
+            command = decode_command(app, memoryview(message)[COMMAND.size:])
+            reason = None
+            if alignment == SPECTATOR or app.alignments[alignment] != app.get_alignment_turn():
+                reason = "not your turn"
+            if reason is None:
+                reason = validate_command(app, command)
+        except (ValueError, IndexError, struct.error) as error:
+            reason = str(error) or type(error).__name__
+        if reason is not None:
+            self.rejected += 1
+            self.send(writer, REJECT.pack(MESSAGE_REJECT, sequence) + reason.encode('utf-8'))
+            await writer.drain()
+            return
+
+        apply_command(app, command)
+        app.history.record(app)
+        current = app.history.get_current()
+        delta = encode_delta(app, self.sent, current, alignment, sequence)
+        self.sent = current
+        self.deltas += 1
+        self.delta_bytes += FRAME.size + len(delta)
+        writers = list(self.players)
+        for client in writers:
+            self.send(client, delta)
+        await asyncio.gather(*(client.drain() for client in writers), return_exceptions=True)
+
+
+class GameClient:
+    def __init__(self, app):
+        """
+        Player or spectator of a game on a host, the app mirrors the host's game through the deltas it sends
+
+        :param app: app of the client, replaced by the host's game on joining
+        """
+        self.app = app
+        self.alignment = SPECTATOR
+        self.reader = None
+        self.writer = None
+        self.sequence = 0
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.deltas = 0
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.listener = None
+
+    async def connect(self, host: str = constants.NET_HOST, port: int = constants.NET_PORT) -> None:
+        """
+        Joins a game and keeps listening for its deltas in the background
+
+        :param host: address of the host
+        :param port: port of the host
+        """
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        message = await self.read()
+        _, self.alignment = WELCOME.unpack_from(message)
+        read_game(self.app, memoryview(message)[WELCOME.size:])
+        self.listener = asyncio.ensure_future(self.listen())
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        if self.listener is not None:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+
+    async def read(self) -> bytes:
+        message = await read_message(self.reader)
+        self.messages_received += 1
+        self.bytes_received += FRAME.size + len(message)
+        return message
+
+    async def listen(self) -> None:
+        try:
+            while True:
+                message = await self.read()
+                if message[0] == MESSAGE_DELTA:
+                    player, sequence = apply_delta(self.app, message)
+                    self.deltas += 1
+                    if player == self.alignment:
+                        self.resolve(sequence, None)
+                elif message[0] == MESSAGE_REJECT:
+                    _, sequence = REJECT.unpack_from(message)
+                    self.resolve(sequence, bytes(message[REJECT.size:]).decode('utf-8'))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_result("disconnected")
+
+    def resolve(self, sequence: int, reason: Optional[str]) -> None:
+        future = self.pending.pop(sequence, None)
+        if future is not None and not future.done():
+            future.set_result(reason)
+
+    def is_my_turn(self) -> bool:
+        return self.alignment != SPECTATOR and self.app.alignments[self.alignment] == self.app.get_alignment_turn()
+
+    async def play(self, command) -> Optional[str]:
+        """
+        Sends a command and waits for the host to play or reject it. Commands the local copy of the game
+        already knows are against the rules are rejected without asking the host.
+
+        :param command: Spawn, Move or EndTurn
+        :return: why the command was rejected, None once its delta has been applied
+        """
+        if not self.is_my_turn():
+            return "not your turn"
+        reason = validate_command(self.app, command)
+        if reason is not None:
+            return reason
+        self.sequence += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.sequence] = future
+        write_message(self.writer, COMMAND.pack(MESSAGE_COMMAND, self.sequence) + encode_command(self.app, command))
+        await self.writer.drain()
+        return await future
+
+    def preview_path(self, start: Position, end: Position) -> List[Position]:
+        """
+        Predicts the path a unit would take to a tile from the local copy of the game, so hovering shows
+        the path without waiting on the host. The path is cut where the unit runs out of movement, and keeps
+        the enemy at its end when the unit could attack it.
+
+        :param start: position of the unit
+        :param end: tile being hovered
+        :return: predicted path, empty if the unit can't go anywhere towards the tile
+        """
+        app = self.app
+        unit = app.unit_map[start.row][start.col].unit
+        if unit is None:
+            return []
+        path = app.get_shortest_path(SelectedTile(start.row, start.col, app.game_map[start.row][start.col].tile),
+                                     SelectedTile(end.row, end.col, app.game_map[end.row][end.col].tile), unit)
+        path = [Position(row, col) for row, col, tile in path]
+        if not path:
+            return []
+        enemy = app.unit_map[end.row][end.col].unit
+        if enemy is not None and enemy.alignment != unit.alignment:
+            attacks = (next(iter(unit.attacks)), next(iter(enemy.attacks)))
+            if validate_command(app, Move(tuple(path), attacks)) is None:
+                return path
+            path = path[:-1]
+        steps = get_steps_in_reach(app, unit, path)
+        while steps > 0 and app.unit_map[path[steps].row][path[steps].col].unit is not None:
+            steps -= 1
+        return path[:steps + 1] if steps > 0 else []
@@ -0,0 +1,1421 @@
+import heapq
+import threading
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import constants
+from config.hexgrid import get_offsets_within, hex_distance
+
+PathQuery = namedtuple('PathQuery', ['start', 'goal', 'unit'])
+# a path preview for the worker, costs and terrain are arrays the path finder never changes once it has handed
+# them out
+PathRequest = namedtuple('PathRequest', ['start', 'goal', 'profile', 'version', 'rows', 'cols', 'costs', 'terrain'])
+PathResult = namedtuple('PathResult', ['start', 'goal', 'profile', 'version', 'rows', 'cols', 'path'])
+
+# the paths from the entrances of a cluster or region, worked out again with a movement profile's costs
+ClusterTables = namedtuple('ClusterTables', ['distances', 'previous', 'segments'])
+RegionTables = namedtuple('RegionTables', ['index', 'members', 'distances', 'previous', 'segments'])
+
+# neighbor offsets of even and odd rows, and the index of each in them by (drow + 2) * 3 + dcol + 1
+DIRECTIONS = (get_offsets_within(1, 0)[1:], get_offsets_within(1, 1)[1:])
+STEP_CODES = np.array([[next((code for code, (drow, dcol) in enumerate(offsets)
+                               if (drow + 2) * 3 + dcol + 1 == key), -1)
+                         for key in range(15)] for offsets in DIRECTIONS], np.int8)
+UNREACHED = int(np.iinfo(np.int32).max)
+# the start and goal of a hierarchical route, and the kinds of edge it takes, which say how its tiles are found
+SOURCE, TARGET = -1, -2
+STEP, CLUSTER, REGION, START, GOAL, DIRECT, ENTER, LEAVE = range(8)
+
+
+@lru_cache(maxsize=8)
+def get_neighbor_table(rows: int, cols: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Gets the neighbors of every cell of a board as flat indices, row * cols + col, built once per board size
+
+    :param rows: rows of the board
+    :param cols: cols of the board
+    :return: tuple of neighbor indices for each cell
+    """
+    table = []
+    for row in range(rows):
+        offsets = get_offsets_within(1, row % 2)[1:]
+        for col in range(cols):
+            table.append(tuple((row + drow) * cols + col + dcol for drow, dcol in offsets
+                               if 0 <= row + drow < rows and 0 <= col + dcol < cols))
+    return tuple(table)
+
+
+def search(rows: int, cols: int, costs, source: int, targets: Optional[Tuple[int, ...]],
+           reverse: bool = False, cancelled: Optional[Callable[[], bool]] = None,
+           limit: Optional[int] = None) -> Dict[int, Tuple[int, ...]]:
+    """
+    Searches out from one cell until every target is settled, so all queries sharing that cell and costs
+    share one search. Searching in reverse starts from a goal and finds the paths to it from many starts.
+    Of equally cheap paths the one with the fewest steps is kept.
+
+    With a limit the search only steps on from cells reached with less than the limit spent, like a unit
+    that can take a step while it has movement left, and every cost past the limit counts as the limit.
+
+    :param rows: rows of the board
+    :param cols: cols of the board
+    :param costs: cost of moving onto each cell, by flat index
+    :param source: flat index of the start, or of the goal when searching in reverse
+    :param targets: flat indices of the goals, or of the starts when searching in reverse, None for every
+        cell the search reaches
+    :param reverse: whether the search runs from the goal back to the starts
+    :param cancelled: optional check made every few hundred cells, the search gives up once it returns True
+    :param limit: optional cost after which the search stops stepping on
+    :return: dict of target to the flat indices of its path from start to goal, unreachable targets are left out
+    """
+    neighbors = get_neighbor_table(rows, cols)
+    # distances are the cost times scale plus the steps taken, a path never has as many steps as the board
+    # has cells, so comparing them compares costs first and steps second
+    scale = rows * cols
+    # costs are 16 bit, so no path costs as much as unreached, kept an int so comparisons stay between ints
+    unreached = 65536 * scale * scale
+    cap = unreached if limit is None else limit * scale
+    distance = [unreached] * (rows * cols)
+    previous = array('i', [-1]) * (rows * cols)
+    distance[source] = 0
+    everything = targets is None
+    settled = []
+    remaining = set() if everything else set(targets)
+    remaining.discard(source)
+    open_set = [(0, source)]
+    popped = 0
+    while open_set and (remaining or everything):
+        popped += 1
+        if cancelled is not None and popped % 256 == 0 and cancelled():
+            return {}
+        cost, current = heapq.heappop(open_set)
+        if cost > distance[current]:
+            continue
+        if everything:
+            settled.append(current)
+        else:
+            remaining.discard(current)
+        if cost >= cap:
+            continue
+        # going backwards the step from a neighbor onto the current cell costs the current cell
+        step_cost = costs[current] * scale + 1
+        for neighbor in neighbors[current]:
+            new_cost = cost + (step_cost if reverse else costs[neighbor] * scale + 1)
+            if new_cost > cap:
+                new_cost = cap + new_cost % scale
+            if new_cost < distance[neighbor]:
+                distance[neighbor] = new_cost
+                previous[neighbor] = current
+                heapq.heappush(open_set, (new_cost, neighbor))
+
+    paths = {}
+    for target in (settled if everything else targets):
+        if distance[target] == unreached:
+            continue
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        paths[target] = tuple(path) if reverse else tuple(reversed(path))
+    return paths
+
+
+def get_profile_costs(base_costs, zone_masks, own_bit: int, speed: int) -> array:
+    """
+    Gets the cost of moving onto every cell for units of an alignment and speed, like App.get_move_cost:
+    the terrain cost, or the speed next to a unit of another alignment
+
+    :param base_costs: terrain cost of each cell, by flat index
+    :param zone_masks: bits of the alignments with a unit next to each cell, by flat index
+    :param own_bit: bit of the alignment of the unit moving
+    :param speed: speed of the unit moving
+    :return: costs by flat index
+    """
+    return array('H', [speed if mask & ~own_bit else cost for cost, mask in zip(base_costs, zone_masks)])
+
+
+def search_groups(rows: int, cols: int, groups: List[Tuple]) -> List[Dict[int, Tuple[int, ...]]]:
+    """
+    Runs the searches of several groups, the unit of work handed to a pool
+
+    :param rows: rows of the board
+    :param cols: cols of the board
+    :param groups: list of costs, source, targets and whether the search is reversed
+    :return: paths of each group
+    """
+    return [search(rows, cols, costs, source, targets, reverse) for costs, source, targets, reverse in groups]
+
+
+class PathFinder:
+    def __init__(self, app):
+        """
+        Answers many path queries at once for group moves and the computer player. Move costs are worked out
+        once per board version for each movement profile, units of the same alignment and speed share them.
+        Paths cost the same as get_shortest_path's, though equally short paths may be picked differently.
+
+        :param app: app whose board is searched
+        """
+        self.app = app
+        self.version = -1
+        self.base_costs = array('H')
+        self.zone_masks = array('B')
+        self.profile_costs: Dict[Tuple[str, int], array] = {}
+
+    def check_version(self) -> None:
+        """
+        Rebuilds the terrain costs and zone of control of the board once it has changed
+        """
+        app = self.app
+        if self.version == app.board_version and len(self.base_costs) == app.rows * app.cols:
+            return
+        self.version = app.board_version
+        self.profile_costs.clear()
+        cols = app.cols
+        self.base_costs = array('H', [2 if xytile.tile.trait_flags & app.difficult_flag else 1
+                                      for row in app.game_map for xytile in row])
+        # a bit per alignment next to each cell, the same as the tile alignments of update_tile_alignments
+        masks = [0] * (app.rows * cols)
+        neighbors = get_neighbor_table(app.rows, cols)
+        alignment_bits = {alignment: 1 << i for i, alignment in enumerate(app.alignments)}
+        for row in range(app.rows):
+            for col, xyunit in enumerate(app.unit_map[row]):
+                if xyunit.unit is not None:
+                    bit = alignment_bits[xyunit.unit.alignment]
+                    for neighbor in neighbors[row * cols + col]:
+                        masks[neighbor] |= bit
+        self.zone_masks = array('B', masks)
+
+    def get_costs(self, unit) -> array:
+        """
+        Gets the cost of moving onto every cell for units of an alignment and speed, like App.get_move_cost
+
+        :param unit: unit moving
+        :return: costs by flat index
+        """
+        self.check_version()
+        key = (unit.alignment, unit.speed)
+        costs = self.profile_costs.get(key)
+        if costs is None:
+            own_bit = 1 << self.app.alignments.index(unit.alignment)
+            costs = get_profile_costs(self.base_costs, self.zone_masks, own_bit, unit.speed)
+            self.profile_costs[key] = costs
+        return costs
+
+    def find_paths(self, queries: List[PathQuery], executor=None, partitions: int = 0) -> List[List]:
+        """
+        Finds the paths of many queries, with one search per start and movement profile
+
+        :param queries: list of PathQuery of start and goal positions and the unit moving
+        :param executor: optional concurrent.futures executor the searches are spread across
+        :param partitions: number of batches for the executor, 0 for one per query group
+        :return: path of each query as a list of SelectedTile like get_shortest_path, empty if there is none
+        """
+        # imported here since the app imports this module
+        from config.app import SelectedTile
+
+        app = self.app
+        rows, cols = app.rows, app.cols
+        flat = [(self.get_costs(query.unit), query.start.row * cols + query.start.col,
+                 query.goal.row * cols + query.goal.col) for query in queries]
+
+        # units of a profile share one search per start, or one per goal when there are fewer goals,
+        # like a group move where many units head for the same tile
+        starts: Dict[int, set] = {}
+        goals: Dict[int, set] = {}
+        profiles = {}
+        for costs, start, goal in flat:
+            profiles[id(costs)] = costs
+            starts.setdefault(id(costs), set()).add(start)
+            goals.setdefault(id(costs), set()).add(goal)
+        reverse = {profile: len(goals[profile]) < len(starts[profile]) for profile in profiles}
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for costs, start, goal in flat:
+            if reverse[id(costs)]:
+                groups.setdefault((id(costs), goal), []).append(start)
+            else:
+                groups.setdefault((id(costs), start), []).append(goal)
+        keys = list(groups)
+        work = [(profiles[profile], source, tuple(groups[(profile, source)]), reverse[profile])
+                for profile, source in keys]
+
+        if executor is None or not work:
+            results = search_groups(rows, cols, work)
+        else:
+            count = min(partitions or len(work), len(work))
+            futures = [executor.submit(search_groups, rows, cols, work[i::count]) for i in range(count)]
+            results = [None] * len(work)
+            for i, future in enumerate(futures):
+                results[i::count] = future.result()
+
+        found = dict(zip(keys, results))
+        game_map = app.game_map
+        paths = []
+        for costs, start, goal in flat:
+            if reverse[id(costs)]:
+                indices = found[(id(costs), goal)].get(start, ())
+            else:
+                indices = found[(id(costs), start)].get(goal, ())
+            paths.append([SelectedTile(index // cols, index % cols, game_map[index // cols][index % cols].tile)
+                          for index in indices])
+        return paths
+
+    def find_path(self, start, goal, unit) -> List:
+        return self.find_paths([PathQuery(start, goal, unit)])[0]
+
+
+class PathWorker:
+    def __init__(self, pathfinder: PathFinder):
+        """
+        Finds path previews on a background thread so a long search never holds up a frame. Only the latest
+        request is kept: one that hasn't started yet is replaced by a newer one, and one being searched gives
+        up once a newer one arrives. The searches read a snapshot of the move costs, never the board. Boards
+        with more than PATH_HIERARCHY_MIN_CELLS cells are searched with a HierarchicalPathFinder, which is built
+        and kept up to date on the worker's thread too. Goals within PATH_EXACT_DISTANCE steps are searched again so
+        their paths are the cheapest, further ones cost more by a few percent, at most about a third on the
+        random boards of benchmarks/bench.py.
+
+        :param pathfinder: path finder whose move costs are searched
+        """
+        self.pathfinder = pathfinder
+        self.hierarchy = HierarchicalPathFinder()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.closed = False
+        self.pending: Optional[PathRequest] = None
+        self.latest: Optional[PathRequest] = None
+        self.result: Optional[PathResult] = None
+        self.requests = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.completed = 0
+
+    def request(self, start, goal, unit) -> None:
+        """
+        Asks for the path of a unit to a tile, repeating the latest request does nothing
+
+        :param start: position of the unit
+        :param goal: position being hovered
+        :param unit: unit moving
+        """
+        app = self.pathfinder.app
+        key = (tuple(start), tuple(goal), (unit.alignment, unit.speed), app.board_version)
+        latest = self.latest
+        if latest is not None and latest[:4] == key:
+            return
+        costs = self.pathfinder.get_costs(unit)
+        request = PathRequest(*key, app.rows, app.cols, costs, self.pathfinder.base_costs)
+        with self.condition:
+            if self.pending is not None:
+                self.dropped += 1
+            self.latest = self.pending = request
+            self.requests += 1
+            self.condition.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="path-worker", daemon=True)
+            self.thread.start()
+
+    def cancel(self) -> None:
+        """
+        Drops the latest request, a search of it gives up
+        """
+        if self.latest is None:
+            return
+        with self.condition:
+            self.latest = self.pending = None
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                request, self.pending = self.pending, None
+            cols = request.cols
+            source = request.start[0] * cols + request.start[1]
+            target = request.goal[0] * cols + request.goal[1]
+            if request.rows * cols > constants.PATH_HIERARCHY_MIN_CELLS:
+                path = self.hierarchy.find_path(request.rows, cols, request.terrain, request.profile, request.costs,
+                                                source, target)
+                if path and hex_distance(*request.start, *request.goal) <= constants.PATH_EXACT_DISTANCE:
+                    # nearby, going through the entrances can cost a lot more than the cheapest path, which is
+                    # searched for without spreading past what the hierarchy's path costs
+                    cost = sum(request.costs[index] for index in path[1:])
+                    exact = search(request.rows, cols, request.costs, source, (target,),
+                                   cancelled=lambda: self.latest is not request, limit=cost).get(target)
+                    if exact is not None and sum(request.costs[index] for index in exact[1:]) < cost:
+                        path = exact
+            else:
+                path = search(request.rows, cols, request.costs, source, (target,),
+                              cancelled=lambda: self.latest is not request).get(target, ())
+            with self.condition:
+                if self.latest is not request:
+                    self.cancelled += 1
+                    continue
+                self.result = PathResult(*request[:6], path)
+                self.completed += 1
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.latest = self.pending = None
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def get_path(self, start) -> List:
+        """
+        Gets the latest path found from a tile, which can be for an earlier hover or board than the current
+        ones, for drawing the preview
+
+        :param start: position of the unit
+        :return: list of SelectedTile, empty if no path from the tile has been found yet
+        """
+        # imported here since the app imports this module
+        from config.app import SelectedTile
+
+        app = self.pathfinder.app
+        result = self.result
+        if result is None or result.start != (start[0], start[1]) or (result.rows, result.cols) != (app.rows, app.cols):
+            return []
+        cols = result.cols
+        return [SelectedTile(index // cols, index % cols, app.game_map[index // cols][index % cols].tile)
+                for index in result.path]
+
+    def get_checked_path(self, start, goal, unit) -> Optional[List]:
+        """
+        Gets the path a unit moves along when the tile is clicked, found by the same search as the previews.
+        The latest result is only used when it was found for this unit and tile on the current board, otherwise
+        the path is asked for and None is returned until the worker has found it.
+
+        :param start: tile of the unit
+        :param goal: tile clicked
+        :param unit: unit moving
+        :return: list of SelectedTile like get_shortest_path, None while the path is still being found
+        """
+        app = self.pathfinder.app
+        result = self.result
+        if result is not None and result.start == (start[0], start[1]) and result.goal == (goal[0], goal[1]) and \
+                result.profile == (unit.alignment, unit.speed) and result.version == app.board_version:
+            return self.get_path(start)
+        self.request(start, goal, unit)
+        return None
+
+
+
+def get_board_graph(rows: int, cols: int, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets the steps between neighboring cells of a board that stay inside a block of it, laid out like a
+    compressed sparse row matrix
+
+    :param rows: rows of the board
+    :param cols: cols of the board
+    :param labels: block of every cell by flat index, steps between blocks are left out
+    :return: start of the steps of every cell and the end of the last, and the cell each step leads to
+    """
+    cells = np.arange(rows * cols, dtype=np.int32)
+    row, col = np.divmod(cells, cols)
+    targets = np.full((rows * cols, 6), -1, np.int32)
+    for parity in (0, 1):
+        for k, (drow, dcol) in enumerate(DIRECTIONS[parity]):
+            ok = (row % 2 == parity) & (row + drow >= 0) & (row + drow < rows) & (col + dcol >= 0) & \
+                (col + dcol < cols)
+            targets[ok, k] = cells[ok] + drow * cols + dcol
+    valid = targets >= 0
+    valid &= labels[np.maximum(targets, 0)] == labels[:, None]
+    indptr = np.zeros(rows * cols + 1, np.int32)
+    np.cumsum(valid.sum(1), out=indptr[1:])
+    return indptr, targets[valid]
+
+
+def spread(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+           sources: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Searches out from many sources at once over a whole graph, each node reached from its cheapest source.
+    Weights are small ints, so the nodes waiting to be expanded are kept in a bucket per cost and every node
+    of a bucket is expanded together with numpy.
+
+    :param indptr: start of the edges of every node and the end of the last, like a compressed sparse row matrix
+    :param indices: node each edge leads to
+    :param weights: positive int cost of each edge
+    :param sources: nodes the searches start from
+    :return: cost of every node, UNREACHED where no source reaches it, and the node each was reached from, -1
+        for the sources and unreached nodes
+    """
+    count = len(indptr) - 1
+    distance = np.full(count, UNREACHED, np.int32)
+    previous = np.full(count, -1, np.int32)
+    # position of a node among the nodes reached in one expansion, so each keeps one of its equal reaches
+    order = np.zeros(count, np.int32)
+    sources = np.asarray(sources, np.int32)
+    distance[sources] = 0
+    ring = int(weights.max()) + 1 if len(weights) else 1
+    buckets: List[List[np.ndarray]] = [[] for _ in range(ring)]
+    buckets[0].append(sources)
+    cost = 0
+    idle = 0
+    while idle < ring:
+        bucket = buckets[cost % ring]
+        if not bucket:
+            idle += 1
+            cost += 1
+            continue
+        idle = 0
+        frontier = np.concatenate(bucket) if len(bucket) > 1 else bucket[0]
+        bucket.clear()
+        frontier = frontier[distance[frontier] == cost]
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total:
+            # the edges of every node of the frontier, one after another
+            ends = np.cumsum(counts)
+            edges = np.arange(total, dtype=np.int32) + np.repeat(starts - ends + counts, counts)
+            targets = indices[edges]
+            costs = weights[edges] + np.int32(cost)
+            better = costs < distance[targets]
+            if better.any():
+                targets, costs = targets[better], costs[better]
+                froms = np.repeat(frontier, counts)[better]
+                np.minimum.at(distance, targets, costs)
+                won = costs == distance[targets]
+                targets, costs, froms = targets[won], costs[won], froms[won]
+                positions = np.arange(len(targets), dtype=np.int32)
+                order[targets] = positions
+                first = order[targets] == positions
+                targets, costs, froms = targets[first], costs[first], froms[first]
+                previous[targets] = froms
+                for value in (np.unique(costs) if len(costs) > 64 else set(costs.tolist())):
+                    buckets[value % ring].append(targets[costs == value])
+        cost += 1
+    return distance, previous
+
+
+def stack_graph(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+                copies: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Copies a graph over several times, so one spread can search every copy from its own sources
+
+    :param indptr: start of the edges of every node and the end of the last
+    :param indices: node each edge leads to
+    :param weights: cost of each edge
+    :param copies: number of copies
+    :return: indptr, indices and weights of the copies, node i of copy k is k * nodes + i
+    """
+    nodes, edges = len(indptr) - 1, len(indices)
+    offsets = np.arange(copies, dtype=np.int32)[:, None]
+    indptr = np.append((indptr[:-1][None, :] + offsets * edges).ravel(), copies * edges).astype(np.int32)
+    return indptr, (indices[None, :] + offsets * nodes).ravel(), np.tile(weights, copies)
+
+
+def get_step_codes(cells: np.ndarray, previous: np.ndarray, cols: int) -> np.ndarray:
+    """
+    Gets the direction from each cell to the one it was reached from, as its index in DIRECTIONS
+
+    :param cells: flat indices of the cells
+    :param previous: flat index each cell was reached from, -1 for none
+    :param cols: cols of the board
+    :return: int8 directions, -1 where a cell wasn't reached from another
+    """
+    reached = previous >= 0
+    row = cells // cols
+    drow = np.where(reached, previous // cols - row, 0)
+    dcol = np.where(reached, previous % cols - cells % cols, 0)
+    keys = (drow + 2) * 3 + dcol + 1
+    return np.where(reached, STEP_CODES[row % 2, keys], -1).astype(np.int8)
+
+
+@lru_cache(maxsize=16)
+def get_block_neighbors(height: int, width: int, parity: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Gets the neighbors of every cell of a block of the board as indices into the block, row * width + col
+
+    :param height: rows of the block
+    :param width: cols of the block
+    :param parity: parity of the block's top row on the board
+    :return: tuple of neighbor indices for each cell
+    """
+    table = []
+    for row in range(height):
+        for col in range(width):
+            table.append(tuple((row + drow) * width + col + dcol for drow, dcol in DIRECTIONS[(row + parity) % 2]
+                               if 0 <= row + drow < height and 0 <= col + dcol < width))
+    return tuple(table)
+
+
+def search_block(neighbors: Tuple[Tuple[int, ...], ...], costs: List[int], source: int) -> Tuple[List[int], array]:
+    """
+    Searches out from one cell of a block of the board to all of it without leaving it
+
+    :param neighbors: neighbors of every cell of the block, from get_block_neighbors
+    :param costs: cost of moving onto each cell of the block
+    :param source: index of the start in the block
+    :return: cost of every cell of the block, and the cell each was reached from, -1 for the start
+    """
+    distance = [UNREACHED] * len(costs)
+    previous = array('i', [-1]) * len(costs)
+    distance[source] = 0
+    open_set = [(0, source)]
+    while open_set:
+        cost, current = heapq.heappop(open_set)
+        if cost > distance[current]:
+            continue
+        for neighbor in neighbors[current]:
+            new_cost = cost + costs[neighbor]
+            if new_cost < distance[neighbor]:
+                distance[neighbor] = new_cost
+                previous[neighbor] = current
+                heapq.heappush(open_set, (new_cost, neighbor))
+    return distance, previous
+
+
+class MovementProfile:
+    def __init__(self, alignment: str, speed: int):
+        """
+        What the hierarchical path finder keeps for units of one alignment and speed: their move costs, the
+        cells in the zone of control of other alignments where those differ from the terrain's, and the paths of
+        the clusters and regions with any of them in, worked out again with the profile's costs the first time a
+        route needs them
+
+        :param alignment: alignment of the units
+        :param speed: speed of the units
+        """
+        self.alignment = alignment
+        self.speed = speed
+        self.costs = array('H')
+        self.zone: Set[int] = set()
+        self.zone_clusters: Set[int] = set()
+        self.zone_regions: Set[int] = set()
+        self.clusters: Dict[int, ClusterTables] = {}
+        self.regions: Dict[int, RegionTables] = {}
+        # edges of the entrances routes have gone through, across their cluster and across their region
+        self.cluster_edges: Dict[int, List[Tuple[int, int, int]]] = {}
+        self.region_edges: Dict[int, List[Tuple[int, int, int]]] = {}
+
+    def clear_edges(self) -> None:
+        self.cluster_edges.clear()
+        self.region_edges.clear()
+
+
+class HierarchicalPathFinder:
+    def __init__(self, cluster_rows: int = constants.PATH_CLUSTER_ROWS,
+                 cluster_cols: int = constants.PATH_CLUSTER_COLS, spacing: int = constants.PATH_ENTRANCE_SPACING,
+                 region_clusters: int = constants.PATH_REGION_CLUSTERS,
+                 region_spacing: int = constants.PATH_REGION_SPACING):
+        """
+        Finds long paths on big boards over two levels of entrances. The board is split into clusters with
+        entrances every few steps along their borders, and the clusters are grouped into regions that keep
+        every few of those entrances along their own borders. The paths from every entrance across its cluster
+        and across its region are worked out for the whole board with numpy the first time a path is asked
+        for, along with the cost between every pair of region entrances. Finding a path far away is then a small
+        A* over region entrances, guided by those costs to the entrances of the goal's region, and finding one
+        nearby an A* over the cluster entrances of the regions around the start and goal.
+        Paths are close to the cheapest, not always the cheapest, since they cross borders at the entrances.
+
+        It never looks at the board, only at snapshots of the move costs like the ones the PathWorker searches,
+        so it is built and searched on the worker's thread. The paths worked out for the whole board only know
+        the terrain costs. For each movement profile the clusters and regions with cells in the zone of control
+        of other alignments are worked out again as routes go through them. A snapshot with different terrain
+        costs redoes the clusters and regions of the cells that changed.
+
+        :param cluster_rows: rows of a cluster
+        :param cluster_cols: cols of a cluster
+        :param spacing: steps between the entrances along a cluster border
+        :param region_clusters: clusters along each side of a region
+        :param region_spacing: cluster entrances along a region border for each one kept as a region entrance
+        """
+        self.cluster_rows = cluster_rows
+        self.cluster_cols = cluster_cols
+        self.spacing = spacing
+        self.region_clusters = region_clusters
+        self.region_spacing = region_spacing
+        self.region_rows = cluster_rows * region_clusters
+        self.region_cols = cluster_cols * region_clusters
+        # steps apart past which the start and goal are joined straight to the entrances of their regions
+        self.region_reach = min(self.region_rows // 2, self.region_cols * 2)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forgets the board, everything is worked out again the next time a path is asked for
+        """
+        self.rows = self.cols = 0
+        # terrain costs the board was worked out with, a snapshot that is never changed
+        self.costs = array('H')
+        # how much cheaper cells got since the costs between region entrances were worked out, no route between
+        # them got cheaper by more than that
+        self.slack = 0
+        self.profiles: Dict[Tuple[str, int], MovementProfile] = {}
+        self.cluster_count_cols = 0
+        self.region_count_cols = 0
+        # entrances of every cluster and region in the order of their slots in the fields
+        self.cluster_entrances: List[List[int]] = []
+        self.region_entrances: List[List[int]] = []
+        self.region_members: List[List[int]] = []
+        self.partners: Dict[int, List[int]] = {}
+        self.region_partners: Dict[int, List[int]] = {}
+        self.slots: Dict[int, int] = {}
+        self.region_slots: Dict[int, int] = {}
+        # cluster entrances by their index in the region fields
+        self.nodes: List[int] = []
+        self.node_ids: Dict[int, int] = {}
+        # cost from each entrance of a cell's cluster to the cell, and the direction back towards the entrance
+        self.fields = np.zeros((0, 0), np.uint16)
+        self.steps = np.zeros((0, 0), np.int8)
+        # the same from each entrance of a cluster entrance's region, and the cluster entrance before it
+        self.region_fields = np.zeros((0, 0), np.uint16)
+        self.region_previous = np.zeros((0, 0), np.int32)
+        self.region_edges: Dict[int, List[Tuple[int, int]]] = {}
+        self.matrices: Dict[int, List[List[int]]] = {}
+        self.segments: Dict[int, Dict[Tuple[int, int], Tuple]] = {}
+        self.region_segments: Dict[int, Dict[Tuple[int, int], Tuple]] = {}
+        # cost between every pair of region entrances, by their index among the region entrances
+        self.region_nodes: List[int] = []
+        self.region_ids: Dict[int, int] = {}
+        self.region_distances = np.zeros((0, 0), np.int32)
+
+    def get_cluster(self, index: int) -> int:
+        row, col = divmod(index, self.cols)
+        return (row // self.cluster_rows) * self.cluster_count_cols + col // self.cluster_cols
+
+    def get_region(self, index: int) -> int:
+        row, col = divmod(index, self.cols)
+        return (row // self.region_rows) * self.region_count_cols + col // self.region_cols
+
+    def get_cluster_region(self, cluster: int) -> int:
+        cluster_row, cluster_col = divmod(cluster, self.cluster_count_cols)
+        return (cluster_row // self.region_clusters) * self.region_count_cols + cluster_col // self.region_clusters
+
+    def get_block(self, cluster: int) -> Tuple[int, int, int, int]:
+        """
+        Gets the top row, left col, rows and cols of a cluster
+        """
+        cluster_row, cluster_col = divmod(cluster, self.cluster_count_cols)
+        top, left = cluster_row * self.cluster_rows, cluster_col * self.cluster_cols
+        return top, left, min(self.cluster_rows, self.rows - top), min(self.cluster_cols, self.cols - left)
+
+    def get_block_cells(self, cluster: int) -> List[int]:
+        top, left, height, width = self.get_block(cluster)
+        cols = self.cols
+        return [(top + row) * cols + left + col for row in range(height) for col in range(width)]
+
+    def get_local(self, cluster: int, index: int) -> int:
+        top, left, height, width = self.get_block(cluster)
+        row, col = divmod(index, self.cols)
+        return (row - top) * width + col - left
+
+    def build(self, rows: int, cols: int, costs: array) -> None:
+        """
+        Places the entrances for a board and works out the paths from every entrance across its cluster and its
+        region, and the costs between region entrances
+
+        :param rows: rows of the board
+        :param cols: cols of the board
+        :param costs: terrain cost of every cell, by flat index
+        """
+        self.reset()
+        self.rows, self.cols = rows, cols
+        self.costs = costs
+        self.place_entrances()
+        terrain = np.frombuffer(costs, np.uint16).astype(np.int32)
+        self.build_clusters(terrain)
+        self.build_regions(terrain)
+        self.build_distances()
+
+    def place_entrances(self) -> None:
+        """
+        Places the entrances of every cluster, then picks the region entrances out of the ones on region borders
+        """
+        rows, cols = self.rows, self.cols
+        cluster_rows, cluster_cols, spacing = self.cluster_rows, self.cluster_cols, self.spacing
+        count_rows = -(-rows // cluster_rows)
+        self.cluster_count_cols = count_cols = -(-cols // cluster_cols)
+        self.region_count_cols = -(-count_cols // self.region_clusters)
+        self.cluster_entrances = [[] for _ in range(count_rows * count_cols)]
+
+        def connect(row1, col1, row2, col2):
+            node1, node2 = row1 * cols + col1, row2 * cols + col2
+            for node in (node1, node2):
+                if node not in self.partners:
+                    self.partners[node] = []
+                    self.cluster_entrances[self.get_cluster(node)].append(node)
+            self.partners[node1].append(node2)
+            self.partners[node2].append(node1)
+
+        # neighboring entrances cross a border different ways, so paths heading straight across and paths
+        # heading across at a slant both find one that doesn't turn them aside
+        for cluster_row in range(count_rows):
+            top = cluster_row * cluster_rows
+            bottom = min(top + cluster_rows, rows)
+            for cluster_col in range(count_cols):
+                left = cluster_col * cluster_cols
+                right = min(left + cluster_cols, cols)
+                # the cluster below, (1, 0) is a neighbor on every row and (2, 0) is straight down, cols are two
+                # steps apart
+                if bottom < rows:
+                    count = max(1, round(2 * (right - left) / spacing))
+                    for k in range(count):
+                        col = left + (2 * k + 1) * (right - left) // (2 * count)
+                        connect(bottom - 1, col, bottom + 1 if k % 2 and bottom + 1 < rows else bottom, col)
+                # the cluster to the right, only odd rows have (+-1, 1) neighbors and rows are half a step apart
+                if right < cols:
+                    count = max(1, round((bottom - top) / 2 / spacing))
+                    for k in range(count):
+                        row = top + (2 * k + 1) * (bottom - top) // (2 * count)
+                        row += 1 - row % 2
+                        if row >= bottom:
+                            continue
+                        upwards = row + 1 >= bottom or k % 2 and row - 1 >= top
+                        connect(row, right - 1, row - 1 if upwards else row + 1, right)
+        self.slots = {node: slot for nodes in self.cluster_entrances for slot, node in enumerate(nodes)}
+        self.nodes = [node for nodes in self.cluster_entrances for node in nodes]
+        self.node_ids = {node: i for i, node in enumerate(self.nodes)}
+
+        count_regions = -(-count_rows // self.region_clusters) * self.region_count_cols
+        self.region_entrances = [[] for _ in range(count_regions)]
+        self.region_members = [[] for _ in range(count_regions)]
+        for cluster, nodes in enumerate(self.cluster_entrances):
+            self.region_members[self.get_cluster_region(cluster)].extend(nodes)
+        borders: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for node, partners in self.partners.items():
+            for partner in partners:
+                if node < partner and self.get_region(node) != self.get_region(partner):
+                    borders.setdefault((self.get_region(node), self.get_region(partner)), []).append((node, partner))
+        for crossings in borders.values():
+            # the first cell of a crossing is the upper or left one, so they sort along the border
+            crossings.sort()
+            count = max(1, round(len(crossings) / self.region_spacing))
+            picked = set()
+            for k in range(count):
+                index = (2 * k + 1) * len(crossings) // (2 * count)
+                # cluster entrances alternate the way they cross, keep the region entrances alternating too
+                if index % 2 != k % 2 and index + 1 < len(crossings):
+                    index += 1
+                picked.add(index)
+            for index in sorted(picked):
+                node1, node2 = crossings[index]
+                for node in (node1, node2):
+                    if node not in self.region_partners:
+                        self.region_partners[node] = []
+                        self.region_entrances[self.get_region(node)].append(node)
+                self.region_partners[node1].append(node2)
+                self.region_partners[node2].append(node1)
+        self.region_slots = {node: slot for nodes in self.region_entrances for slot, node in enumerate(nodes)}
+
+    def build_clusters(self, costs: np.ndarray) -> None:
+        """
+        Works out the cost from every entrance of each cluster to every cell of it, one search over the whole
+        board per entrance slot
+
+        :param costs: terrain cost of every cell
+        """
+        rows, cols = self.rows, self.cols
+        cells = np.arange(rows * cols, dtype=np.int32)
+        labels = (cells // cols // self.cluster_rows) * self.cluster_count_cols + cells % cols // self.cluster_cols
+        indptr, indices = get_board_graph(rows, cols, labels)
+        weights = costs[indices]
+        count = max(map(len, self.cluster_entrances), default=0)
+        self.fields = np.full((rows * cols, count), 65535, np.uint16)
+        self.steps = np.full((rows * cols, count), -1, np.int8)
+        for slot in range(count):
+            sources = [nodes[slot] for nodes in self.cluster_entrances if len(nodes) > slot]
+            distance, previous = spread(indptr, indices, weights, np.array(sources, np.int32))
+            self.fields[:, slot] = np.minimum(distance, 65535)
+            self.steps[:, slot] = get_step_codes(cells, previous, cols)
+
+    def build_regions(self, costs: np.ndarray) -> None:
+        """
+        Works out the cost from every entrance of each region to every cluster entrance of it, one search over
+        the cluster entrances of the whole board per entrance slot
+
+        :param costs: terrain cost of every cell
+        """
+        nodes = np.array(self.nodes, np.int32)
+        count = len(nodes)
+        width = self.fields.shape[1]
+        # every pair of entrances of a cluster, and the crossings that stay in a region
+        members = np.full((len(self.cluster_entrances), max(width, 1)), -1, np.int32)
+        clusters = np.empty(count, np.int32)
+        slots = np.empty(count, np.int32)
+        for cluster, entrances in enumerate(self.cluster_entrances):
+            ids = [self.node_ids[node] for node in entrances]
+            members[cluster, :len(ids)] = ids
+            clusters[ids] = cluster
+            slots[ids] = np.arange(len(ids))
+        froms = np.repeat(np.arange(count, dtype=np.int32), members.shape[1])
+        tos = members[clusters].ravel()
+        weights = np.where(tos >= 0, self.fields[nodes[np.maximum(tos, 0)], np.repeat(slots, members.shape[1])], 65535)
+        inside = (tos >= 0) & (tos != froms) & (weights != 65535)
+        crossings = [(self.node_ids[node], self.node_ids[partner]) for node, partners in self.partners.items()
+                     for partner in partners if self.get_region(node) == self.get_region(partner)]
+        crossings = np.array(crossings, np.int32).reshape(-1, 2)
+        froms = np.concatenate([froms[inside], crossings[:, 0]])
+        tos = np.concatenate([tos[inside], crossings[:, 1]])
+        weights = np.concatenate([weights[inside], costs[nodes[crossings[:, 1]]]]).astype(np.int32)
+        order = np.argsort(froms, kind='stable')
+        indptr = np.zeros(count + 1, np.int32)
+        np.cumsum(np.bincount(froms, minlength=count), out=indptr[1:])
+
+        depth = max(map(len, self.region_entrances), default=0)
+        self.region_fields = np.full((count, depth), 65535, np.uint16)
+        self.region_previous = np.full((count, depth), -1, np.int32)
+        for slot in range(depth):
+            sources = [self.node_ids[entrances[slot]] for entrances in self.region_entrances if len(entrances) > slot]
+            distance, previous = spread(indptr, tos[order], weights[order], np.array(sources, np.int32))
+            self.region_fields[:, slot] = np.minimum(distance, 65535)
+            self.region_previous[:, slot] = previous
+        for region in range(len(self.region_entrances)):
+            self.update_region_edges(region)
+
+    def update_region_edges(self, region: int) -> None:
+        """
+        Keeps the edges between the entrances of a region that no other entrance of it is on the way of, the rest
+        cost the same as going through that entrance
+        """
+        entrances = self.region_entrances[region]
+        ids = [self.node_ids[node] for node in entrances]
+        costs = self.region_fields[ids, :len(entrances)].T.astype(np.int64)
+        costs[costs == 65535] = UNREACHED
+        np.fill_diagonal(costs, UNREACHED)
+        through = (costs[:, :, None] + costs[None, :, :]).min(1)
+        kept = (costs < through).tolist()
+        costs = costs.tolist()
+        for slot, node in enumerate(entrances):
+            self.region_edges[node] = [(other, cost) for other, cost, keep in zip(entrances, costs[slot], kept[slot])
+                                       if keep and cost < UNREACHED]
+
+    def build_distances(self) -> None:
+        """
+        Works out the cost between every pair of region entrances, searching the region entrances of the whole
+        board from a batch of them at once
+        """
+        nodes = self.region_nodes = list(self.region_slots)
+        ids = self.region_ids = {node: i for i, node in enumerate(nodes)}
+        count = len(nodes)
+        self.slack = 0
+        self.region_distances = np.full((count, count), UNREACHED, np.int32)
+        edges = [(i, ids[other], cost) for i, node in enumerate(nodes) for other, cost in self.region_edges[node]]
+        edges.extend((i, ids[partner], self.costs[partner]) for i, node in enumerate(nodes)
+                     for partner in self.region_partners[node])
+        if not edges:
+            return
+        edges = np.array(edges, np.int32)
+        edges = edges[np.argsort(edges[:, 0], kind='stable')]
+        indptr = np.zeros(count + 1, np.int32)
+        np.cumsum(np.bincount(edges[:, 0], minlength=count), out=indptr[1:])
+        batch = max(1, 4000000 // len(edges))
+        for first in range(0, count, batch):
+            sources = range(first, min(first + batch, count))
+            distance, _ = spread(*stack_graph(indptr, edges[:, 1], edges[:, 2], len(sources)),
+                                 np.array([layer * count + i for layer, i in enumerate(sources)], np.int32))
+            self.region_distances[first:first + len(sources)] = distance.reshape(len(sources), count)
+
+    def update(self, rows: int, cols: int, costs: array) -> None:
+        """
+        Builds the board the first time, or works in the cells whose terrain cost changed since the last snapshot
+
+        :param rows: rows of the board
+        :param cols: cols of the board
+        :param costs: terrain cost of every cell, by flat index
+        """
+        if (rows, cols) != (self.rows, self.cols):
+            self.build(rows, cols, costs)
+            return
+        if costs is self.costs:
+            return
+        old, new = np.frombuffer(self.costs, np.uint16), np.frombuffer(costs, np.uint16)
+        changed = np.flatnonzero(old != new)
+        clusters = {self.get_cluster(index) for index in changed.tolist()}
+        if len(clusters) * 4 > len(self.cluster_entrances):
+            self.build(rows, cols, costs)
+            return
+        self.costs = costs
+        if not clusters:
+            return
+        regions = {self.get_cluster_region(cluster) for cluster in clusters}
+        for cluster in clusters:
+            self.update_cluster(cluster)
+        for region in regions:
+            self.update_region(region)
+        # the costs between region entrances are kept, routes only take them for estimates, which stay below the
+        # true costs as long as they are lowered by as much as any cells got cheaper
+        self.slack += int(np.maximum(old[changed].astype(np.int32) - new[changed], 0).sum())
+        if self.slack > self.region_reach:
+            self.build_distances()
+        for profile in self.profiles.values():
+            for cluster in clusters:
+                profile.clusters.pop(cluster, None)
+            for region in regions:
+                profile.regions.pop(region, None)
+            profile.clear_edges()
+
+    def update_cluster(self, cluster: int) -> None:
+        """
+        Works out the paths from the entrances of a cluster again after its terrain changed
+        """
+        top, left, height, width = self.get_block(cluster)
+        cells = self.get_block_cells(cluster)
+        neighbors = get_block_neighbors(height, width, top % 2)
+        costs = [self.costs[cell] for cell in cells]
+        indices = np.array(cells, np.int32)
+        for slot, node in enumerate(self.cluster_entrances[cluster]):
+            distance, previous = search_block(neighbors, costs, self.get_local(cluster, node))
+            previous = np.frombuffer(previous, np.int32)
+            self.fields[indices, slot] = np.minimum(distance, 65535)
+            self.steps[indices, slot] = get_step_codes(indices, np.where(previous >= 0, indices[previous], -1),
+                                                       self.cols)
+        self.matrices.pop(cluster, None)
+        self.segments.pop(cluster, None)
+
+    def update_region(self, region: int) -> None:
+        """
+        Works out the paths from the entrances of a region again after its terrain changed
+        """
+        if not self.region_entrances[region]:
+            return
+        members, distance, previous = self.search_region(region, None)
+        ids = np.array([self.node_ids[node] for node in members], np.int32)
+        count = len(distance)
+        self.region_fields[ids, :count] = np.minimum(distance, 65535).T
+        self.region_previous[ids, :count] = np.where(previous >= 0, ids[previous], -1).T
+        self.update_region_edges(region)
+        self.region_segments.pop(region, None)
+
+    def search_region(self, region: int, profile: Optional[MovementProfile]) -> Tuple[List[int], np.ndarray,
+                                                                                      np.ndarray]:
+        """
+        Searches from every entrance of a region to all of its cluster entrances at once, as one graph with a
+        copy of the region for each entrance
+
+        :param region: region searched
+        :param profile: movement profile whose costs are used, None for the terrain
+        :return: the cluster entrances of the region, and the cost from each region entrance to each of them
+            and the cluster entrance each was reached from, as indices into the cluster entrances
+        """
+        members = self.region_members[region]
+        index = {node: i for i, node in enumerate(members)}
+        indptr = [0]
+        indices = []
+        weights = []
+        for node in members:
+            for neighbor, cost, kind in self.get_cluster_edges(profile, node):
+                if neighbor in index:
+                    indices.append(index[neighbor])
+                    weights.append(cost)
+            indptr.append(len(indices))
+        entrances = self.region_entrances[region]
+        size = len(members)
+        sources = np.arange(len(entrances), dtype=np.int32) * size + [index[node] for node in entrances]
+        distance, previous = spread(*stack_graph(np.array(indptr, np.int32), np.array(indices, np.int32),
+                                                 np.array(weights, np.int32), len(entrances)), sources)
+        distance = distance.reshape(len(entrances), size)
+        previous = np.where(previous >= 0, previous % max(size, 1), -1).reshape(len(entrances), size)
+        return members, distance, previous
+
+    def get_profile(self, key: Tuple[str, int], costs: array) -> MovementProfile:
+        """
+        Gets a movement profile, with its zone of control brought up to date with its costs
+
+        :param key: alignment and speed of the units
+        :param costs: cost of moving onto every cell for the units, by flat index
+        """
+        profile = self.profiles.get(key)
+        if profile is None:
+            profile = self.profiles[key] = MovementProfile(*key)
+        if profile.costs is costs:
+            return profile
+        profile.costs = costs
+        zone = set(np.flatnonzero(np.frombuffer(costs, np.uint16) != np.frombuffer(self.costs, np.uint16)).tolist())
+        changed = zone ^ profile.zone
+        if changed:
+            for index in changed:
+                profile.clusters.pop(self.get_cluster(index), None)
+                profile.regions.pop(self.get_region(index), None)
+            profile.zone = zone
+            profile.zone_clusters = {self.get_cluster(index) for index in zone}
+            profile.zone_regions = {self.get_region(index) for index in zone}
+            profile.clear_edges()
+        return profile
+
+    def get_cost(self, profile: Optional[MovementProfile], index: int) -> int:
+        """
+        Gets the cost of moving onto a cell for a profile, or over the terrain for None
+        """
+        return (self.costs if profile is None else profile.costs)[index]
+
+    def get_cluster_tables(self, profile: MovementProfile, cluster: int) -> ClusterTables:
+        """
+        Gets the paths from the entrances of a cluster with cells in a profile's zone, with the profile's costs
+        """
+        tables = profile.clusters.get(cluster)
+        if tables is None:
+            top, left, height, width = self.get_block(cluster)
+            neighbors = get_block_neighbors(height, width, top % 2)
+            costs = [self.get_cost(profile, cell) for cell in self.get_block_cells(cluster)]
+            searches = [search_block(neighbors, costs, self.get_local(cluster, node))
+                        for node in self.cluster_entrances[cluster]]
+            tables = profile.clusters[cluster] = ClusterTables([distance for distance, _ in searches],
+                                                               [previous for _, previous in searches], {})
+        return tables
+
+    def get_region_tables(self, profile: MovementProfile, region: int) -> RegionTables:
+        """
+        Gets the paths from the entrances of a region with cells in a profile's zone, with the profile's costs
+        """
+        tables = profile.regions.get(region)
+        if tables is None:
+            members, distance, previous = self.search_region(region, profile)
+            tables = profile.regions[region] = RegionTables({node: i for i, node in enumerate(members)}, members,
+                                                            distance.tolist(), previous.tolist(), {})
+        return tables
+
+    def get_cluster_distance(self, profile: Optional[MovementProfile], cluster: int, slot: int, index: int) -> int:
+        """
+        Gets the cost from an entrance of a cluster to a cell of it
+
+        :return: cost, UNREACHED if there is no path inside the cluster
+        """
+        if profile is not None and cluster in profile.zone_clusters:
+            return self.get_cluster_tables(profile, cluster).distances[slot][self.get_local(cluster, index)]
+        cost = int(self.fields[index, slot])
+        return UNREACHED if cost == 65535 else cost
+
+    def get_cluster_edges(self, profile: Optional[MovementProfile], node: int) -> List[Tuple[int, int, int]]:
+        """
+        Gets the edges from a cluster entrance to the other entrances of its cluster and across its crossings
+
+        :param profile: movement profile whose costs are used, None for the terrain
+        :param node: flat index of the entrance
+        :return: list of the entrance each edge leads to, its cost and its kind
+        """
+        edges = None if profile is None else profile.cluster_edges.get(node)
+        if edges is not None:
+            return edges
+        cluster = self.get_cluster(node)
+        entrances = self.cluster_entrances[cluster]
+        slot = self.slots[node]
+        if profile is not None and cluster in profile.zone_clusters:
+            tables = self.get_cluster_tables(profile, cluster)
+            costs = [tables.distances[slot][self.get_local(cluster, other)] for other in entrances]
+        else:
+            matrix = self.matrices.get(cluster)
+            if matrix is None:
+                matrix = self.matrices[cluster] = self.fields[entrances, :len(entrances)].T.tolist()
+            costs = [UNREACHED if cost == 65535 else cost for cost in matrix[slot]]
+        edges = [(other, cost, CLUSTER) for other, cost in zip(entrances, costs) if other != node and cost < UNREACHED]
+        edges.extend((partner, self.get_cost(profile, partner), STEP) for partner in self.partners[node])
+        if profile is not None:
+            profile.cluster_edges[node] = edges
+        return edges
+
+    def get_region_edges(self, profile: MovementProfile, node: int) -> List[Tuple[int, int, int]]:
+        """
+        Gets the edges from a region entrance to the other entrances of its region and across its crossings
+        """
+        edges = profile.region_edges.get(node)
+        if edges is not None:
+            return edges
+        region = self.get_region(node)
+        if region in profile.zone_regions:
+            tables = self.get_region_tables(profile, region)
+            costs = tables.distances[self.region_slots[node]]
+            edges = [(other, costs[tables.index[other]], REGION) for other in self.region_entrances[region]
+                     if other != node and costs[tables.index[other]] < UNREACHED]
+        else:
+            edges = [(other, cost, REGION) for other, cost in self.region_edges[node]]
+        edges.extend((partner, self.get_cost(profile, partner), STEP) for partner in self.region_partners[node])
+        profile.region_edges[node] = edges
+        return edges
+
+    def walk(self, profile: MovementProfile, cluster: int, slot: int, index: int) -> List[int]:
+        """
+        Follows the path from a cell of a cluster back to one of its entrances
+
+        :return: flat indices from the cell to the entrance
+        """
+        cols = self.cols
+        path = [index]
+        if cluster in profile.zone_clusters:
+            previous = self.get_cluster_tables(profile, cluster).previous[slot]
+            top, left, height, width = self.get_block(cluster)
+            local = self.get_local(cluster, index)
+            while previous[local] >= 0:
+                local = previous[local]
+                path.append((top + local // width) * cols + left + local % width)
+            return path
+        steps = self.steps[:, slot]
+        while steps[index] >= 0:
+            drow, dcol = DIRECTIONS[index // cols % 2][steps[index]]
+            index += drow * cols + dcol
+            path.append(index)
+        return path
+
+    def get_segment(self, profile: MovementProfile, node: int, other: int) -> Tuple:
+        """
+        Gets the cells after an entrance of a cluster up to another entrance of it, kept for the next paths
+        """
+        cluster = self.get_cluster(node)
+        if cluster in profile.zone_clusters:
+            segments = self.get_cluster_tables(profile, cluster).segments
+        else:
+            segments = self.segments.setdefault(cluster, {})
+        segment = segments.get((node, other))
+        if segment is None:
+            segment = segments[(node, other)] = tuple(self.walk(profile, cluster, self.slots[node], other)[-2::-1])
+        return segment
+
+    def get_region_path(self, profile: MovementProfile, node: int, other: int) -> List[int]:
+        """
+        Gets the cluster entrances from an entrance of a region up to another entrance of it
+        """
+        region = self.get_region(node)
+        slot = self.region_slots[node]
+        path = [other]
+        if region in profile.zone_regions:
+            tables = self.get_region_tables(profile, region)
+            previous = tables.previous[slot]
+            local = previous[tables.index[other]]
+            while local >= 0:
+                path.append(tables.members[local])
+                local = previous[local]
+        else:
+            previous = self.region_previous[:, slot]
+            current = previous[self.node_ids[other]]
+            while current >= 0:
+                path.append(self.nodes[current])
+                current = previous[current]
+        path.reverse()
+        return path
+
+    def extend_through(self, path: List, profile: MovementProfile, entrances: List[int]) -> None:
+        """
+        Adds the cells after the first of a chain of cluster entrances up to the last to a path
+        """
+        for first, second in zip(entrances, entrances[1:]):
+            if self.get_cluster(first) == self.get_cluster(second):
+                path.extend(self.get_segment(profile, first, second))
+            else:
+                path.append(second)
+
+    def get_region_segment(self, profile: MovementProfile, node: int, other: int) -> Tuple:
+        """
+        Gets the cells after an entrance of a region up to another entrance of it, kept for the next paths
+        """
+        region = self.get_region(node)
+        if region in profile.zone_regions:
+            segments = self.get_region_tables(profile, region).segments
+        else:
+            segments = self.region_segments.setdefault(region, {})
+        segment = segments.get((node, other))
+        if segment is None:
+            cells = []
+            self.extend_through(cells, profile, self.get_region_path(profile, node, other))
+            segment = segments[(node, other)] = tuple(cells)
+        return segment
+
+    def join_region(self, profile: MovementProfile, region: int, costs: Dict[int, int],
+                    from_start: bool) -> Dict[int, Tuple[int, int]]:
+        """
+        Joins the start or goal to the entrances of its region through cluster entrances of the region
+
+        :param profile: movement profile of the unit moving
+        :param region: region of the start or goal
+        :param costs: cost from the start to cluster entrances of its region, or from them to the goal
+        :param from_start: whether the costs are from the start, the paths from the region entrances are then
+            taken backwards
+        :return: dict of region entrance to the cheapest cost to or from it and the cluster entrance it goes through
+        """
+        entrances = self.region_entrances[region]
+        nodes = list(costs)
+        if not entrances or not nodes:
+            return {}
+        if region in profile.zone_regions:
+            tables = self.get_region_tables(profile, region)
+            matrix = np.array([[row[tables.index[node]] for row in tables.distances] for node in nodes], np.int64)
+        else:
+            matrix = self.region_fields[[self.node_ids[node] for node in nodes], :len(entrances)].astype(np.int64)
+            matrix[matrix == 65535] = UNREACHED
+        matrix += np.array([costs[node] for node in nodes], np.int64)[:, None]
+        if from_start:
+            matrix += np.array([self.get_cost(profile, entrance) for entrance in entrances], np.int64)[None, :]
+            matrix -= np.array([self.get_cost(profile, node) for node in nodes], np.int64)[:, None]
+        cheapest = matrix.argmin(0).tolist()
+        totals = matrix[cheapest, np.arange(len(entrances))].tolist()
+        return {entrance: (total, nodes[i]) for entrance, i, total in zip(entrances, cheapest, totals)
+                if total < UNREACHED}
+
+    def find_path(self, rows: int, cols: int, terrain: array, key: Tuple[str, int], costs: array, source: int,
+                  target: int) -> Tuple[int, ...]:
+        """
+        Finds a path by routing between region entrances, or between the cluster entrances of the regions
+        around the start and goal when they are near each other, then joining the paths between the entrances
+
+        :param rows: rows of the board
+        :param cols: cols of the board
+        :param terrain: terrain cost of every cell, by flat index
+        :param key: alignment and speed of the unit moving
+        :param costs: cost of moving onto every cell for the unit, by flat index
+        :param source: flat index of the start
+        :param target: flat index of the goal
+        :return: flat indices of the path from start to goal like search's, empty if there is no path
+        """
+        self.update(rows, cols, terrain)
+        profile = self.get_profile(key, costs)
+        if source == target:
+            return source,
+        start, goal = divmod(source, cols), divmod(target, cols)
+        source_cluster, target_cluster = self.get_cluster(source), self.get_cluster(target)
+        source_region, target_region = self.get_region(source), self.get_region(target)
+
+        # a path back from an entrance costs the same as the path to it less the start's cost plus the
+        # entrance's, so the paths from the entrances join the start to them too
+        start_edges = []
+        nearby = None
+        if source_cluster == target_cluster:
+            top, left, height, width = self.get_block(source_cluster)
+            costs = [self.get_cost(profile, cell) for cell in self.get_block_cells(source_cluster)]
+            nearby = search_block(get_block_neighbors(height, width, top % 2), costs,
+                                  self.get_local(source_cluster, source))
+            start_edges.append((TARGET, nearby[0][self.get_local(source_cluster, target)], DIRECT))
+        source_cost = self.get_cost(profile, source)
+        joins = {}
+        for slot, node in enumerate(self.cluster_entrances[source_cluster]):
+            if nearby is not None:
+                cost = nearby[0][self.get_local(source_cluster, node)]
+            else:
+                cost = self.get_cluster_distance(profile, source_cluster, slot, source)
+                cost += self.get_cost(profile, node) - source_cost
+            if cost < UNREACHED:
+                joins[node] = cost
+        goal_joins = {}
+        for slot, node in enumerate(self.cluster_entrances[target_cluster]):
+            cost = self.get_cluster_distance(profile, target_cluster, slot, target)
+            if cost < UNREACHED:
+                goal_joins[node] = cost
+
+        # far apart, the start and goal join the entrances of their regions the same way, through the paths
+        # across their regions, and the route only goes over region entrances
+        entered = exited = {}
+        distance = hex_distance(*start, *goal)
+        if source_region != target_region and distance >= self.region_reach:
+            entered = self.join_region(profile, source_region, joins, True)
+            exited = self.join_region(profile, target_region, goal_joins, False)
+        estimates = None
+        if entered and exited:
+            open_regions = set()
+            start_edges.extend((entrance, cost, ENTER) for entrance, (cost, _) in entered.items())
+            goal_edges = {entrance: (cost, LEAVE) for entrance, (cost, _) in exited.items()}
+            # the cheapest way on from each region entrance over the terrain to the goal, through whichever entrance
+            # of the goal's region is best
+            exits = [self.region_ids[entrance] for entrance in goal_edges]
+            estimates = (self.region_distances[:, exits].astype(np.int64) +
+                         np.array([cost for cost, _ in goal_edges.values()], np.int64)).min(1).tolist()
+        else:
+            # the regions around the start and goal, a path between them can pass by a corner into a third
+            region_rows = range(max(0, min(start[0], goal[0]) - self.cluster_rows) // self.region_rows,
+                                min(rows - 1, max(start[0], goal[0]) + self.cluster_rows) // self.region_rows + 1)
+            region_cols = range(max(0, min(start[1], goal[1]) - self.cluster_cols) // self.region_cols,
+                                min(cols - 1, max(start[1], goal[1]) + self.cluster_cols) // self.region_cols + 1)
+            open_regions = {row * self.region_count_cols + col for row in region_rows for col in region_cols}
+            start_edges.extend((node, cost, START) for node, cost in joins.items())
+            goal_edges = {node: (cost, GOAL) for node, cost in goal_joins.items()}
+
+        region_rows, region_cols, region_count_cols = self.region_rows, self.region_cols, self.region_count_cols
+        region_slots, region_ids = self.region_slots, self.region_ids
+        cluster_edges, region_edges = profile.cluster_edges, profile.region_edges
+        slack = self.slack
+        goal_row, goal_q = goal[0], 2 * goal[1] + goal[0] % 2
+        # keys order by the estimate, then by the most spent so ties go deepest first
+        scale = 1 << 32
+        best = {SOURCE: 0}
+        came_from: Dict[int, Tuple[int, int]] = {}
+        open_set = [(scale - 1, SOURCE)]
+        while open_set:
+            key, current = heapq.heappop(open_set)
+            cost = scale - 1 - key % scale
+            if cost > best[current]:
+                continue
+            if current == TARGET:
+                break
+            if current == SOURCE:
+                edges = start_edges
+            else:
+                row, col = divmod(current, cols)
+                if (row // region_rows) * region_count_cols + col // region_cols in open_regions:
+                    edges = cluster_edges.get(current) or self.get_cluster_edges(profile, current)
+                else:
+                    edges = region_edges.get(current) or self.get_region_edges(profile, current)
+                if current in goal_edges:
+                    edges = edges + [(TARGET, *goal_edges[current])]
+            for node, step, kind in edges:
+                new_cost = cost + step
+                if new_cost >= best.get(node, UNREACHED):
+                    continue
+                if node == TARGET:
+                    estimate = 0
+                elif estimates is not None:
+                    estimate = max(0, estimates[region_ids[node]] - slack)
+                else:
+                    # regions away from the start and goal are only crossed between their region entrances
+                    row, col = divmod(node, cols)
+                    if kind == STEP and node not in region_slots and \
+                            (row // region_rows) * region_count_cols + col // region_cols not in open_regions:
+                        continue
+                    # every step costs at least one
+                    across = abs(2 * col + row % 2 - goal_q)
+                    estimate = across + max(0, (abs(row - goal_row) - across) // 2)
+                best[node] = new_cost
+                came_from[node] = (current, kind)
+                heapq.heappush(open_set, ((new_cost + estimate) * scale + scale - 1 - new_cost, node))
+
+        if TARGET not in best:
+            return ()
+        hops = []
+        node = TARGET
+        while node != SOURCE:
+            previous, kind = came_from[node]
+            hops.append((previous, node, kind))
+            node = previous
+        path = [source]
+        for previous, node, kind in reversed(hops):
+            if kind == STEP:
+                path.append(node)
+            elif kind == CLUSTER:
+                path.extend(self.get_segment(profile, previous, node))
+            elif kind == REGION:
+                path.extend(self.get_region_segment(profile, previous, node))
+            elif kind == ENTER:
+                joined = entered[node][1]
+                self.extend_start(path, profile, nearby, source, joined)
+                self.extend_through(path, profile, self.get_region_path(profile, node, joined)[::-1])
+            elif kind == LEAVE:
+                joined = exited[previous][1]
+                self.extend_through(path, profile, self.get_region_path(profile, previous, joined))
+                path.extend(self.walk(profile, target_cluster, self.slots[joined], target)[-2::-1])
+            elif kind == GOAL:
+                path.extend(self.walk(profile, target_cluster, self.slots[previous], target)[-2::-1])
+            else:
+                self.extend_start(path, profile, nearby, source, target if kind == DIRECT else node)
+        return tuple(path)
+
+    def extend_start(self, path: List, profile: MovementProfile, nearby: Optional[Tuple[List[int], array]],
+                     source: int, index: int) -> None:
+        """
+        Adds the cells after the start up to a cell of its cluster to a path, along the search from the start when
+        the goal is in the same cluster, or back along the path from an entrance
+        """
+        cluster = self.get_cluster(source)
+        if nearby is None:
+            path.extend(self.walk(profile, cluster, self.slots[index], source)[1:])
+            return
+        top, left, height, width = self.get_block(cluster)
+        cols = self.cols
+        local = self.get_local(cluster, index)
+        cells = []
+        while nearby[1][local] >= 0:
+            cells.append((top + local // width) * cols + left + local % width)
+            local = nearby[1][local]
+        path.extend(reversed(cells))
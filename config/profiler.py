@@ -0,0 +1,173 @@
+import csv
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Deque, Dict, List
+
+import pygame
+
+from config import constants
+
+# handed out for every phase while profiling is off, so disabled hooks cost one method call
+NULL_PHASE = nullcontext()
+
+
+class PhaseTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        frame = self.profiler.frame
+        frame[self.name] = frame.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class FrameProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.hud_visible = False
+        self.phases: List[str] = []
+        self.timers: Dict[str, PhaseTimer] = {}
+        self.frame: Dict[str, float] = {}
+        self.history: Dict[str, Deque[float]] = {}
+        self.frame_times: Deque[float] = deque(maxlen=constants.PROFILER_HISTORY)
+        self.frame_start = 0.0
+        self.frame_number = 0
+        self.csv_file = None
+        self.csv_writer = None
+        self.csv_phases: List[str] = []
+
+    def phase(self, name: str):
+        """
+        Gets a context manager that times a phase of the frame
+
+        :param name: name of the phase
+        :return: timer for the phase, or a shared no-op when profiling is off
+        """
+        if not self.enabled:
+            return NULL_PHASE
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self, name)
+            self.phases.append(name)
+            self.history[name] = deque(maxlen=constants.PROFILER_HISTORY)
+        return timer
+
+    def begin_frame(self) -> None:
+        """
+        Starts timing a frame, closing off the previous one
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start:
+            self.end_frame(now - self.frame_start)
+        self.frame_start = now
+        self.frame = {}
+
+    def end_frame(self, frame_time: float) -> None:
+        """
+        Stores the timings of the finished frame and writes them to the csv if it is being recorded
+
+        :param frame_time: wall time of the whole frame in seconds
+        """
+        self.frame_number += 1
+        self.frame_times.append(frame_time)
+        for name in self.phases:
+            self.history[name].append(self.frame.get(name, 0.0))
+
+        if self.csv_writer is not None:
+            if self.csv_phases != self.phases:
+                # new phases showed up, start a new header so the columns stay lined up
+                self.csv_phases = list(self.phases)
+                self.csv_writer.writerow(["frame", "frame_ms"] + self.csv_phases)
+            self.csv_writer.writerow([self.frame_number, round(frame_time * 1000, 4)] +
+                                     [round(self.frame.get(name, 0.0) * 1000, 4) for name in self.csv_phases])
+
+    def update_enabled(self) -> None:
+        self.enabled = self.hud_visible or self.csv_writer is not None
+        if not self.enabled:
+            self.frame_start = 0.0
+
+    def toggle_hud(self) -> None:
+        """
+        Shows or hides the profiler overlay
+        """
+        self.hud_visible = not self.hud_visible
+        self.update_enabled()
+
+    def toggle_csv(self, path: str = constants.PROFILER_CSV) -> None:
+        """
+        Starts or stops dumping per-frame timings to a csv file
+
+        :param path: path of the csv file
+        """
+        if self.csv_file is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.csv_file = open(path, "w", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_phases = []
+        else:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
+        self.update_enabled()
+
+    def get_percentile(self, fraction: float) -> float:
+        """
+        Gets a percentile of the recent frame times
+
+        :param fraction: percentile between 0 and 1
+        :return: frame time in seconds
+        """
+        if not self.frame_times:
+            return 0.0
+        ordered = sorted(self.frame_times)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def draw(self, screen) -> None:
+        """
+        Draws the rolling phase times and the frame time distribution in the top left of the screen
+
+        :param screen: main surface
+        """
+        if not self.hud_visible:
+            return
+        font = constants.FONT_DEFAULT
+        line_height = constants.FONT_DEFAULT_SIZE + 4
+        lines = ["frame  p50 %.2f  p95 %.2f  max %.2f ms" % (self.get_percentile(0.5) * 1000,
+                                                             self.get_percentile(0.95) * 1000,
+                                                             max(self.frame_times, default=0.0) * 1000)]
+        for name in self.phases:
+            history = self.history[name]
+            average = sum(history) / len(history) if history else 0.0
+            lines.append("%-12s %.2f ms" % (name, average * 1000))
+
+        histogram_height = 60
+        width = 420
+        height = len(lines) * line_height + histogram_height + 20
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill(constants.PROFILER_BACKGROUND)
+        for i, line in enumerate(lines):
+            panel.blit(font.render(line, True, constants.PROFILER_TEXT), (10, 5 + i * line_height))
+
+        # one bar per recent frame, scaled so the frame budget is half the histogram height
+        budget = 1 / constants.FRAME_RATE
+        bar_width = width / constants.PROFILER_HISTORY
+        bottom = height - 10
+        for i, frame_time in enumerate(self.frame_times):
+            bar_height = min(histogram_height, histogram_height / 2 * frame_time / budget)
+            color = constants.PROFILER_TEXT if frame_time <= budget else constants.HEALTH_RED
+            pygame.draw.rect(panel, color, (i * bar_width, bottom - bar_height, max(1, bar_width), bar_height))
+        pygame.draw.line(panel, constants.HEALTH_YELLOW, (0, bottom - histogram_height / 2),
+                         (width, bottom - histogram_height / 2))
+        screen.blit(panel, (0, 0))
@@ -0,0 +1,80 @@
+import io
+import os
+import struct
+from typing import Iterator
+
+from config.commands import encode_command, decode_command, apply_command
+from config.save import write_game, read_game
+
+# magic, version, followed by the game the log starts from as a length prefixed save
+HEADER = struct.Struct('<4sH')
+MAGIC = b'FLOG'
+VERSION = 1
+# every command after it is a length prefix followed by the command as the network sends it
+LENGTH = struct.Struct('<I')
+
+
+class GameRecorder:
+    def __init__(self, app, path: str):
+        """
+        Records the commands played in an app to a game log, starting from the game as it is now.
+        Set it as the app's recorder and apply_command writes every command to it before playing it.
+
+        :param app: app being recorded
+        :param path: file path of the log
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.app = app
+        self.file = open(path, 'wb')
+        self.commands = 0
+        state = io.BytesIO()
+        write_game(app, state)
+        self.file.write(HEADER.pack(MAGIC, VERSION) + LENGTH.pack(len(state.getvalue())) + state.getvalue())
+
+    def record(self, command) -> None:
+        """
+        Writes a command, it has to be recorded before it is played since attacks are stored by their
+        index among the attacks of the units on the board
+
+        :param command: Spawn, Move or EndTurn
+        """
+        data = encode_command(self.app, command)
+        self.file.write(LENGTH.pack(len(data)) + data)
+        self.commands += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def replay_game(app, path: str) -> Iterator:
+    """
+    Loads the game a log starts from into the app, the commands are played as the returned iterator is
+    gone through
+
+    :param app: app the log is played in
+    :param path: file path of the log
+    :return: iterator of each command, yielded once it has been played
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported game log")
+    offset = HEADER.size
+    length, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    read_game(app, memoryview(data)[offset:offset + length])
+    return play_commands(app, memoryview(data), offset + length)
+
+
+def play_commands(app, data: memoryview, offset: int) -> Iterator:
+    while offset < len(data):
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        # attacks are decoded against the board the command is played on
+        command = decode_command(app, data[offset:offset + length])
+        offset += length
+        apply_command(app, command)
+        yield command
@@ -0,0 +1,183 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import List, Tuple
+
+from config.app import Position
+from config.unit import UnitState
+
+# magic, version, rows, cols, turn, alignment count, tile type count, unit type count, unit count
+HEADER = struct.Struct('<4sHIIHBBBI')
+MAGIC = b'FATE'
+VERSION = 1
+
+# every unit column is stored as one contiguous little-endian block, in this order
+UNIT_COLUMNS: List[Tuple[str, str]] = [
+    ('row', 'I'),
+    ('col', 'I'),
+    ('unit_type', 'B'),
+    ('alignment', 'B'),
+    ('original_alignment', 'B'),
+    ('health', 'i'),
+    ('speed', 'i'),
+    ('movement', 'i'),
+    ('can_attack', 'B'),
+    ('statuses', 'I'),
+]
+
+
+def save_game(app, path: str) -> None:
+    """
+    Saves the board, units and turn state of the app in the binary save format.
+    Units that are in the middle of a move animation are not on the board and are not saved.
+
+    :param app: app being saved
+    :param path: file path of the save
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        write_game(app, f)
+
+
+def write_game(app, f) -> None:
+    """
+    Writes the app in the binary save format to any binary stream, like a save file or the full state
+    sent to a player joining a network game. A map still being streamed in is read to the end first.
+
+    :param app: app being written
+    :param f: writable binary stream
+    """
+    app.finish_map_loading()
+    alignments = list(app.alignments)
+    tile_names = list(app.tile_info.keys())
+    unit_names = list(app.unit_info.keys())
+    alignment_ids = {alignment: i for i, alignment in enumerate(alignments)}
+    tile_ids = {name: i for i, name in enumerate(tile_names)}
+    unit_ids = {name: i for i, name in enumerate(unit_names)}
+
+    tiles = array('B', bytes(app.rows * app.cols))
+    columns = {name: array(code) for name, code in UNIT_COLUMNS}
+    i = 0
+    for row in range(app.rows):
+        for col in range(app.cols):
+            tiles[i] = tile_ids[app.game_map[row][col].tile.name]
+            i += 1
+            unit = app.unit_map[row][col].unit
+            if unit is not None:
+                columns['row'].append(row)
+                columns['col'].append(col)
+                state = unit.get_state()
+                columns['unit_type'].append(unit_ids[state.name])
+                columns['alignment'].append(alignment_ids[state.alignment])
+                columns['original_alignment'].append(alignment_ids[state.original_alignment])
+                columns['health'].append(state.health)
+                columns['speed'].append(state.speed)
+                columns['movement'].append(state.movement)
+                columns['can_attack'].append(1 if state.can_attack else 0)
+                columns['statuses'].append(state.statuses)
+
+    f.write(HEADER.pack(MAGIC, VERSION, app.rows, app.cols, app.turn, len(alignments),
+                        len(tile_names), len(unit_names), len(columns['row'])))
+    for names in (alignments, tile_names, unit_names):
+        f.write(pack_names(names))
+    f.write(tiles.tobytes())
+    for name, code in UNIT_COLUMNS:
+        column = columns[name]
+        if sys.byteorder == 'big':
+            column.byteswap()
+        f.write(column.tobytes())
+
+
+def load_game(app, path: str) -> None:
+    """
+    Loads a binary save into the app, replacing its board, units and turn state.
+    The file is memory-mapped and every block is read straight into an array.
+
+    :param app: app being loaded into
+    :param path: file path of the save
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        read_game(app, data)
+
+
+def read_game(app, data) -> None:
+    """
+    Reads the binary save format from a buffer into the app, replacing its board, units and turn state
+
+    :param app: app being loaded into
+    :param data: buffer holding the save, like a memory-mapped save file or the state of a network game
+    """
+    magic, version, rows, cols, turn, alignment_count, tile_type_count, unit_type_count, unit_count = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported save data")
+
+    offset = HEADER.size
+    alignments, offset = unpack_names(data, offset, alignment_count)
+    tile_names, offset = unpack_names(data, offset, tile_type_count)
+    unit_names, offset = unpack_names(data, offset, unit_type_count)
+
+    tiles = array('B')
+    tiles.frombytes(data[offset:offset + rows * cols])
+    offset += rows * cols
+
+    columns = {}
+    for name, code in UNIT_COLUMNS:
+        column = array(code)
+        size = column.itemsize * unit_count
+        column.frombytes(data[offset:offset + size])
+        if sys.byteorder == 'big':
+            column.byteswap()
+        columns[name] = column
+        offset += size
+
+    app.turn = turn
+    app.reset_map(rows, cols)
+    templates = [app.tile_info[name] for name in tile_names]
+    app.append_map_rows((tiles[row * cols:(row + 1) * cols] for row in range(rows)), templates)
+
+    for i in range(unit_count):
+        state = UnitState(unit_names[columns['unit_type'][i]], alignments[columns['alignment'][i]],
+                          alignments[columns['original_alignment'][i]], columns['health'][i], columns['speed'][i],
+                          columns['movement'][i], columns['can_attack'][i] == 1, columns['statuses'][i])
+        app.place_unit(Position(columns['row'][i], columns['col'][i]), state)
+
+    app.reset_selection()
+    app.history.reset(app)
+
+
+def pack_names(names: List[str]) -> bytes:
+    """
+    Packs a table of names, each as a length byte followed by utf-8 text
+
+    :param names: list of names
+    :return: packed names
+    """
+    packed = bytearray()
+    for name in names:
+        encoded = name.encode('utf-8')
+        packed.append(len(encoded))
+        packed += encoded
+    return bytes(packed)
+
+
+def unpack_names(data, offset: int, count: int) -> Tuple[List[str], int]:
+    """
+    Unpacks a table of names
+
+    :param data: buffer being read
+    :param offset: offset of the table in the buffer
+    :param count: number of names in the table
+    :return: list of names and the offset after the table
+    """
+    names = []
+    for _ in range(count):
+        length = data[offset]
+        names.append(bytes(data[offset + 1:offset + 1 + length]).decode('utf-8'))
+        offset += 1 + length
+    return names, offset
+
@@ -0,0 +1,161 @@
+from typing import List, Optional, Set
+
+import numpy as np
+
+from config import constants
+
+
+def get_status_flag(status: str) -> int:
+    return 1 << constants.STATUSES.index(status)
+
+
+class StatusEngine:
+    def __init__(self, alignments: List[str], capacity: int = 64):
+        self.alignments = alignments
+        # one slot per unit in the game, statuses are bitflags over constants.STATUSES and each
+        # status has its own row of turns left, -1 lasting until removed
+        self.flags = np.zeros(capacity, dtype=np.uint32)
+        self.durations = np.zeros((len(constants.STATUSES), capacity), dtype=np.int16)
+        self.alignment_ids = np.full(capacity, -1, dtype=np.int8)
+        self.units: List = [None] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def reset(self) -> None:
+        """
+        Forgets every unit, keeping the slots already allocated
+        """
+        capacity = len(self.units)
+        self.flags.fill(0)
+        self.durations.fill(0)
+        self.alignment_ids.fill(-1)
+        self.units = [None] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def grow(self) -> None:
+        capacity = len(self.units)
+        self.flags = np.concatenate([self.flags, np.zeros(capacity, dtype=np.uint32)])
+        self.durations = np.concatenate([self.durations, np.zeros_like(self.durations)], axis=1)
+        self.alignment_ids = np.concatenate([self.alignment_ids, np.full(capacity, -1, dtype=np.int8)])
+        self.units.extend([None] * capacity)
+        self.free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def register(self, unit) -> None:
+        """
+        Gives a unit a slot so it can hold statuses
+
+        :param unit: unit being registered
+        """
+        if not self.free_slots:
+            self.grow()
+        slot = self.free_slots.pop()
+        self.units[slot] = unit
+        self.flags[slot] = 0
+        self.durations[:, slot] = 0
+        unit.status_engine = self
+        unit.status_slot = slot
+        self.set_alignment(unit, unit.alignment)
+
+    def unregister(self, unit) -> None:
+        """
+        Frees the slot of a unit that has left the game
+
+        :param unit: unit being removed
+        """
+        slot = unit.status_slot
+        if slot >= 0 and self.units[slot] is unit:
+            self.units[slot] = None
+            self.flags[slot] = 0
+            self.alignment_ids[slot] = -1
+            self.free_slots.append(slot)
+        unit.status_engine = None
+        unit.status_slot = -1
+
+    def set_alignment(self, unit, alignment: str) -> None:
+        self.alignment_ids[unit.status_slot] = self.alignments.index(alignment) if alignment in self.alignments else -1
+
+    def add_status(self, unit, status: str, duration: Optional[int] = None) -> None:
+        """
+        Gives a unit a status, keeping the longer duration if it already has it
+
+        :param unit: unit receiving the status
+        :param status: name of the status
+        :param duration: turns of the unit's alignment the status lasts, -1 until removed, None for the default
+        """
+        index = constants.STATUSES.index(status)
+        if duration is None:
+            duration = constants.STATUS_DURATIONS[status]
+        slot = unit.status_slot
+        current = int(self.durations[index, slot])
+        if not self.flags[slot] & (1 << index) or duration < 0 or 0 <= current < duration:
+            self.durations[index, slot] = duration
+        self.flags[slot] |= 1 << index
+
+    def remove_status(self, unit, status: str) -> None:
+        slot = unit.status_slot
+        self.flags[slot] &= ~np.uint32(get_status_flag(status))
+        self.durations[constants.STATUSES.index(status), slot] = 0
+
+    def has_status(self, unit, status: str) -> bool:
+        return bool(self.flags[unit.status_slot] & get_status_flag(status))
+
+    def get_flags(self, unit) -> int:
+        return int(self.flags[unit.status_slot])
+
+    def set_flags(self, unit, flags: int) -> None:
+        """
+        Replaces all statuses of a unit, used when restoring saves and snapshots, statuses get their default duration
+
+        :param unit: unit whose statuses are set
+        :param flags: status bitflags
+        """
+        slot = unit.status_slot
+        self.flags[slot] = 0
+        self.durations[:, slot] = 0
+        for i, status in enumerate(constants.STATUSES):
+            if flags & (1 << i):
+                self.add_status(unit, status)
+
+    def get_statuses(self, unit) -> Set[str]:
+        flags = self.flags[unit.status_slot]
+        return {status for i, status in enumerate(constants.STATUSES) if flags & (1 << i)}
+
+    def upkeep(self, alignment: str) -> bool:
+        """
+        Applies the turn start effects of every status on the units of the alignment whose turn is starting,
+        then counts their durations down. Runs after their movement has been reset for the turn.
+
+        :param alignment: alignment whose turn is starting
+        :return: True if poison defeated a unit, it is left on the board with no health for the app to remove
+        """
+        if alignment not in self.alignments:
+            return False
+        acting = self.alignment_ids == self.alignments.index(alignment)
+        if not (acting & (self.flags != 0)).any():
+            return False
+
+        # poison hurts every turn and can kill, slowed units only get half their movement this turn. Health
+        # and movement live on the units, so they are gathered once for the units with either status, worked out
+        # together and only the units whose values changed are written back.
+        poisoned = acting & (self.flags & get_status_flag(constants.STATUS_POISON) != 0)
+        slowed = acting & (self.flags & get_status_flag(constants.STATUS_SLOWED) != 0)
+        slots = np.flatnonzero(poisoned | slowed)
+        defeated = False
+        if len(slots):
+            units = [self.units[slot] for slot in slots]
+            health = np.fromiter((unit.health for unit in units), np.int64, len(units))
+            movement = np.fromiter((unit.movement for unit in units), np.int64, len(units))
+            new_health = np.where(poisoned[slots], health - constants.POISON_DAMAGE, health)
+            defeated = bool((new_health <= 0).any())
+            new_movement = np.where(slowed[slots], movement // 2, movement)
+            for i in np.flatnonzero(new_health != health):
+                units[i].health = int(new_health[i])
+            for i in np.flatnonzero(new_movement != movement):
+                units[i].movement = int(new_movement[i])
+
+        # count down durations and clear statuses that ran out
+        ticking = acting[None, :] & (self.durations > 0)
+        self.durations[ticking] -= 1
+        expired = ticking & (self.durations == 0)
+        bits = (np.uint32(1) << np.arange(len(constants.STATUSES), dtype=np.uint32))[:, None]
+        self.flags &= ~np.bitwise_or.reduce(np.where(expired, bits, np.uint32(0)), axis=0)
+        return defeated
@@ -1,16 +1,32 @@
 from typing import Set
 
 import pygame
-from config import constants
+from config import constants, assets
 
 
 class Tile:
     def __init__(self, name, desc, traits):
         self.name = name
-        tile_image = pygame.image.load("assets/tile_" + name + ".png")
-        tile_image = pygame.transform.scale(tile_image, (constants.TILE_SIZE, constants.TILE_SIZE)).convert_alpha()
-        self.image = tile_image
         self.desc = desc
         self.traits = traits
         self.alignments: Set[str] = set()
         self.hidden_alignments: Set[str] = set()
+
+        # filled in by the catalog
+        self.type_id = 0
+        self.trait_flags = 0
+
+    @property
+    def image(self) -> pygame.Surface:
+        return assets.get_image("assets/tile_" + self.name + ".png", (constants.TILE_SIZE, constants.TILE_SIZE),
+                                convert_alpha=True)
+
+    def copy(self) -> 'Tile':
+        """
+        Makes a shallow copy of the tile, much cheaper than copy.copy when filling large maps
+
+        :return: copy of tile
+        """
+        tile = Tile.__new__(Tile)
+        tile.__dict__ = self.__dict__.copy()
+        return tile
@@ -0,0 +1,249 @@
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Sequence
+
+from config import constants
+from config.ai import AIPlayer
+from config.app import App, Position
+
+try:
+    import resource
+except ImportError:
+    # unix only, the peak memory of games goes unreported elsewhere
+    resource = None
+
+# a game to play: map size, alignments and units per alignment, and the seed the units are placed with
+MatchSpec = namedtuple('MatchSpec', ['seed', 'rows', 'cols', 'alignments', 'units', 'max_rounds'])
+
+
+def make_match(rows: int, cols: int, alignments: Sequence[str], units: int, seed: int) -> App:
+    """
+    Builds an app with the same number of units for each alignment, each side starting on its own band of rows.
+    Only the alignments playing take turns. Nothing is drawn, so no display has to be set.
+
+    :param rows: rows of the map
+    :param cols: cols of the map
+    :param alignments: alignments playing
+    :param units: units per alignment
+    :param seed: random seed
+    :return: app
+    """
+    rng = random.Random(seed)
+    app = App(rows, cols, alignments)
+    app.initialize()
+    band = rows // len(alignments)
+    for i, alignment in enumerate(alignments):
+        free = [Position(row, col) for row in range(i * band, (i + 1) * band) for col in range(cols)]
+        rng.shuffle(free)
+        for position in free[:units]:
+            app.spawn_unit(position, app.unit_info[constants.UNIT_SLIME], alignment)
+    app.history.reset(app)
+    return app
+
+
+def get_alignments_left(app: App) -> set:
+    return {unit.alignment for unit in app.get_active_units()}
+
+
+def get_ending(left: set) -> str:
+    """
+    Gets how a game ended, a draw with nobody left after the last units traded kills is told apart from a
+    draw where the rounds ran out
+
+    :param left: alignments with units left
+    :return: "win", "mutual kill" or "rounds"
+    """
+    if len(left) == 1:
+        return "win"
+    return "rounds" if left else "mutual kill"
+
+
+class Match:
+    def __init__(self, spec: MatchSpec):
+        """
+        A game being played by a MatchHost, its app holds everything about the game so any number can be
+        played side by side
+
+        :param spec: game to play
+        """
+        self.spec = spec
+        self.app = make_match(spec.rows, spec.cols, spec.alignments, spec.units, spec.seed)
+        self.turns = 0
+        self.turn_times: List[float] = []
+
+    def is_over(self) -> bool:
+        return (len(get_alignments_left(self.app)) <= 1
+                or self.turns >= self.spec.max_rounds * len(self.app.alignments))
+
+    def play_turn(self, ai: AIPlayer) -> None:
+        start = time.perf_counter()
+        ai.take_turn(self.app)
+        self.turn_times.append(time.perf_counter() - start)
+        self.turns += 1
+
+    def get_result(self) -> Dict:
+        left = get_alignments_left(self.app)
+        return {
+            "seed": self.spec.seed,
+            "winner": next(iter(left)) if len(left) == 1 else None,
+            "ending": get_ending(left),
+            "turns": self.turns,
+            "units_left": len(self.app.get_active_units()),
+            "turn_median": statistics.median(self.turn_times) if self.turn_times else 0.0,
+            "turn_max": max(self.turn_times) if self.turn_times else 0.0,
+        }
+
+
+class MatchHost:
+    def __init__(self, ai: AIPlayer, concurrent: int = constants.TOURNAMENT_CONCURRENT):
+        """
+        Plays many games in one process, taking turns round-robin between the games in progress so every
+        game moves along at the same pace. The computer player is shared, each game only keeps its app.
+
+        :param ai: computer player for every alignment of every game
+        :param concurrent: games in progress at once, the next waiting game starts when one ends
+        """
+        self.ai = ai
+        self.concurrent = concurrent
+        self.waiting: Deque[MatchSpec] = deque()
+        self.playing: Deque[Match] = deque()
+        self.results: List[Dict] = []
+        self.turns = 0
+        # python memory held by each game when it starts, measured on the first games started
+        self.match_bytes = 0
+
+    def add(self, spec: MatchSpec) -> None:
+        self.waiting.append(spec)
+
+    def start_matches(self) -> None:
+        while self.waiting and len(self.playing) < self.concurrent:
+            self.playing.append(Match(self.waiting.popleft()))
+
+    def step(self) -> bool:
+        """
+        Plays a turn of the next game in progress, or records its result if it is over
+
+        :return: True while there are games left to play
+        """
+        self.start_matches()
+        if not self.playing:
+            return False
+        match = self.playing.popleft()
+        if match.is_over():
+            self.results.append(match.get_result())
+        else:
+            match.play_turn(self.ai)
+            self.turns += 1
+            self.playing.append(match)
+        return True
+
+    def run(self) -> List[Dict]:
+        """
+        Plays every game added to the host
+
+        :return: result of each game in the order they ended
+        """
+        # the footprint of a game is measured over the first games started, tracing is too slow to keep on
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        self.start_matches()
+        if self.playing:
+            self.match_bytes = (tracemalloc.get_traced_memory()[0] - before) // len(self.playing)
+        if tracing:
+            tracemalloc.stop()
+        while self.step():
+            pass
+        return self.results
+
+
+def get_peak_memory() -> int:
+    """
+    Gets the most memory the process has held, in bytes
+
+    :return: peak resident set size, 0 where it can't be read
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes everywhere but macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def host_matches(specs: Sequence[MatchSpec], concurrent: int, time_budget: float) -> Dict:
+    """
+    Plays games on a MatchHost, the work of one worker process of play_tournament
+
+    :param specs: games to play
+    :param concurrent: games in progress at once
+    :param time_budget: seconds of search per turn
+    :return: dict of the results, turns played, seconds taken, python bytes per game as it starts and growth
+        of the peak memory of the process per game in progress, which also holds the allocator warming up
+        and so only settles with many games in progress
+    """
+    ai = AIPlayer(0, time_budget)
+    if specs:
+        # images, fonts and the search's buffers are loaded once for every game in the process, a game is
+        # played before the baseline is taken so they are left out of the games' share
+        match = Match(specs[0])
+        while not match.is_over():
+            match.play_turn(ai)
+    baseline = get_peak_memory()
+    host = MatchHost(ai, concurrent)
+    for spec in specs:
+        host.add(spec)
+    start = time.perf_counter()
+    results = host.run()
+    return {
+        "results": results,
+        "turns": host.turns,
+        "seconds": time.perf_counter() - start,
+        "match_bytes": host.match_bytes,
+        "peak_bytes_per_match": (get_peak_memory() - baseline) // max(1, min(concurrent, len(specs))),
+    }
+
+
+def play_tournament(specs: Sequence[MatchSpec], processes: Optional[int] = constants.TOURNAMENT_PROCESSES,
+                    concurrent: int = constants.TOURNAMENT_CONCURRENT,
+                    time_budget: float = constants.AI_TIME_BUDGET) -> Dict:
+    """
+    Plays games spread over worker processes, each playing its share of the games round-robin on a MatchHost
+
+    :param specs: games to play
+    :param processes: worker processes, None for one per core, 0 to play every game in this process
+    :param concurrent: games in progress at once in each process
+    :param time_budget: seconds of search per turn
+    :return: dict of the results of every game and the throughput and memory of the run
+    """
+    start = time.perf_counter()
+    if processes == 0:
+        hosts = [host_matches(specs, concurrent, time_budget)]
+    else:
+        processes = processes if processes is not None else multiprocessing.cpu_count()
+        shares = [specs[i::processes] for i in range(processes) if specs[i::processes]]
+        # forking keeps workers from re-running the script that started the tournament
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(len(shares), mp_context=context) as pool:
+            hosts = list(pool.map(host_matches, shares, [concurrent] * len(shares), [time_budget] * len(shares)))
+    seconds = time.perf_counter() - start
+
+    results = [result for host in hosts for result in host["results"]]
+    turns = sum(host["turns"] for host in hosts)
+    return {
+        "results": results,
+        "games": len(results),
+        "turns": turns,
+        "seconds": seconds,
+        "games_per_second": len(results) / seconds if seconds else 0.0,
+        "turns_per_second": turns / seconds if seconds else 0.0,
+        "match_bytes": max(host["match_bytes"] for host in hosts) if hosts else 0,
+        "peak_bytes_per_match": max(host["peak_bytes_per_match"] for host in hosts) if hosts else 0,
+    }
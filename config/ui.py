@@ -1,7 +1,8 @@
 from collections import namedtuple
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from pygame import Surface
+import pygame
+from pygame import Rect, Surface
 
 from config import constants
 from config.button import Button
@@ -16,30 +17,68 @@ class UI:
         self.buttons: List[Button] = []
         self.interfaces: Dict[str, InterfaceLocation] = {}
         self.text: Dict[str, List[TextLocation]] = {}
+        # what each text was made from, so text that would come out the same isn't rendered again
+        self.text_keys: Dict[str, tuple] = {}
         self.app = app
+        # everything in the ui composited onto one image, rebuilt only when something in it changes
+        self.image: Optional[Surface] = None
+        self.rect: Optional[Rect] = None
+        self.dirty = True
+        self.forecast = None
+        self.forecast_units = None
+        self.forecast_xy = None
 
-    def draw_interfaces(self, screen):
-        """
-        Draws interfaces on the screen
+    def mark_dirty(self) -> None:
+        self.dirty = True
 
-        :param screen: main surface
+    def get_rect(self) -> Optional[Rect]:
         """
-        for x, y, interface in self.interfaces.values():
-            screen.blit(interface, (x, y))
+        Gets the area of the screen the interfaces, buttons and text of the ui cover
 
-    def draw_buttons(self, screen):
+        :return: rect, None if the ui is empty
         """
-        Draws buttons on the screen
+        rects = [interface.get_rect(topleft=(x, y)) for x, y, interface in self.interfaces.values()]
+        rects += [button.rect for button in self.buttons]
+        rects += [text_surface.get_rect(topleft=(x, y))
+                  for text_locations in self.text.values() for x, y, text_surface in text_locations]
+        return rects[0].unionall(rects[1:]) if rects else None
 
-        :param screen: main surface
+    def compose(self) -> None:
+        """
+        Draws the interfaces, then the buttons, then the text onto one transparent image
         """
+        self.rect = self.get_rect()
+        self.dirty = False
+        if self.rect is None:
+            self.image = None
+            return
+        self.image = Surface(self.rect.size, pygame.SRCALPHA)
+        origin = (-self.rect.x, -self.rect.y)
+        for x, y, interface in self.interfaces.values():
+            self.image.blit(interface, (x + origin[0], y + origin[1]))
         for button in self.buttons:
-            button.update(screen)
+            button.draw(self.image, origin)
+        for text_locations in self.text.values():
+            for x, y, text_surface in text_locations:
+                self.image.blit(text_surface, (x + origin[0], y + origin[1]))
 
-    def draw_text(self, screen):
-        for textLocation in self.text.values():
-            for x, y, text_surface in textLocation:
-                screen.blit(text_surface, (x, y))
+    def draw(self, screen) -> List[Rect]:
+        """
+        Draws the ui on the screen as a single blit, composing it again first if it changed
+
+        :param screen: main surface
+        :return: areas of the screen that changed since the ui was last drawn, for a dirty-rect display
+        """
+        changed = []
+        if self.dirty:
+            if self.rect is not None:
+                changed.append(self.rect)
+            self.compose()
+            if self.rect is not None:
+                changed.append(self.rect)
+        if self.image is not None:
+            screen.blit(self.image, self.rect.topleft)
+        return changed
 
     def handle_event(self, event) -> None:
         """
@@ -55,12 +94,14 @@ class UI:
         Adds interface to the screen
         """
         self.buttons.append(button)
+        self.mark_dirty()
 
     def add_interface(self, interface_id: str, interface: InterfaceLocation) -> None:
         """
         Adds interface to the screen
         """
         self.interfaces[interface_id] = interface
+        self.mark_dirty()
 
     def update_interface(self, interface_id: str, interface_image):
         """
@@ -68,19 +109,34 @@ class UI:
         """
         if interface_id in self.interfaces:
             x, y, old_image = self.interfaces[interface_id]
-            self.interfaces[interface_id] = InterfaceLocation(x, y, interface_image)
+            if old_image is not interface_image:
+                self.interfaces[interface_id] = InterfaceLocation(x, y, interface_image)
+                self.mark_dirty()
 
-    def update_text(self, text_id: str, text_surfaces, text_xy_list):
+    def update_text(self, text_id: str, text_surfaces, text_xy_list, key: Optional[tuple] = None):
         """
         Adds/updates text to the screen
 
         :param text_id: id of the text
         :param text_surfaces: list of text surfaces
         :param text_xy_list: list of xy positions of text surfaces
+        :param key: optional values the text was made from, checked with has_text before rendering it again
         """
         self.text[text_id] = []
         for i in range(len(text_surfaces)):
             self.text[text_id].append(TextLocation(text_xy_list[i][0], text_xy_list[i][1], text_surfaces[i]))
+        self.text_keys[text_id] = key
+        self.mark_dirty()
+
+    def has_text(self, text_id: str, key: tuple) -> bool:
+        """
+        Checks if a text was last made from the same values
+
+        :param text_id: id of the text
+        :param key: values the text would be made from
+        :return: True if the text doesn't need to be updated
+        """
+        return text_id in self.text and self.text_keys.get(text_id) == key
 
     def deselect_buttons_of_type(self, btype):
         for button in self.buttons:
@@ -93,8 +149,7 @@ class UI:
         """
         self.app.increment_turn()
 
-    @staticmethod
-    def select_attack(unit, attack) -> None:
+    def select_attack(self, unit, attack) -> None:
         """
         Selects attack for a unit in combat
 
@@ -102,6 +157,43 @@ class UI:
         :param attack: string of the attack
         """
         unit.set_selected_attack(attack)
+        if self.forecast is not None:
+            self.update_forecast_text()
+
+    def set_forecast(self, forecast, unit1, unit2, forecast_xy) -> None:
+        """
+        Sets the forecast of a battle, shown for whichever attacks are selected
+
+        :param forecast: forecast of all attack pairings
+        :param unit1: First unit
+        :param unit2: Second unit
+        :param forecast_xy: xy positions of the forecast text of each unit
+        """
+        self.forecast = forecast
+        self.forecast_units = (unit1, unit2)
+        self.forecast_xy = forecast_xy
+        self.update_forecast_text()
+
+    def update_forecast_text(self) -> None:
+        """
+        Updates the forecast text to the selected attack pairing, a lookup into the precomputed forecast
+        """
+        unit1, unit2 = self.forecast_units
+        i = self.forecast.attacks1.index(unit1.selected_attack)
+        j = self.forecast.attacks2.index(unit2.selected_attack)
+        text_surfaces = []
+        text_xy_list = []
+        for (x, y), damage, kill_chance in ((self.forecast_xy[0], self.forecast.damage_taken1[i, j],
+                                             self.forecast.kill_chance1[i, j]),
+                                            (self.forecast_xy[1], self.forecast.damage_taken2[i, j],
+                                             self.forecast.kill_chance2[i, j])):
+            text = "takes " + format(damage, ".1f") + " damage"
+            text_surfaces.append(constants.FONT_BATTLE.render(text, True, (0, 0, 0)))
+            text_xy_list.append((x, y))
+            text = "dies " + format(kill_chance * 100, ".0f") + "%"
+            text_surfaces.append(constants.FONT_BATTLE.render(text, True, (0, 0, 0)))
+            text_xy_list.append((x, y + constants.FONT_BATTLE_SIZE + constants.UI_UINFO_Y_BUFFER))
+        self.update_text(constants.UI_FORECAST, text_surfaces, text_xy_list)
 
     def attack_confirm(self, unit1, unit2) -> None:
         """
@@ -112,6 +204,7 @@ class UI:
         """
         self.attack_execute(unit1, unit2)
         self.app.ui_removal_list.append(constants.UI_BATTLE)
+        self.app.history.record(self.app)
 
     def attack_execute(self, unit1: Unit, unit2: Unit):
         """
@@ -129,6 +222,12 @@ class UI:
         unit1.take_damage(unit2_dmg)
         unit2.take_damage(unit1_dmg)
 
+        # effects of each attack leave statuses on the other unit
+        for attack, target in ((unit1_attack, unit2), (unit2_attack, unit1)):
+            for effect in attack.effects:
+                if effect in constants.EFFECT_STATUSES:
+                    target.add_status(constants.EFFECT_STATUSES[effect])
+
         unit1.can_attack = False
         unit1.movement = 0
 
@@ -137,3 +236,4 @@ class UI:
         Cancels an attack and closes UI
         """
         self.app.ui_removal_list.append(constants.UI_BATTLE)
+        self.app.history.record(self.app)
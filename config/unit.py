@@ -3,15 +3,17 @@ from collections import namedtuple
 from typing import Set, Dict
 
 import pygame
-from config import constants
+from config import constants, assets
 from config.health_bar import HealthBar
 
-AttackInfo = namedtuple('AttackInfo', ['damage', 'count', 'effects'])
+AttackInfo = namedtuple('AttackInfo', ['damage', 'count', 'effects', 'effect_flags'], defaults=(0,))
+UnitState = namedtuple('UnitState', ['name', 'alignment', 'original_alignment', 'health', 'speed', 'movement',
+                                     'can_attack', 'statuses'])
 
 
 class Unit:
     def __init__(self, name, desc, traits, health, attacks, speed, scale_size, offset_x, offset_y,
-                 ring_offset_x, ring_offset_y, alpha):
+                 ring_offset_x, ring_offset_y, alpha, sight=constants.UNIT_SIGHT):
         self.name: str = name
         self.desc: str = desc
         self.traits: Set = set(traits.split(','))
@@ -19,10 +21,12 @@ class Unit:
         self.max_health: int = health
         self.attacks: Dict[str, AttackInfo] = {}
         for attack_name, attack_info in attacks.items():
-            self.attacks[attack_name] = AttackInfo(attack_info["damage"], attack_info["count"], attack_info["effects"])
+            self.attacks[attack_name] = AttackInfo(attack_info["damage"], attack_info["count"], attack_info["effects"],
+                                                   attack_info.get("effect_flags", 0))
         self.selected_attack: str = ""
         self.speed: int = speed
         self.movement: int = speed
+        self.sight: int = sight
         self.offset_x = offset_x * constants.TILE_SIZE
         self.offset_y = offset_y * constants.TILE_SIZE
         self.ring_offset_x = ring_offset_x
@@ -31,42 +35,70 @@ class Unit:
         self.original_alignment: str = ""
         self.alignment: str = ""
         self.ring = None
-        self.statuses: Set = set()
+        # statuses live in the app's status engine once the unit is in the game
+        self.status_engine = None
+        self.status_slot = -1
         self.healthbar = HealthBar(self)
         self.can_attack = True
 
-        scale_size *= constants.TILE_SIZE
-        image = pygame.image.load("assets/unit_" + name + ".png")
-        image = pygame.transform.scale(image, (scale_size, scale_size))
-        image.set_alpha(alpha)
-
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.visible_height = 0
-        for y in range(self.image.get_height()):
-            if any(self.image.get_at((x, y)).a != 0 for x in range(self.image.get_width())):
-                self.visible_height = y
-                break
-
-    def update(self, screen, unit_x, unit_y):
-        self.rect.x = unit_x + self.offset_x
-        self.rect.y = unit_y + self.offset_y
+        # the image is only loaded once a unit is drawn
+        self.scale_size = scale_size * constants.TILE_SIZE
+        self.alpha = alpha
+        self.art = ("assets/unit_" + name + ".png", (self.scale_size, self.scale_size), alpha)
+        self.rect = pygame.Rect(0, 0, self.scale_size, self.scale_size)
+        self._visible_height = None
+
+        # filled in by the catalog
+        self.type_id = 0
+        self.trait_flags = 0
+
+    @property
+    def image(self) -> pygame.Surface:
+        return assets.get_image(*self.art)
+
+    @property
+    def visible_height(self) -> int:
+        """
+        Gets the first row of the image with a visible pixel, used to place the health bar
+        """
+        if self._visible_height is None:
+            self._visible_height = self.image.get_bounding_rect(min_alpha=1).top
+        return self._visible_height
+
+    def update(self, screen, unit_x, unit_y, zoom=1.0):
+        image = assets.get_zoomed_image(self.image, zoom)
+        self.rect.size = image.get_size()
+        self.rect.x = (unit_x + self.offset_x) * zoom
+        self.rect.y = (unit_y + self.offset_y) * zoom
         if self.ring:
-            screen.blit(self.ring, (unit_x + self.ring_offset_x, unit_y + self.ring_offset_y))
-        screen.blit(self.image, self.rect.topleft)
-        self.healthbar.update(screen, self.health, self.max_health)
+            screen.blit(assets.get_zoomed_image(self.ring, zoom),
+                        ((unit_x + self.ring_offset_x) * zoom, (unit_y + self.ring_offset_y) * zoom))
+        screen.blit(image, self.rect.topleft)
+        self.healthbar.update(screen, self.health, self.max_health, zoom)
 
     def destroy(self):
         self.healthbar.destroy()
+        if self.status_engine is not None:
+            self.status_engine.unregister(self)
 
         del self
 
+    @property
+    def statuses(self) -> Set[str]:
+        if self.status_engine is None:
+            return set()
+        return self.status_engine.get_statuses(self)
+
     def is_poisoned(self):
-        return True if constants.STATUS_POISON in self.statuses else False
+        return self.status_engine is not None and self.status_engine.has_status(self, constants.STATUS_POISON)
+
+    def add_status(self, status, duration=None):
+        if self.status_engine is not None:
+            self.status_engine.add_status(self, status, duration)
 
     def remove_status(self, status):
-        if status in self.statuses:
-            self.statuses.remove(status)
+        if self.status_engine is not None:
+            self.status_engine.remove_status(self, status)
 
     def set_selected_attack(self, attack):
         self.selected_attack = attack
@@ -98,8 +130,9 @@ class Unit:
 
     def set_alignment(self, alignment):
         self.alignment = alignment
-        self.ring = pygame.image.load("assets/ring_" + alignment + ".png")
-        self.ring = pygame.transform.scale(self.ring, (constants.TILE_SIZE, constants.TILE_SIZE))
+        self.ring = assets.get_image("assets/ring_" + alignment + ".png", (constants.TILE_SIZE, constants.TILE_SIZE))
+        if self.status_engine is not None:
+            self.status_engine.set_alignment(self, alignment)
 
     def get_alignment(self, alignment):
         return self.alignment
@@ -118,6 +151,44 @@ class Unit:
     def get_health(self):
         return self.health
 
+    def refresh_from(self, template: 'Unit') -> None:
+        """
+        Takes the catalog fields of a reloaded unit type while keeping this unit's game state
+
+        :param template: reloaded unit type
+        """
+        for field in constants.CATALOG_UNIT_FIELDS:
+            setattr(self, field, getattr(template, field))
+        self.health = min(self.health, self.max_health)
+        self.rect = template.rect.copy()
+        self.healthbar = HealthBar(self)
+        self._visible_height = None
+
+    def get_state(self) -> UnitState:
+        """
+        Gets the state of the unit that changes during a game
+
+        :return: state of the unit
+        """
+        return UnitState(self.name, self.alignment, self.original_alignment, self.health, self.speed, self.movement,
+                         self.can_attack, 0 if self.status_engine is None else self.status_engine.get_flags(self))
+
+    def set_state(self, state: UnitState) -> None:
+        """
+        Sets the state of the unit, the unit should already have its original alignment and be registered
+        with the status engine
+
+        :param state: state of the unit
+        """
+        if state.alignment != self.alignment:
+            self.set_alignment(state.alignment)
+        self.health = state.health
+        self.speed = state.speed
+        self.movement = state.movement
+        self.can_attack = state.can_attack
+        if self.status_engine is not None:
+            self.status_engine.set_flags(self, state.statuses)
+
 
 def lerp(start, end, fraction):
     return start + (end - start) * fraction
@@ -146,6 +217,15 @@ class MovingUnit(pygame.sprite.Sprite):
         self.app = app
         self.frame_count = 1
 
+    def draw(self, screen, zoom=1.0):
+        # the unit stands on the tile it leaves for the first half of the step and on the next one after, like
+        # the units on the board it is only drawn under fog for its own alignment
+        fraction = (self.frame_count - 1) / self.duration
+        row, col, _ = self.input_path[self.input_location - 1 if fraction < 0.5 else self.input_location]
+        if not self.app.can_see(row, col) and self.input_unit.unit_info.alignment != self.app.get_alignment_turn():
+            return
+        screen.blit(assets.get_zoomed_image(self.image, zoom), (self.rect.x * zoom, self.rect.y * zoom))
+
     def update(self):
         fraction = min(self.frame_count / self.duration, 1.0)
 
@@ -0,0 +1,75 @@
+from array import array
+from typing import Dict, List
+
+from config.hexgrid import get_offsets_within
+
+
+class Visibility:
+    def __init__(self, rows: int, cols: int, alignments: List[str]):
+        self.rows = rows
+        self.cols = cols
+        self.alignments = alignments
+        # per alignment, how many of its units can see each cell, so a unit leaving only clears
+        # the cells no other unit of the alignment still sees
+        self.counts: Dict[str, array] = {}
+        self.reset(rows, cols)
+
+    def reset(self, rows: int, cols: int) -> None:
+        """
+        Clears all visibility for a board of the given size
+
+        :param rows: rows of the board
+        :param cols: cols of the board
+        """
+        self.rows = rows
+        self.cols = cols
+        self.counts = {alignment: array('H', bytes(2 * rows * cols)) for alignment in self.alignments}
+
+    def update_unit(self, row: int, col: int, alignment: str, sight: int, change: int) -> None:
+        """
+        Adds or removes the sight of a unit, only touching the cells within its sight radius
+
+        :param row: row of the unit
+        :param col: col of the unit
+        :param alignment: alignment of the unit
+        :param sight: sight radius of the unit
+        :param change: 1 when the unit arrives, -1 when it leaves
+        """
+        counts = self.counts.get(alignment)
+        if counts is None:
+            return
+        rows, cols = self.rows, self.cols
+        for drow, dcol in get_offsets_within(sight, row % 2):
+            r, c = row + drow, col + dcol
+            if 0 <= r < rows and 0 <= c < cols:
+                counts[r * cols + c] += change
+
+    def add_unit(self, row: int, col: int, unit) -> None:
+        self.update_unit(row, col, unit.alignment, unit.sight, 1)
+
+    def remove_unit(self, row: int, col: int, unit) -> None:
+        self.update_unit(row, col, unit.alignment, unit.sight, -1)
+
+    def is_visible(self, alignment: str, row: int, col: int) -> bool:
+        """
+        Checks if an alignment can see a cell
+
+        :param alignment: alignment looking
+        :param row: row of cell
+        :param col: col of cell
+        :return: True if any unit of the alignment sees the cell
+        """
+        return self.counts[alignment][row * self.cols + col] > 0
+
+    def rebuild(self, app) -> None:
+        """
+        Recomputes all visibility from the units on the board, for when sight radii change
+
+        :param app: app whose board is used
+        """
+        self.reset(app.rows, app.cols)
+        for row in range(app.rows):
+            for col in range(app.cols):
+                unit = app.unit_map[row][col].unit
+                if unit is not None:
+                    self.add_unit(row, col, unit)
@@ -1,89 +1,164 @@
+import os
+
 import pygame
 import sys
 from config import constants
-from config.app import App, Position
-
-# initialize game
-pygame.init()
-pygame.mixer.init()
-
-# background music
-pygame.mixer.music.load("audio/" + constants.SOUND_WELP)
-pygame.mixer.music.set_volume(0)
-pygame.mixer.music.play(-1)
-
-# set screen
-screen_dimensions = (constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT)
-screen = pygame.display.set_mode(screen_dimensions)
-
-# set the title of the window
-pygame.display.set_caption("Fate")
-
-# set up the clock
-clock = pygame.time.Clock()
-
-# main game loop
-app = App()
-app.initialize()
-left_click_handled = False
-right_click_handled = False
-app.spawn_unit(Position(1, 1), app.unit_info[constants.UNIT_SLIME], 'white')
-app.spawn_unit(Position(4, 4), app.unit_info[constants.UNIT_SLIME], 'orange')
-app.spawn_unit(Position(5, 4), app.unit_info[constants.UNIT_SLIME], 'orange')
-while True:
-    screen.fill('black')
-
-    # check if mouse is hovering over a tile
-    mouse_position = pygame.mouse.get_pos()
-    hovered_tile = app.is_mouse_on_tile(mouse_position)
-
-    app.update(screen, hovered_tile)
-
-    # highlight path if a unit has been clicked
-    if app.start_unit is not None and app.start_tile is not None and hovered_tile is not None:
-        app.shortest_path = app.get_shortest_path(app.start_tile, hovered_tile, app.start_unit.unit_info)
-    else:
-        app.shortest_path = []
-
-    for row, col, tile in app.shortest_path:
-        app.overlay([Position(row, col)], app.tile_info[constants.TILE_CHOSEN].image, screen)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            sys.exit()
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1 and not left_click_handled:
-                # left mouse button clicked
-                left_click_handled = True
-
-                if hovered_tile:
-                    if not app.start_unit:
-                        app.set_start_tile(hovered_tile)
-                    else:
-                        app.start_tile = None
-                        if app.start_unit is not None:
-                            app.move_unit(app.start_unit, hovered_tile, app.shortest_path, 0)
-                        app.start_unit = None
-                        app.shortest_path = []
-            elif event.button == 3 and not right_click_handled:
-                # right mouse button clicked
-                right_click_handled = True
-
-                if hovered_tile:
-                    if not app.unit_map[hovered_tile.row][hovered_tile.col].unit:
-                        app.spawn_unit(Position(hovered_tile.row, hovered_tile.col),
-                                       app.unit_info[constants.UNIT_SLIME], app.get_alignment_turn())
-        elif event.type == pygame.MOUSEBUTTONUP:
-            if event.button == 1:
-                left_click_handled = False
-            elif event.button == 3:
-                right_click_handled = False
-
-        app.handle_event(event)
-
-    # update the screen
-    pygame.display.flip()
-
-    # limit frame rate
-    clock.tick(constants.FRAME_RATE)
+from config.app import App, Position, SelectedTile
+from config.save import save_game, load_game
+
+
+def main() -> None:
+    # initialize game
+    pygame.init()
+    pygame.mixer.init()
+
+    # background music
+    pygame.mixer.music.load("audio/" + constants.SOUND_WELP)
+    pygame.mixer.music.set_volume(0)
+    pygame.mixer.music.play(-1)
+
+    # set screen
+    screen_dimensions = (constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT)
+    screen = pygame.display.set_mode(screen_dimensions)
+
+    # set the title of the window
+    pygame.display.set_caption("Fate")
+
+    # set up the clock
+    clock = pygame.time.Clock()
+
+    # main game loop
+    app = App()
+    app.initialize()
+    left_click_handled = False
+    right_click_handled = False
+    # unit, its tile and the tile clicked, while the path worker is still finding the path the unit moves along
+    pending_move = None
+    app.spawn_unit(Position(1, 1), app.unit_info[constants.UNIT_SLIME], 'white')
+    app.spawn_unit(Position(4, 4), app.unit_info[constants.UNIT_SLIME], 'orange')
+    app.spawn_unit(Position(5, 4), app.unit_info[constants.UNIT_SLIME], 'orange')
+    app.history.reset(app)
+    profiler = app.profiler
+    while True:
+        profiler.begin_frame()
+        app.catalog.poll(app)
+        if app.is_ai_turn():
+            with profiler.phase("ai"):
+                app.ai.update(app)
+        screen.fill('black')
+
+        # check if mouse is hovering over a tile
+        with profiler.phase("picking"):
+            mouse_position = pygame.mouse.get_pos()
+            hovered_tile = app.is_mouse_on_tile(mouse_position)
+
+        app.update(screen, hovered_tile)
+
+        # highlight path if a unit has been clicked
+        with profiler.phase("pathfinding"):
+            if pending_move is not None:
+                unit, start, goal = pending_move
+                # the unit can have been moved or removed since the click, by an undo or another player
+                if app.unit_map[unit.row][unit.col].unit is not unit.unit_info:
+                    pending_move = None
+                else:
+                    path = app.path_worker.get_checked_path(start, goal, unit.unit_info)
+                    if path is not None:
+                        app.move_unit(unit, goal, path, 0)
+                        pending_move = None
+            elif app.start_unit is not None and app.start_tile is not None and hovered_tile is not None:
+                app.path_worker.request(Position(app.start_tile.row, app.start_tile.col),
+                                        Position(hovered_tile.row, hovered_tile.col), app.start_unit.unit_info)
+                app.shortest_path = app.path_worker.get_path(app.start_tile)
+            else:
+                app.path_worker.cancel()
+                app.shortest_path = []
+
+        with profiler.phase("path overlay"):
+            for row, col, tile in app.shortest_path:
+                app.overlay([Position(row, col)], app.tile_info[constants.TILE_CHOSEN].image, screen)
+
+        with profiler.phase("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    app.ai.close()
+                    app.path_worker.close()
+                    pygame.quit()
+                    sys.exit()
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button == 1 and not left_click_handled:
+                        # left mouse button clicked
+                        left_click_handled = True
+
+                        if hovered_tile:
+                            if not app.start_unit:
+                                app.set_start_tile(hovered_tile)
+                            else:
+                                app.start_tile = None
+                                if app.start_unit is not None:
+                                    # the selection is cleared, the unit's own tile is where the path starts
+                                    row, col = app.start_unit.row, app.start_unit.col
+                                    start = SelectedTile(row, col, app.game_map[row][col].tile)
+                                    path = app.path_worker.get_checked_path(start, hovered_tile,
+                                                                            app.start_unit.unit_info)
+                                    if path is None:
+                                        pending_move = (app.start_unit, start, hovered_tile)
+                                    else:
+                                        app.move_unit(app.start_unit, hovered_tile, path, 0)
+                                app.start_unit = None
+                                app.shortest_path = []
+                    elif event.button == 3 and not right_click_handled:
+                        # right mouse button clicked
+                        right_click_handled = True
+
+                        if hovered_tile:
+                            if not app.unit_map[hovered_tile.row][hovered_tile.col].unit:
+                                app.spawn_unit(Position(hovered_tile.row, hovered_tile.col),
+                                               app.unit_info[constants.UNIT_SLIME], app.get_alignment_turn())
+                                app.history.record(app)
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F5:
+                        save_game(app, constants.SAVE_FILE)
+                    elif event.key == pygame.K_F9 and os.path.exists(constants.SAVE_FILE):
+                        load_game(app, constants.SAVE_FILE)
+                    elif event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        app.undo()
+                    elif event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        app.redo()
+                    elif event.key == pygame.K_F3:
+                        profiler.toggle_hud()
+                    elif event.key == pygame.K_F4:
+                        profiler.toggle_csv()
+                    elif event.key == pygame.K_F7:
+                        app.toggle_fog_of_war()
+                    elif event.key == pygame.K_F8:
+                        app.memory.toggle(app)
+                    elif event.key == pygame.K_F6:
+                        app.memory.write_snapshot(app)
+                elif event.type == pygame.MOUSEWHEEL:
+                    app.zoom_by(event.y)
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    if event.button == 1:
+                        left_click_handled = False
+                    elif event.button == 3:
+                        right_click_handled = False
+
+                app.handle_event(event)
+
+        profiler.draw(screen)
+        app.memory.draw(screen)
+
+        # update the screen
+        with profiler.phase("flip"):
+            # the debug panels are redrawn every frame over the board, so the whole screen is taken with them
+            rects = app.take_dirty_rects(screen)
+            if profiler.hud_visible or app.memory.enabled:
+                rects = [screen.get_rect()]
+            pygame.display.update(rects)
+
+        # limit frame rate
+        clock.tick(constants.FRAME_RATE)
+
+
+if __name__ == "__main__":
+    main()
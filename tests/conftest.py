@@ -0,0 +1,30 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, ROOT)
+
+import pygame
+import pytest
+
+from config import constants
+from config.app import App
+
+
+@pytest.fixture(scope="session")
+def display():
+    # assets are loaded from paths relative to the repo
+    os.chdir(ROOT)
+    pygame.init()
+    yield pygame.display.set_mode((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    pygame.quit()
+
+
+@pytest.fixture
+def app(display):
+    app = App()
+    app.initialize()
+    yield app
+    app.path_worker.close()
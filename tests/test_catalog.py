@@ -0,0 +1,29 @@
+import pickle
+
+import pytest
+
+from config import constants
+from config.catalog import CATALOG_VERSION, Catalog
+
+
+@pytest.mark.parametrize('cached', [
+    [1, 2, 3],
+    {"stats": {}},
+    {"version": CATALOG_VERSION},
+    {"version": CATALOG_VERSION, "stats": None, "catalog": None},
+])
+def test_damaged_cache_is_compiled_again(tmp_path, cached):
+    cache_path = tmp_path / "catalog.pickle"
+    cache_path.write_bytes(pickle.dumps(cached))
+    catalog = Catalog(constants.TILE_INFO_FILE, constants.UNIT_INFO_FILE, str(cache_path))
+    compiled = catalog.read()
+    assert compiled["version"] == CATALOG_VERSION
+    # the cache is written again and read back on the next start
+    assert Catalog(constants.TILE_INFO_FILE, constants.UNIT_INFO_FILE, str(cache_path)).read() == compiled
+
+
+def test_truncated_cache_is_compiled_again(tmp_path):
+    cache_path = tmp_path / "catalog.pickle"
+    cache_path.write_bytes(pickle.dumps({"version": CATALOG_VERSION})[:-3])
+    catalog = Catalog(constants.TILE_INFO_FILE, constants.UNIT_INFO_FILE, str(cache_path))
+    assert catalog.read()["version"] == CATALOG_VERSION
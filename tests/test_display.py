@@ -0,0 +1,47 @@
+from config import constants
+from config.app import Position, SelectedTile, SelectedUnit
+
+
+def draw_frame(app, screen):
+    screen.fill('black')
+    app.update(screen, None)
+    return app.take_dirty_rects(screen)
+
+
+def test_unchanged_board_takes_only_ui_areas(app, display):
+    assert draw_frame(app, display) == [display.get_rect()]
+    assert display.get_rect() not in draw_frame(app, display)
+
+
+def test_changed_board_takes_whole_screen(app, display):
+    draw_frame(app, display)
+    draw_frame(app, display)
+    app.spawn_unit(Position(2, 2), app.unit_info[constants.UNIT_SLIME], 'white')
+    assert draw_frame(app, display) == [display.get_rect()]
+    app.zoom_by(-1)
+    assert draw_frame(app, display) == [display.get_rect()]
+    assert display.get_rect() not in draw_frame(app, display)
+
+
+def draw_moving_sprites(app, screen):
+    screen.fill('black')
+    app.moving_sprites.update()
+    for sprite in app.moving_sprites:
+        sprite.draw(screen, app.zoom)
+    return screen.get_buffer().raw.strip(b'\0') != b''
+
+
+def test_moving_units_are_hidden_under_fog(app, display):
+    app.fog_of_war = True
+    app.spawn_unit(Position(20, 8), app.unit_info[constants.UNIT_SLIME], 'orange')
+    unit = app.unit_map[20][8].unit
+    assert not app.can_see(20, 8) and not app.can_see(22, 8)
+    selected = SelectedUnit(20, 8, unit)
+    path = [SelectedTile(20, 8, app.game_map[20][8].tile), SelectedTile(22, 8, app.game_map[22][8].tile)]
+    app.move_unit(selected, path[-1], path, 0)
+    assert app.moving_sprites
+    assert not draw_moving_sprites(app, display)
+
+    # on its own side's turn the unit is drawn
+    app.turn = app.alignments.index('orange')
+    assert draw_moving_sprites(app, display)
@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+import pytest
+
+from config import constants
+from config.app import Position
+from config.mapfile import MapLoader, MapReader, load_map, write_map
+from config.mapgen import TILE_TYPES
+
+ROWS = 100
+COLS = 12
+CHUNK_ROWS = 16
+
+
+@pytest.fixture
+def map_path(tmp_path):
+    tiles = np.random.default_rng(0).integers(0, len(TILE_TYPES), (ROWS, COLS), dtype=np.uint8)
+    path = str(tmp_path / "map.fmap")
+    write_map(path, tiles, TILE_TYPES, CHUNK_ROWS)
+    return path, tiles
+
+
+def check_board(app, tiles) -> None:
+    assert app.rows == len(app.game_map) == len(app.unit_map)
+    names = [[xytile.tile.name for xytile in row] for row in app.game_map]
+    assert names == [[TILE_TYPES[tile_type] for tile_type in row] for row in tiles[:app.rows].tolist()]
+
+
+def test_chunk_rows(map_path):
+    with MapReader(map_path[0]) as reader:
+        assert reader.chunk_count == 7
+        assert reader.get_chunk_rows(0) == (0, 16)
+        assert reader.get_chunk_rows(6) == (96, 100)
+
+
+@pytest.mark.parametrize('region', [(0, 0, 5, 12), (10, 3, 40, 9), (15, 0, 17, 12), (90, 0, 120, 20), (-4, -2, 3, 4),
+                                    (50, 0, 50, 12)])
+def test_read_region(map_path, region):
+    path, tiles = map_path
+    top, left, bottom, right = region
+    with MapReader(path) as reader:
+        np.testing.assert_array_equal(reader.read_region(*region),
+                                      tiles[max(0, top):bottom, max(0, left):right])
+
+
+def test_loader_reads_the_screen_first(app, map_path):
+    path, tiles = map_path
+    loader = MapLoader(app, path, 10)
+    check_board(app, tiles)
+    assert app.rows == 10
+
+    # rows coming onto the screen are read even without time for more chunks
+    assert not loader.step(app, 0, 20)
+    check_board(app, tiles)
+    assert app.rows == 20
+
+    assert loader.step(app, math.inf)
+    check_board(app, tiles)
+    assert app.rows == ROWS
+    assert loader.reader.data.closed
+
+
+def test_loader_gives_new_rows_alignments(app, map_path):
+    path, tiles = map_path
+    loader = MapLoader(app, path, 10)
+    for col in range(3):
+        app.spawn_unit(Position(8 + col % 2, col), app.unit_info[constants.UNIT_SLIME], app.alignments[col % 2])
+    app.refresh_tile_alignments()
+    loader.step(app, 0, 16)
+    streamed = [[set(xytile.tile.alignments) for xytile in row] for row in app.game_map]
+    app.update_tile_alignments()
+    assert streamed == [[xytile.tile.alignments for xytile in row] for row in app.game_map]
+    assert any(streamed[row][col] for row in range(10, 16) for col in range(COLS))
+
+
+def test_app_streams_until_loaded(app, map_path):
+    path, tiles = map_path
+    app.map_loader = MapLoader(app, path, 10)
+    app.undo()
+    app.finish_map_loading()
+    assert app.map_loader is None
+    check_board(app, tiles)
+
+
+def test_load_map(app, map_path):
+    path, tiles = map_path
+    load_map(app, path)
+    assert app.rows == ROWS
+    check_board(app, tiles)
@@ -0,0 +1,85 @@
+import random
+from array import array
+
+import pytest
+
+from config.hexgrid import get_offsets_within
+from config.pathfinding import HierarchicalPathFinder, get_neighbor_table, get_profile_costs, search
+
+ROWS = 96
+COLS = 48
+# small clusters and regions so a board this size has several of each
+CLUSTERS = dict(cluster_rows=8, cluster_cols=4, spacing=2, region_clusters=3, region_spacing=2)
+PROFILE = ('white', 3)
+
+
+def make_board(seed: int):
+    rng = random.Random(seed)
+    terrain = array('H', [2 if rng.random() < 0.3 else 1 for _ in range(ROWS * COLS)])
+    # a unit of another alignment on a few cells puts the cells around it in its zone of control
+    masks = [0] * (ROWS * COLS)
+    neighbors = get_neighbor_table(ROWS, COLS)
+    for _ in range(40):
+        for neighbor in neighbors[rng.randrange(ROWS * COLS)]:
+            masks[neighbor] |= 2
+    costs = get_profile_costs(terrain, array('B', masks), 1, PROFILE[1])
+    return terrain, costs
+
+
+def get_queries(seed: int, count: int):
+    rng = random.Random(seed)
+    return [(rng.randrange(ROWS * COLS), rng.randrange(ROWS * COLS)) for _ in range(count)]
+
+
+def get_cost(costs, path) -> int:
+    return sum(costs[index] for index in path[1:])
+
+
+def check_path(costs, path, source, target) -> None:
+    assert path[0] == source and path[-1] == target
+    for first, second in zip(path, path[1:]):
+        row, col = divmod(first, COLS)
+        next_row, next_col = divmod(second, COLS)
+        assert (next_row - row, next_col - col) in get_offsets_within(1, row % 2)[1:]
+    cheapest = search(ROWS, COLS, costs, source, (target,))[target]
+    assert get_cost(costs, path) >= get_cost(costs, cheapest)
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_paths_are_valid(seed):
+    terrain, costs = make_board(seed)
+    hierarchy = HierarchicalPathFinder(**CLUSTERS)
+    for source, target in get_queries(seed, 40):
+        path = hierarchy.find_path(ROWS, COLS, terrain, PROFILE, costs, source, target)
+        check_path(costs, path, source, target)
+
+
+def test_path_to_own_cell():
+    terrain, costs = make_board(3)
+    hierarchy = HierarchicalPathFinder(**CLUSTERS)
+    assert hierarchy.find_path(ROWS, COLS, terrain, PROFILE, costs, 5, 5) == (5,)
+
+
+@pytest.mark.parametrize('seed', [4, 5])
+def test_update_matches_fresh_build(seed):
+    terrain, costs = make_board(seed)
+    hierarchy = HierarchicalPathFinder(**CLUSTERS)
+    queries = get_queries(seed, 30)
+    for source, target in queries:
+        hierarchy.find_path(ROWS, COLS, terrain, PROFILE, costs, source, target)
+
+    # tiles made difficult or cleared and units moved, in new snapshots like the path finder hands out
+    rng = random.Random(seed)
+    for _ in range(3):
+        terrain = array('H', terrain)
+        for index in rng.sample(range(ROWS * COLS), 15):
+            terrain[index] = 3 - terrain[index]
+        _, zone_costs = make_board(rng.randrange(1000))
+        costs = array('H', [cost if zone_cost != PROFILE[1] else zone_cost
+                            for cost, zone_cost in zip(terrain, zone_costs)])
+        fresh = HierarchicalPathFinder(**CLUSTERS)
+        for source, target in queries:
+            path = hierarchy.find_path(ROWS, COLS, terrain, PROFILE, costs, source, target)
+            check_path(costs, path, source, target)
+            expected = fresh.find_path(ROWS, COLS, terrain, PROFILE, costs, source, target)
+            assert get_cost(costs, path) == get_cost(costs, expected)
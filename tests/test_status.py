@@ -0,0 +1,20 @@
+from config import constants
+from config.app import Position
+
+
+def test_poison_kills_at_the_start_of_the_turn(app):
+    app.spawn_unit(Position(2, 2), app.unit_info[constants.UNIT_SLIME], 'orange')
+    app.spawn_unit(Position(6, 2), app.unit_info[constants.UNIT_SLIME], 'orange')
+    dying = app.unit_map[2][2].unit
+    surviving = app.unit_map[6][2].unit
+    dying.health = constants.POISON_DAMAGE
+    surviving.health = constants.POISON_DAMAGE + 1
+    dying.add_status(constants.STATUS_POISON)
+    surviving.add_status(constants.STATUS_POISON)
+
+    app.increment_turn()
+    assert app.get_alignment_turn() == 'orange'
+    assert app.unit_map[2][2].unit is None
+    assert dying.status_engine is None
+    assert app.unit_map[6][2].unit is surviving
+    assert surviving.health == 1